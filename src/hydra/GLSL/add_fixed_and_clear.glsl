@@ -0,0 +1,15 @@
+#version 430
+
+layout(local_size_x = 32, local_size_y = 32, local_size_z = 1) in;
+
+layout (r32f) uniform image2D img_in_out;
+layout (r32i, binding = 3) uniform iimage2D img_add;	// fixed-point values, fixed unit
+
+uniform float fixed_scale = 1048576.0;
+
+void main(void) {
+    ivec2 base = ivec2(gl_GlobalInvocationID.xy);
+    float add = float(imageLoad(img_add, base).x) / fixed_scale;
+    imageStore(img_in_out, base, imageLoad(img_in_out, base) + vec4(add));
+    imageStore(img_add, base, ivec4(0));
+}
@@ -0,0 +1,45 @@
+#version 430
+
+// Per-workgroup maximum and sum of the absolute change of a map since the last check.
+// The current map is copied into the prior map for the next check.
+
+layout(local_size_x = 32, local_size_y = 32, local_size_z = 1) in;
+
+layout (r32f) uniform image2D map;
+layout (r32f) uniform image2D prior;
+
+uniform ivec2 size = ivec2(512, 512);
+
+layout(std430, binding = 0) writeonly buffer PartialBuffer {
+	vec2 partials[];
+};
+
+shared vec2 values[1024];
+
+void main(void) {
+	ivec2 pos = ivec2(gl_GlobalInvocationID.xy);
+	uint lid = gl_LocalInvocationIndex;
+
+	float change = 0;
+	if (all(lessThan(pos, size))) {
+		float h = imageLoad(map, pos).x;
+		change = abs(h - imageLoad(prior, pos).x);
+		imageStore(prior, pos, vec4(h));
+	}
+
+	values[lid] = vec2(change);
+	memoryBarrierShared();
+	barrier();
+
+	for (uint stride = 512u; stride > 0u; stride >>= 1u) {
+		if (lid < stride) {
+			values[lid] = vec2(max(values[lid].x, values[lid + stride].x), values[lid].y + values[lid + stride].y);
+		}
+		memoryBarrierShared();
+		barrier();
+	}
+
+	if (lid == 0u) {
+		partials[gl_WorkGroupID.y * gl_NumWorkGroups.x + gl_WorkGroupID.x] = values[0];
+	}
+}//main
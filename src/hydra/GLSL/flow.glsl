@@ -5,7 +5,7 @@ layout(local_size_x = 32, local_size_y = 32, local_size_z = 1) in;
 uniform sampler2D height_sampler;
 layout (r32f) uniform image2D flow;
 
-uniform ivec2 tile_size = ivec2(32, 32);
+uniform vec2 tile_size = vec2(32.0, 32.0);
 uniform vec2 tile_mult = vec2(1.0/512.0,1.0/512.0);
 
 uniform int iterations = 200;
@@ -0,0 +1,111 @@
+#version 430
+
+layout(local_size_x = 256, local_size_y = 1, local_size_z = 1) in;
+
+struct Particle {
+	vec2 pos;
+	vec2 vel;
+	float saturation;
+	int age;
+};
+
+layout(std430, binding = 0) buffer ParticleBuffer {
+	Particle particles[];
+};
+
+layout(std430, binding = 2) writeonly buffer FlagBuffer {
+	uint flags[];
+};
+
+layout(std430, binding = 5) readonly buffer ArgBuffer {
+	uvec3 groups;
+	uint count;
+};
+
+uniform sampler2D height_sampler;
+layout (r32f) uniform image2D flow;
+
+uniform ivec2 size = ivec2(512, 512);
+uniform vec2 tile_mult = vec2(1.0/512.0,1.0/512.0);
+
+uniform int lifetime = 50;
+uniform int steps = 8;
+uniform float acceleration = 0.5;
+uniform float max_velocity = 2.0;
+uniform float min_velocity = 0.000002;
+uniform float drag = 0.8;
+uniform float strength = 0.10;
+
+void add_flow(vec2 pos, float strength) {
+	pos -= vec2(0.5,0.5);
+	vec2 factor = pos - floor(pos);
+	ivec2 corner = ivec2(floor(pos));
+
+	//X Y
+	float f = strength * (1-factor.x) * (1-factor.y);
+	float surf = imageLoad(flow, corner).x;
+	imageStore(flow, corner, vec4(surf * (1-f) + f));
+
+	//X+1 Y
+	f = strength * factor.x * (1-factor.y);
+	surf = imageLoad(flow, corner + ivec2(1,0)).x;
+	imageStore(flow, corner + ivec2(1,0), vec4(surf * (1-f) + f));
+
+	//X Y+1
+	f = strength * (1-factor.x) * factor.y;
+	surf = imageLoad(flow, corner + ivec2(0,1)).x;
+	imageStore(flow, corner + ivec2(0,1), vec4(surf * (1-f) + f));
+
+	//X+1 Y+1
+	f = strength * factor.x * factor.y;
+	surf = imageLoad(flow, corner + ivec2(1,1)).x;
+	imageStore(flow, corner + ivec2(1,1), vec4(surf * (1-f) + f));
+}
+
+void main(void) {
+	uint id = gl_GlobalInvocationID.x;
+	if (id >= count) {
+		return;
+	}
+
+	Particle p = particles[id];
+	vec2 pos = p.pos;
+	vec2 vel = p.vel;
+	int age = p.age;
+
+	bool alive = true;
+
+	for (int i = 0; i < steps; ++i) {
+		// negated comparison also catches NaNs
+		if (age >= lifetime || !(length(vel) >= min_velocity) ||
+			any(lessThan(pos, vec2(0))) || any(greaterThanEqual(pos, vec2(size)))) {
+			alive = false;
+			break;
+		}
+
+		vec2 dir = normalize(vel);
+		float h = texture(height_sampler, tile_mult * pos).x;
+		float height_vel = texture(height_sampler, tile_mult * (pos + dir)).x;
+		float height_dir = texture(height_sampler, tile_mult * (pos + vec2(-dir.y, dir.x))).x;
+
+		vel += acceleration * (
+			(h - height_vel) * dir +
+			(h - height_dir) * vec2(-dir.y, dir.x)
+		);
+
+		float len = min(length(vel), max_velocity);
+		dir = normalize(vel);
+		vel = dir * len;
+
+		add_flow(pos, strength);
+
+		pos += dir;
+		vel *= drag;
+		++age;
+	}
+
+	alive = alive && age < lifetime && all(greaterThanEqual(pos, vec2(0))) && all(lessThan(pos, vec2(size)));
+
+	particles[id] = Particle(pos, vel, p.saturation, age);
+	flags[id] = alive ? 1u : 0u;
+}//main
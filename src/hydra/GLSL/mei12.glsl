@@ -0,0 +1,125 @@
+#version 430
+
+// Fused rain (mei1) and outflow (mei2) step.
+// Water is ping-ponged, because neighbouring water levels are needed after rain.
+
+layout(local_size_x = 32, local_size_y = 32, local_size_z = 1) in;
+
+layout(std430, binding = 7) readonly buffer TileBuffer {
+	uvec3 tile_groups;
+	uint tile_pad;
+	uvec2 tiles[];
+};
+
+uniform bool sparse = false;	// workgroups only run over listed active tiles
+
+ivec2 tile_origin() {
+	return ivec2(sparse ? tiles[gl_WorkGroupID.x] : gl_WorkGroupID.xy) * 32;
+}
+
+uniform sampler2D b_sampler;
+uniform sampler2D d_sampler;
+
+layout (rgba32f) uniform image2D pipe_map;
+layout (r32f) uniform image2D out_d_map;
+layout (r32f) uniform image2D water_src;
+
+uniform float dt = 0.25;
+uniform float pipe_dt = 0.25;	// mei2 runs with its default time step
+uniform float drain_dt = 0.25;	// time over which outflow may drain a cell, stays at the fixed outflow step
+uniform float Ke = 0.3;
+uniform float Kr = 0.1;
+
+uniform bool use_water_src = false;
+uniform int seed = 0;
+uniform bool rainfall = false;
+
+uniform float lx = 1;
+uniform float ly = 1;
+
+uniform ivec2 size = ivec2(512, 512);
+
+uniform float A = 1;
+
+#define LEFT   (pos + ivec2(-1, 0))
+#define RIGHT  (pos + ivec2(+1, 0))
+#define UP     (pos + ivec2(0, -1))
+#define DOWN   (pos + ivec2(0, +1))
+
+//  1y -1
+//0x  2z
+//  3w +1
+
+uint pcg(uint v)
+{
+	uint state = v * 747796405u + 2891336453u;
+	uint word = ((state >> ((state >> 28u) + 4u)) ^ state) * 277803737u;
+	return (word >> 22u) ^ word;
+}
+
+bool inside(ivec2 pos) {
+	return all(greaterThanEqual(pos, ivec2(0))) && all(lessThan(pos, size));
+}
+
+// water level after rain, zero outside like imageLoad
+float waterAt(ivec2 pos) {
+	if (!inside(pos)) {
+		return 0;
+	}
+
+	float kr;
+	if (rainfall) {
+		kr = (pcg(uint(pos.x * 7877 + pos.y * 2833 + seed)) & 0xFF) > 0xFA ? Kr : 0.0f;
+	}
+	else {
+		kr = Kr;
+	}
+
+	if (use_water_src) {
+		kr *= imageLoad(water_src, pos).x;
+	}
+
+	return texelFetch(d_sampler, pos, 0).x * (1 - dt * Ke) + dt * kr;
+}
+
+float heightAt(ivec2 pos) {
+	return inside(pos) ? texelFetch(b_sampler, pos, 0).x + waterAt(pos) : 0;
+}
+
+void main(void) {
+	ivec2 pos = tile_origin() + ivec2(gl_LocalInvocationID.xy);
+	if (!inside(pos)) {
+		return;
+	}
+
+	float d = waterAt(pos);
+	float h = texelFetch(b_sampler, pos, 0).x + d;
+	vec4 pipe = imageLoad(pipe_map, pos);
+	float hN;
+
+	hN = h - heightAt(LEFT);
+	pipe.x = max(0, pipe.x + pipe_dt * A * hN * lx);
+	pipe.x *= float(pos.x > 0);
+
+	hN = h - heightAt(RIGHT);
+	pipe.z = max(0, pipe.z + pipe_dt * A * hN * lx);
+	pipe.z *= float(pos.x < size.x - 1);
+
+	hN = h - heightAt(UP);
+	pipe.y = max(0, pipe.y + pipe_dt * A * hN * ly);
+	pipe.y *= float(pos.y > 0);
+
+	hN = h - heightAt(DOWN);
+	pipe.w = max(0, pipe.w + pipe_dt * A * hN * ly);
+	pipe.w *= float(pos.y < size.y - 1);
+
+	float sum = pipe.x + pipe.y + pipe.z + pipe.w;
+	float water = lx * ly * d;
+	//clamp instead of min due to NaNs
+	float K = clamp(water / (drain_dt * sum), 0, 1);
+
+	pipe *= sum > water ? K : 1;
+
+	imageStore(pipe_map, pos, pipe);
+	imageStore(out_d_map, pos, vec4(d));
+}//main
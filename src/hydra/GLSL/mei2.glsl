@@ -2,6 +2,18 @@
 
 layout(local_size_x = 32, local_size_y = 32, local_size_z = 1) in;
 
+layout(std430, binding = 7) readonly buffer TileBuffer {
+	uvec3 tile_groups;
+	uint tile_pad;
+	uvec2 tiles[];
+};
+
+uniform bool sparse = false;	// workgroups only run over listed active tiles
+
+ivec2 tile_origin() {
+	return ivec2(sparse ? tiles[gl_WorkGroupID.x] : gl_WorkGroupID.xy) * 32;
+}
+
 layout (rgba32f) uniform image2D pipe_map;
 layout (r32f) uniform image2D b_map;
 layout (r32f) uniform image2D d_map;
@@ -13,6 +25,7 @@ uniform float ly = 1;
 uniform ivec2 size = ivec2(512, 512);
 
 uniform float A = 1;
+uniform float drain_dt = 0.25;	// time over which outflow may drain a cell, stays at the fixed outflow step
 
 #define LEFT   (pos + ivec2(-1, 0))
 #define RIGHT  (pos + ivec2(+1, 0))
@@ -28,7 +41,7 @@ float heightAt(ivec2 pos) {
 }
 
 void main(void) {
-	ivec2 pos = ivec2(gl_GlobalInvocationID.xy);
+	ivec2 pos = tile_origin() + ivec2(gl_LocalInvocationID.xy);
 
 	float h = heightAt(pos); 
 	vec4 pipe = imageLoad(pipe_map, pos);
@@ -53,7 +66,7 @@ void main(void) {
 	float sum = pipe.x + pipe.y + pipe.z + pipe.w;
 	float water = lx * ly * imageLoad(d_map, pos).r;
 	//clamp instead of min due to NaNs
-	float K = clamp(water / (dt * sum), 0, 1);
+	float K = clamp(water / (drain_dt * sum), 0, 1);
 
 	pipe *= sum > water ? K : 1;
 	
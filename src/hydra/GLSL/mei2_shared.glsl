@@ -0,0 +1,95 @@
+#version 430
+
+// Variant of mei2 which loads water heights of the workgroup tile into shared memory.
+
+layout(local_size_x = 32, local_size_y = 32, local_size_z = 1) in;
+
+layout(std430, binding = 7) readonly buffer TileBuffer {
+	uvec3 tile_groups;
+	uint tile_pad;
+	uvec2 tiles[];
+};
+
+uniform bool sparse = false;	// workgroups only run over listed active tiles
+
+ivec2 tile_origin() {
+	return ivec2(sparse ? tiles[gl_WorkGroupID.x] : gl_WorkGroupID.xy) * 32;
+}
+
+layout (rgba32f) uniform image2D pipe_map;
+layout (r32f) uniform image2D b_map;
+layout (r32f) uniform image2D d_map;
+
+uniform float dt = 0.25;
+uniform float lx = 1;
+uniform float ly = 1;
+
+uniform ivec2 size = ivec2(512, 512);
+
+uniform float A = 1;
+uniform float drain_dt = 0.25;	// time over which outflow may drain a cell, stays at the fixed outflow step
+
+#define HALO 1
+#define TILE (32 + 2 * HALO)
+
+shared float tile[TILE][TILE];
+
+#define LEFT   (pos + ivec2(-1, 0))
+#define RIGHT  (pos + ivec2(+1, 0))
+#define UP     (pos + ivec2(0, -1))
+#define DOWN   (pos + ivec2(0, +1))
+
+//  1y -1
+//0x  2z
+//  3w +1
+
+void load_tile() {
+	ivec2 origin = tile_origin() - HALO;
+	for (uint i = gl_LocalInvocationIndex; i < TILE * TILE; i += 32 * 32) {
+		ivec2 local = ivec2(i % TILE, i / TILE);
+		ivec2 pos = origin + local;
+		tile[local.y][local.x] = imageLoad(b_map, pos).r + imageLoad(d_map, pos).r;
+	}
+	memoryBarrierShared();
+	barrier();
+}
+
+float heightAt(ivec2 pos) {
+	ivec2 local = pos - tile_origin() + HALO;
+	return tile[local.y][local.x];
+}
+
+void main(void) {
+	load_tile();
+
+	ivec2 pos = tile_origin() + ivec2(gl_LocalInvocationID.xy);
+
+	float h = heightAt(pos); 
+	vec4 pipe = imageLoad(pipe_map, pos);
+	float hN;
+
+	hN = h - heightAt(LEFT);
+	pipe.x = max(0, pipe.x + dt * A * hN * lx);
+	pipe.x *= float(pos.x > 0);
+
+	hN = h - heightAt(RIGHT);
+	pipe.z = max(0, pipe.z + dt * A * hN * lx);
+	pipe.z *= float(pos.x < size.x - 1);
+
+	hN = h - heightAt(UP);
+	pipe.y = max(0, pipe.y + dt * A * hN * ly);
+	pipe.y *= float(pos.y > 0);
+
+	hN = h - heightAt(DOWN);
+	pipe.w = max(0, pipe.w + dt * A * hN * ly);
+	pipe.w *= float(pos.y < size.y - 1);
+
+	float sum = pipe.x + pipe.y + pipe.z + pipe.w;
+	float water = lx * ly * imageLoad(d_map, pos).r;
+	//clamp instead of min due to NaNs
+	float K = clamp(water / (drain_dt * sum), 0, 1);
+
+	pipe *= sum > water ? K : 1;
+	
+	imageStore(pipe_map, pos, pipe);
+}//main
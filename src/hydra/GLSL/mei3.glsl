@@ -2,6 +2,18 @@
 
 layout(local_size_x = 32, local_size_y = 32, local_size_z = 1) in;
 
+layout(std430, binding = 7) readonly buffer TileBuffer {
+	uvec3 tile_groups;
+	uint tile_pad;
+	uvec2 tiles[];
+};
+
+uniform bool sparse = false;	// workgroups only run over listed active tiles
+
+ivec2 tile_origin() {
+	return ivec2(sparse ? tiles[gl_WorkGroupID.x] : gl_WorkGroupID.xy) * 32;
+}
+
 layout (rgba32f) uniform image2D pipe_map;
 layout (r32f) uniform image2D d_map;
 layout (r32f) uniform image2D c_map;    //capacity -> d_mean
@@ -20,7 +32,7 @@ uniform float ly = 1;
 //  3w +1
 
 void main(void) {
-	ivec2 pos = ivec2(gl_GlobalInvocationID.xy);
+	ivec2 pos = tile_origin() + ivec2(gl_LocalInvocationID.xy);
 
     vec4 pipe = imageLoad(pipe_map, pos);
     float inflow =
@@ -0,0 +1,143 @@
+#version 430
+
+// Fused water update (mei3), velocity and capacity (mei4) and erosion (mei5) step.
+// Neighbouring water levels are recomputed from the pipes, so height and water are ping-ponged.
+
+layout(local_size_x = 32, local_size_y = 32, local_size_z = 1) in;
+
+layout(std430, binding = 7) readonly buffer TileBuffer {
+	uvec3 tile_groups;
+	uint tile_pad;
+	uvec2 tiles[];
+};
+
+uniform bool sparse = false;	// workgroups only run over listed active tiles
+
+ivec2 tile_origin() {
+	return ivec2(sparse ? tiles[gl_WorkGroupID.x] : gl_WorkGroupID.xy) * 32;
+}
+
+uniform sampler2D b_sampler;
+uniform sampler2D d_sampler;
+uniform sampler2D pipe_sampler;
+
+layout (r32f) uniform image2D out_b_map;
+layout (r32f) uniform image2D out_d_map;
+layout (rg32f) uniform image2D v_map;
+layout (r32f) uniform image2D s_map;
+layout (r32f) uniform image2D c_map;    //new sediment
+
+layout (r32f) uniform image2D hardness_map;
+uniform bool use_hardness = false;
+uniform bool invert_hardness = false;
+
+uniform float dt = 0.25;
+uniform float lx = 1;
+uniform float ly = 1;
+uniform float scale = 1;
+uniform float depth_scale = 1;
+
+uniform float Kc = 0.1;
+uniform float Ks = 0.25;
+uniform float Kd = 0.25;
+
+uniform ivec2 size = ivec2(512, 512);
+
+#define LEFT   (pos + ivec2(-1, 0))
+#define RIGHT  (pos + ivec2(+1, 0))
+#define UP     (pos + ivec2(0, -1))
+#define DOWN   (pos + ivec2(0, +1))
+
+//  1y -1
+//0x  2z
+//  3w +1
+
+bool inside(ivec2 pos) {
+	return all(greaterThanEqual(pos, ivec2(0))) && all(lessThan(pos, size));
+}
+
+// zero outside like imageLoad
+vec4 pipeAt(ivec2 pos) {
+	return inside(pos) ? texelFetch(pipe_sampler, pos, 0) : vec4(0);
+}
+
+// volume change from the new pipe flows
+float flowAt(ivec2 pos) {
+	vec4 pipe = pipeAt(pos);
+	float inflow =
+		pipeAt(LEFT).z + pipeAt(RIGHT).x +
+		pipeAt(UP).w + pipeAt(DOWN).y;
+	float outflow = pipe.x + pipe.y + pipe.z + pipe.w;
+	return (inflow - outflow) * dt / (lx * ly);
+}
+
+// terrain and water height after the water update
+float heightAt(ivec2 pos) {
+	if (!inside(pos)) {
+		return 0;
+	}
+	return texelFetch(b_sampler, pos, 0).x + max(texelFetch(d_sampler, pos, 0).x + flowAt(pos), 0);
+}
+
+void main(void) {
+	ivec2 pos = tile_origin() + ivec2(gl_LocalInvocationID.xy);
+	if (!inside(pos)) {
+		return;
+	}
+
+	// mei3
+	vec4 pipe = pipeAt(pos);
+	float dv = flowAt(pos);
+	float d1 = texelFetch(d_sampler, pos, 0).x;
+
+	float dmean = max(d1 + dv / 2, 0);
+	float d = max(d1 + dv, 0);
+
+	// mei4
+	dmean = max(dmean, 1e-5);
+
+	float du = pipeAt(LEFT).z - pipeAt(RIGHT).x
+		+ pipe.z - pipe.x;
+
+	float u = 0.5 * du / (dmean * ly);
+
+	float dw = pipeAt(UP).w - pipeAt(DOWN).y
+		+ pipe.w - pipe.y;
+
+	float v = 0.5 * dw / (dmean * lx);
+
+	imageStore(v_map, pos, vec4(u,v,0,0));
+
+	float sx = 0.5 * abs(heightAt(RIGHT) - heightAt(LEFT)) * scale;
+	float sy = 0.5 * abs(heightAt(DOWN) - heightAt(UP)) * scale;
+	float slope = sqrt(sx * sx + sy * sy);
+
+	float c = slope * length(vec2(u,v)) * Kc * max(1 - depth_scale * dmean, 0);
+
+	// mei5
+	float b = texelFetch(b_sampler, pos, 0).x;
+	float s = imageLoad(s_map, pos).x;
+
+	float ks = Ks;
+
+	if (use_hardness) {
+		float hardness = imageLoad(hardness_map, pos).x;
+		if (!invert_hardness) {
+			hardness = 1 - hardness;
+		}
+		ks = clamp(ks * hardness, 0, 1);
+	}
+
+	float dif = (c > s ? ks : Kd) * (c - s);
+	dif = clamp(dif, -d, b);
+
+	b -= dif;
+	s += dif;
+	d += dif;
+
+	s = max(s, 0.0);
+
+	imageStore(out_b_map, pos, vec4(b));
+	imageStore(out_d_map, pos, vec4(d));
+	imageStore(c_map, pos, vec4(s));
+}//main
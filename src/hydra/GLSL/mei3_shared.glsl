@@ -0,0 +1,76 @@
+#version 430
+
+// Variant of mei3 which loads pipes of the workgroup tile into shared memory.
+
+layout(local_size_x = 32, local_size_y = 32, local_size_z = 1) in;
+
+layout(std430, binding = 7) readonly buffer TileBuffer {
+	uvec3 tile_groups;
+	uint tile_pad;
+	uvec2 tiles[];
+};
+
+uniform bool sparse = false;	// workgroups only run over listed active tiles
+
+ivec2 tile_origin() {
+	return ivec2(sparse ? tiles[gl_WorkGroupID.x] : gl_WorkGroupID.xy) * 32;
+}
+
+layout (rgba32f) uniform image2D pipe_map;
+layout (r32f) uniform image2D d_map;
+layout (r32f) uniform image2D c_map;    //capacity -> d_mean
+
+uniform float dt = 0.25;
+uniform float lx = 1;
+uniform float ly = 1;
+
+#define HALO 1
+#define TILE (32 + 2 * HALO)
+
+shared vec4 tile[TILE][TILE];
+
+#define LEFT   (pos + ivec2(-1, 0))
+#define RIGHT  (pos + ivec2(+1, 0))
+#define UP     (pos + ivec2(0, -1))
+#define DOWN   (pos + ivec2(0, +1))
+
+//  1y -1
+//0x  2z
+//  3w +1
+
+void load_tile() {
+	ivec2 origin = tile_origin() - HALO;
+	for (uint i = gl_LocalInvocationIndex; i < TILE * TILE; i += 32 * 32) {
+		ivec2 local = ivec2(i % TILE, i / TILE);
+		tile[local.y][local.x] = imageLoad(pipe_map, origin + local);
+	}
+	memoryBarrierShared();
+	barrier();
+}
+
+vec4 pipeAt(ivec2 pos) {
+	ivec2 local = pos - tile_origin() + HALO;
+	return tile[local.y][local.x];
+}
+
+void main(void) {
+	load_tile();
+
+	ivec2 pos = tile_origin() + ivec2(gl_LocalInvocationID.xy);
+
+	vec4 pipe = pipeAt(pos);
+	float inflow =
+		pipeAt(LEFT).z + pipeAt(RIGHT).x +
+		pipeAt(UP).w + pipeAt(DOWN).y;
+	float outflow = pipe.x + pipe.y + pipe.z + pipe.w;
+	float dv = inflow - outflow;
+
+	dv *= dt / (lx * ly);
+
+	float d1 = imageLoad(d_map, pos).x;
+
+	float d = max(d1 + dv / 2, 0);
+	imageStore(c_map, pos, vec4(d));  //d_mean
+	d = max(d1 + dv, 0);
+	imageStore(d_map, pos, vec4(d));  //d2
+}//main
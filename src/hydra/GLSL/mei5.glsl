@@ -2,6 +2,18 @@
 
 layout(local_size_x = 32, local_size_y = 32, local_size_z = 1) in;
 
+layout(std430, binding = 7) readonly buffer TileBuffer {
+	uvec3 tile_groups;
+	uint tile_pad;
+	uvec2 tiles[];
+};
+
+uniform bool sparse = false;	// workgroups only run over listed active tiles
+
+ivec2 tile_origin() {
+	return ivec2(sparse ? tiles[gl_WorkGroupID.x] : gl_WorkGroupID.xy) * 32;
+}
+
 layout (r32f) uniform image2D b_map;
 layout (r32f) uniform image2D d_map;
 layout (r32f) uniform image2D s_map;
@@ -15,7 +27,7 @@ uniform float Ks = 0.25;
 uniform float Kd = 0.25;
 
 void main(void) {
-	ivec2 pos = ivec2(gl_GlobalInvocationID.xy);
+	ivec2 pos = tile_origin() + ivec2(gl_LocalInvocationID.xy);
 
 	float c = imageLoad(c_map, pos).x;
     float b = imageLoad(b_map, pos).x;
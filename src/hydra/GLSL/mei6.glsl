@@ -2,6 +2,18 @@
 
 layout(local_size_x = 32, local_size_y = 32, local_size_z = 1) in;
 
+layout(std430, binding = 7) readonly buffer TileBuffer {
+	uvec3 tile_groups;
+	uint tile_pad;
+	uvec2 tiles[];
+};
+
+uniform bool sparse = false;	// workgroups only run over listed active tiles
+
+ivec2 tile_origin() {
+	return ivec2(sparse ? tiles[gl_WorkGroupID.x] : gl_WorkGroupID.xy) * 32;
+}
+
 uniform sampler2D s_sampler;
 uniform sampler2D v_sampler;
 
@@ -13,7 +25,7 @@ uniform float dt = 0.25;
 uniform vec2 tile_mult = vec2(1/512, 1/512);
 
 void main(void) {
-	ivec2 pos = ivec2(gl_GlobalInvocationID.xy);
+	ivec2 pos = tile_origin() + ivec2(gl_LocalInvocationID.xy);
 
 	vec2 vel = dt * imageLoad(v_map, pos).xy;
     vec2 vpos = vec2(pos) - vel;
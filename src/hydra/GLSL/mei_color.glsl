@@ -3,7 +3,6 @@
 layout(local_size_x = 32, local_size_y = 32, local_size_z = 1) in;
 
 uniform sampler2D color_sampler;
-layout (rgba32f) uniform image2D color_map;
 uniform sampler2D v_sampler;
 layout (rg32f) uniform image2D v_map;
 layout (rgba32f) uniform image2D out_color_map;
@@ -33,7 +32,7 @@ void main(void) {
 	vpos += 0.5 * (vec2(pos) - vpos2);
 
     vec4 new_color = texture(color_sampler, (vpos + vec2(0.5)) * tile_mult);
-    vec4 current_color = imageLoad(color_map, pos);
+    vec4 current_color = texelFetch(color_sampler, pos, 0);
 
     imageStore(out_color_map, pos, new_color * color_factor + current_color * (1 - color_factor));
 }//main
\ No newline at end of file
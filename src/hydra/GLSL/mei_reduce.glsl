@@ -0,0 +1,40 @@
+#version 430
+
+// Per-workgroup maximum of flow speed in water deeper than min_depth, for adaptive time steps.
+
+layout(local_size_x = 32, local_size_y = 32, local_size_z = 1) in;
+
+layout (rg32f) uniform image2D v_map;
+layout (r32f) uniform image2D d_map;
+
+uniform float min_depth = 1e-3;	// thin films drain in a single step, their speed grows as the step shrinks
+
+layout(std430, binding = 0) writeonly buffer PartialBuffer {
+	float partials[];
+};
+
+shared float values[1024];
+
+void main(void) {
+	ivec2 pos = ivec2(gl_GlobalInvocationID.xy);
+	uint lid = gl_LocalInvocationIndex;
+
+	vec2 v = abs(imageLoad(v_map, pos).xy);
+	float d = imageLoad(d_map, pos).x;
+
+	values[lid] = d > min_depth ? max(v.x, v.y) : 0;
+	memoryBarrierShared();
+	barrier();
+
+	for (uint stride = 512u; stride > 0u; stride >>= 1u) {
+		if (lid < stride) {
+			values[lid] = max(values[lid], values[lid + stride]);
+		}
+		memoryBarrierShared();
+		barrier();
+	}
+
+	if (lid == 0u) {
+		partials[gl_WorkGroupID.y * gl_NumWorkGroups.x + gl_WorkGroupID.x] = values[0];
+	}
+}//main
@@ -0,0 +1,78 @@
+#version 430
+
+// Builds the list of active tiles for sparse dispatch of the pipe-based solver.
+// A tile is active if any cell in it or its 1 cell halo holds water, sediment or flow,
+// or if rain can fall on it. Inactive tiles would stay unchanged by every pass.
+// Tiles stay active for one more step after drying up, so that both ping-pong buffers
+// of the fused kernels hold the same settled values.
+
+layout(local_size_x = 32, local_size_y = 32, local_size_z = 1) in;
+
+layout (rgba32f) uniform image2D pipe_map;
+layout (rg32f) uniform image2D v_map;
+layout (r32f) uniform image2D d_map;
+layout (r32f) uniform image2D s_map;
+layout (r32f) uniform image2D c_map;
+layout (r32f) uniform image2D water_src;
+
+uniform bool use_water_src = false;
+uniform bool raining = false;
+uniform float threshold = 1e-6;
+
+layout(std430, binding = 7) buffer TileBuffer {
+	uvec3 tile_groups;	// indirect dispatch arguments, x is the number of active tiles
+	uint tile_pad;
+	uvec2 tiles[];
+};
+
+layout(std430, binding = 6) buffer WetBuffer {
+	uint was_wet[];
+};
+
+#define HALO 1
+#define TILE (32 + 2 * HALO)
+
+shared bool tile_wet;
+
+bool wet(ivec2 pos) {
+	vec4 pipe = imageLoad(pipe_map, pos);
+	vec2 v = imageLoad(v_map, pos).xy;
+	float m = max(max(max(pipe.x, pipe.y), max(pipe.z, pipe.w)), max(abs(v.x), abs(v.y)));
+	m = max(m, max(imageLoad(d_map, pos).x, imageLoad(s_map, pos).x));
+	m = max(m, imageLoad(c_map, pos).x);
+	return m > threshold;
+}
+
+void main(void) {
+	uint lid = gl_LocalInvocationIndex;
+	if (lid == 0u) {
+		tile_wet = raining && !use_water_src;
+	}
+	memoryBarrierShared();
+	barrier();
+
+	ivec2 origin = ivec2(gl_WorkGroupID.xy) * 32 - HALO;
+	bool found = false;
+	for (uint i = lid; i < TILE * TILE && !found; i += 32 * 32) {
+		ivec2 pos = origin + ivec2(i % TILE, i / TILE);
+		found = wet(pos);
+	}
+
+	if (raining && use_water_src) {
+		found = found || imageLoad(water_src, ivec2(gl_GlobalInvocationID.xy)).x > 0;
+	}
+
+	if (found) {
+		tile_wet = true;
+	}
+	memoryBarrierShared();
+	barrier();
+
+	if (lid == 0u) {
+		uint id = gl_WorkGroupID.y * gl_NumWorkGroups.x + gl_WorkGroupID.x;
+		if (tile_wet || was_wet[id] != 0u) {
+			tiles[atomicAdd(tile_groups.x, 1u)] = gl_WorkGroupID.xy;
+		}
+		was_wet[id] = tile_wet ? 1u : 0u;
+	}
+}//main
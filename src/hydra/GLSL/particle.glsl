@@ -6,8 +6,12 @@ uniform sampler2D height_sampler;
 uniform sampler2D hardness_sampler;
 
 layout (r32f) uniform image2D height_map;
+layout (r32i, binding = 3) uniform iimage2D delta_map;	// fixed unit, integer image uniforms are not settable through ModernGL
 
-uniform ivec2 tile_size = ivec2(32,32);
+uniform bool use_atomic = false;
+uniform float fixed_scale = 1048576.0;
+
+uniform vec2 tile_size = vec2(32.0, 32.0);
 uniform vec2 tile_mult = vec2(1.0/512.0,1.0/512.0);
 
 uniform int lifetime = 50;
@@ -28,6 +32,32 @@ uniform float max_change = 0.01;
 uniform bool use_hardness = false;
 uniform bool invert_hardness = false;
 
+layout (rgba32f) uniform image2D color_map;
+uniform bool transport_color = false;
+uniform float color_strength = 0.5;
+
+void colorize(vec2 pos, vec4 col, float strength) {
+	pos -= vec2(0.5,0.5);
+	vec2 factor = pos - floor(pos);
+	ivec2 corner = ivec2(floor(pos)); //has to have floor
+
+	//X Y
+	float f = strength * (1-factor.x) * (1-factor.y);
+	imageStore(color_map, corner, mix(imageLoad(color_map, corner), col, f));
+
+	//X+1 Y
+	f = strength * factor.x * (1-factor.y);
+	imageStore(color_map, corner + ivec2(1,0), mix(imageLoad(color_map, corner + ivec2(1,0)), col, f));
+
+	//X Y+1
+	f = strength * (1-factor.x) * factor.y;
+	imageStore(color_map, corner + ivec2(0,1), mix(imageLoad(color_map, corner + ivec2(0,1)), col, f));
+
+	//X+1 Y+1
+	f = strength * factor.x * factor.y;
+	imageStore(color_map, corner + ivec2(1,1), mix(imageLoad(color_map, corner + ivec2(1,1)), col, f));
+}
+
 // pcg3d hashing algorithm from:
 // Author: Mark Jarzynski and Marc Olano
 // Title: Hash Functions for GPU Rendering
@@ -54,6 +84,7 @@ void erode(uvec2 base, int seed) {
 	vec2 dir = normalize(vel);
 
 	float saturation = 0.0;
+	vec4 col = transport_color ? imageLoad(color_map, ivec2(pos)) : vec4(0);
 	
 	for (int i = 0; i < lifetime; ++i) {
 		float dir_mult = (i & 1) == 0 ? 1.0 : -1.0; // swapping lateral checks prevents biased rotation
@@ -88,8 +119,21 @@ void erode(uvec2 base, int seed) {
 		saturation += dif;
 		
 		ivec2 ipos = ivec2(floor(pos));
-		imageStore(height_map, ipos, imageLoad(height_map, ipos) - vec4(dif));
+		if (use_atomic) {
+			// fixed-point accumulation is order independent -> deterministic
+			imageAtomicAdd(delta_map, ipos, int(round(-dif * fixed_scale)));
+		}
+		else {
+			imageStore(height_map, ipos, imageLoad(height_map, ipos) - vec4(dif));
+		}
 
+		if (transport_color) {
+			// eroded material picks up the surface color, deposited material paints it
+			col = mix(col, imageLoad(color_map, ipos), (1 - color_strength) * float(dif > 0));
+			if (dif < 0) {
+				colorize(pos, col, color_strength);
+			}
+		}
 		pos += dir;
 		
 		vel *= drag;
@@ -7,7 +7,7 @@ uniform sampler2D height_sampler;
 layout (r32f) uniform image2D height_map;
 layout (rgba32f) uniform image2D color_map;
 
-uniform ivec2 tile_size = ivec2(32, 32);
+uniform vec2 tile_size = vec2(32.0, 32.0);
 uniform vec2 tile_mult = vec2(1.0/512.0,1.0/512.0);
 
 uniform int iterations = 100 * 20;
@@ -0,0 +1,141 @@
+#version 430
+
+layout(local_size_x = 256, local_size_y = 1, local_size_z = 1) in;
+
+struct Particle {
+	vec2 pos;
+	vec2 vel;
+	float saturation;
+	int age;
+};
+
+layout(std430, binding = 0) buffer ParticleBuffer {
+	Particle particles[];
+};
+
+layout(std430, binding = 2) writeonly buffer FlagBuffer {
+	uint flags[];
+};
+
+layout(std430, binding = 5) readonly buffer ArgBuffer {
+	uvec3 groups;
+	uint count;
+};
+
+uniform sampler2D height_sampler;
+uniform sampler2D hardness_sampler;
+
+layout (r32f) uniform image2D height_map;
+layout (r32i, binding = 3) uniform iimage2D delta_map;	// fixed unit, integer image uniforms are not settable through ModernGL
+
+uniform bool use_atomic = false;
+uniform float fixed_scale = 1048576.0;
+
+uniform ivec2 size = ivec2(512, 512);
+uniform vec2 tile_mult = vec2(1.0/512.0,1.0/512.0);
+
+uniform int lifetime = 50;
+uniform int steps = 8;
+
+uniform float acceleration = 0.5;
+uniform float lateral_acceleration = 1.0;
+uniform float max_velocity = 3.0;
+uniform float min_velocity = 0.000002;
+uniform float drag = 0.9;
+
+uniform float capacity_factor = 0.5;
+uniform float erosion_strength = 0.25;
+uniform float deposition_strength = 0.5;
+
+uniform float max_change = 0.01;
+
+uniform bool use_hardness = false;
+uniform bool invert_hardness = false;
+
+void deposit(ivec2 ipos, float dif) {
+	if (use_atomic) {
+		imageAtomicAdd(delta_map, ipos, int(round(-dif * fixed_scale)));
+	}
+	else {
+		imageStore(height_map, ipos, imageLoad(height_map, ipos) - vec4(dif));
+	}
+}
+
+void main(void) {
+	uint id = gl_GlobalInvocationID.x;
+	if (id >= count) {
+		return;
+	}
+
+	Particle p = particles[id];
+	vec2 pos = p.pos;
+	vec2 vel = p.vel;
+	float saturation = p.saturation;
+	int age = p.age;
+
+	bool alive = true;
+
+	for (int i = 0; i < steps; ++i) {
+		if (age >= lifetime || any(lessThan(pos, vec2(0))) || any(greaterThanEqual(pos, vec2(size)))) {
+			alive = false;
+			break;
+		}
+
+		// negated comparison also catches NaNs
+		if (!(length(vel) >= min_velocity)) { // stalled -> drop remaining sediment
+			deposit(ivec2(floor(pos)), -saturation);
+			alive = false;
+			break;
+		}
+
+		vec2 dir = normalize(vel);
+		float dir_mult = (age & 1) == 0 ? 1.0 : -1.0; // swapping lateral checks prevents biased rotation
+		float height = texture(height_sampler, tile_mult * pos).x;
+		float height_vel = texture(height_sampler, tile_mult * (pos + dir)).x;
+		float height_dir = texture(height_sampler, tile_mult * (pos + dir_mult * vec2(-dir.y, dir.x))).x;
+
+		vel += acceleration * (
+			(height - height_vel) * dir +
+			lateral_acceleration * (height - height_dir) * dir_mult * vec2(-dir.y, dir.x)
+		);
+
+		float len = min(length(vel), max_velocity);
+		if (!(len >= min_velocity)) {
+			deposit(ivec2(floor(pos)), -saturation);
+			alive = false;
+			break;
+		}
+
+		dir = normalize(vel);
+		vel = dir * len;
+
+		float capacity = capacity_factor * len * float(height > height_vel);
+
+		float dif = capacity-saturation;
+
+		float erosion_str = erosion_strength;
+
+		if (use_hardness) {
+			float hardness = texture(hardness_sampler, tile_mult * pos).x;
+			if (!invert_hardness) hardness = 1 - hardness;
+			erosion_str *= clamp(hardness, 0, 1);
+		}
+
+		dif *= dif >= 0 ? erosion_str : deposition_strength;
+
+		dif = clamp(dif, -max_change, max_change);
+		saturation += dif;
+
+		deposit(ivec2(floor(pos)), dif);
+
+		pos += dir;
+
+		vel *= drag;
+		++age;
+	}
+
+	alive = alive && age < lifetime && all(greaterThanEqual(pos, vec2(0))) && all(lessThan(pos, vec2(size)));
+
+	particles[id] = Particle(pos, vel, saturation, age);
+	flags[id] = alive ? 1u : 0u;
+}//main
@@ -0,0 +1,108 @@
+#version 430
+
+layout(local_size_x = 256, local_size_y = 1, local_size_z = 1) in;
+
+// Stream compaction of the particle pool:
+// stage 0 - exclusive scan of alive flags within each workgroup
+// stage 1 - exclusive scan of workgroup sums, writes next dispatch arguments (single workgroup)
+// stage 2 - scatter of alive particles into the output buffer
+
+struct Particle {
+	vec2 pos;
+	vec2 vel;
+	float saturation;
+	int age;
+};
+
+layout(std430, binding = 0) readonly buffer ParticleBuffer {
+	Particle particles[];
+};
+
+layout(std430, binding = 1) writeonly buffer OutParticleBuffer {
+	Particle out_particles[];
+};
+
+layout(std430, binding = 2) readonly buffer FlagBuffer {
+	uint flags[];
+};
+
+layout(std430, binding = 3) buffer OffsetBuffer {
+	uint offsets[];
+};
+
+layout(std430, binding = 4) buffer BlockBuffer {
+	uint block_sums[];
+};
+
+layout(std430, binding = 5) readonly buffer ArgBuffer {
+	uvec3 groups;
+	uint count;
+};
+
+layout(std430, binding = 6) writeonly buffer OutArgBuffer {
+	uvec3 out_groups;
+	uint out_count;
+};
+
+uniform int stage = 0;
+
+shared uint scan[256];
+
+uint inclusive_scan(uint value) {
+	uint lid = gl_LocalInvocationID.x;
+	scan[lid] = value;
+	memoryBarrierShared();
+	barrier();
+
+	for (uint offset = 1u; offset < 256u; offset <<= 1u) {
+		uint add = lid >= offset ? scan[lid - offset] : 0u;
+		memoryBarrierShared();
+		barrier();
+		scan[lid] += add;
+		memoryBarrierShared();
+		barrier();
+	}
+
+	return scan[lid];
+}
+
+void main(void) {
+	uint id = gl_GlobalInvocationID.x;
+	uint lid = gl_LocalInvocationID.x;
+
+	if (stage == 0) {
+		uint flag = id < count ? flags[id] : 0u;
+		uint inclusive = inclusive_scan(flag);
+		if (id < count) {
+			offsets[id] = inclusive - flag;
+		}
+		if (lid == 255u) {
+			block_sums[gl_WorkGroupID.x] = inclusive;
+		}
+	}
+	else if (stage == 1) {
+		uint blocks = groups.x;
+		uint carry = 0u;
+		for (uint start = 0u; start < blocks; start += 256u) {
+			uint i = start + lid;
+			uint value = i < blocks ? block_sums[i] : 0u;
+			uint inclusive = inclusive_scan(value);
+			if (i < blocks) {
+				block_sums[i] = carry + inclusive - value;
+			}
+			carry += scan[255];
+			memoryBarrierShared();
+			barrier();
+		}
+
+		if (lid == 0u) {
+			out_count = carry;
+			out_groups = uvec3((carry + 255u) / 256u, 1u, 1u);
+		}
+	}
+	else {
+		if (id < count && flags[id] != 0u) {
+			out_particles[block_sums[gl_WorkGroupID.x] + offsets[id]] = particles[id];
+		}
+	}
+}//main
@@ -0,0 +1,55 @@
+#version 430
+
+layout(local_size_x = 256, local_size_y = 1, local_size_z = 1) in;
+
+struct Particle {
+	vec2 pos;
+	vec2 vel;
+	float saturation;
+	int age;
+};
+
+layout(std430, binding = 0) writeonly buffer ParticleBuffer {
+	Particle particles[];
+};
+
+uniform sampler2D height_sampler;
+
+uniform ivec2 grid = ivec2(256, 256);
+uniform vec2 tile_size = vec2(2.0, 2.0);
+uniform vec2 tile_mult = vec2(1.0/512.0,1.0/512.0);
+
+uniform float acceleration = 0.5;
+uniform int seed = 1;
+
+// pcg3d hashing algorithm from:
+// Author: Mark Jarzynski and Marc Olano
+// Title: Hash Functions for GPU Rendering
+// Journal: Journal of Computer Graphics Techniques (JCGT), vol. 9, no. 3, 21-38, 2020
+uvec3 hash(uvec3 v) {
+	v = v * 1664525u + 1013904223u;
+	v.x += v.y * v.z; v.y += v.z * v.x; v.z += v.x * v.y;
+	v ^= v >>16u;
+	v.x += v.y * v.z; v.y += v.z*v.x; v.z += v.x*v.y;
+	return v;
+}
+
+void main(void) {
+	uint id = gl_GlobalInvocationID.x;
+	if (id >= uint(grid.x * grid.y)) {
+		return;
+	}
+
+	uvec2 base = uvec2(id % uint(grid.x), id / uint(grid.x));
+	vec2 pos = (hash(uvec3(base.x, base.y, seed)).xy & (16384u - 1u)) / 8192.0;
+	pos = (pos + base) * tile_size;
+
+	float height = texture(height_sampler, tile_mult * pos).x;
+
+	vec2 vel = acceleration * vec2(
+		height - texture(height_sampler, tile_mult * (pos + vec2(1, 0))).x,
+		height - texture(height_sampler, tile_mult * (pos + vec2(0, 1))).x
+	);
+
+	particles[id] = Particle(pos, vel, 0.0, 0);
+}//main
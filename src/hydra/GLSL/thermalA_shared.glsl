@@ -0,0 +1,120 @@
+#version 430
+
+// Variant of thermalA which loads heights of the workgroup tile into shared memory.
+// Strides larger than the halo fall back to image loads.
+
+layout(local_size_x = 32, local_size_y = 32, local_size_z = 1) in;
+
+layout (r32f) uniform image2D mapH;
+layout (r32f) uniform image2D offset;
+
+uniform bool useOffset = false;
+
+layout (rgba32f) uniform image2D requests;
+
+uniform float bx = 1.0;
+uniform float by = 1.0;
+
+uniform float Ks = 0.5;
+
+uniform float alpha = 0.005;
+
+uniform bool diagonal = false;
+uniform int ds = 1;
+
+uniform ivec2 size = ivec2(512,512);
+
+#define HALO 4
+#define TILE (32 + 2 * HALO)
+
+shared float tile[TILE][TILE];
+
+float loadH(ivec2 pos) {
+	if (useOffset) {
+		return imageLoad(mapH, pos).x + imageLoad(offset, pos).x;
+	}
+	else {
+		return imageLoad(mapH, pos).x;
+	}
+}
+
+void load_tile() {
+	ivec2 origin = ivec2(gl_WorkGroupID.xy) * 32 - HALO;
+	for (uint i = gl_LocalInvocationIndex; i < TILE * TILE; i += 32 * 32) {
+		ivec2 local = ivec2(i % TILE, i / TILE);
+		tile[local.y][local.x] = loadH(origin + local);
+	}
+	memoryBarrierShared();
+	barrier();
+}
+
+float getH(ivec2 pos) {
+	if (ds > HALO) {
+		return loadH(pos);
+	}
+	ivec2 local = pos - ivec2(gl_WorkGroupID.xy) * 32 + HALO;
+	return tile[local.y][local.x];
+}
+
+//  1y
+//0x  2z
+//  3w
+
+void main(void) {
+	if (ds <= HALO) {	// uniform for the whole dispatch
+		load_tile();
+	}
+
+	ivec2 base = ivec2(gl_GlobalInvocationID.xy);
+	
+	float lx = (diagonal ? bx * sqrt(2) : bx) * ds;
+	float ly = (diagonal ? by * sqrt(2) : by) * ds;
+	
+	float h = getH(base);
+
+	vec4 p = vec4(0.0);
+
+	float dh;
+	ivec2 npos;
+
+	npos = base + ivec2(-ds, diagonal ? -ds : 0);
+	dh = getH(npos) - h;
+	p.x = dh + (dh > 0 ? -1 : 1) * alpha * lx;
+	p.x *= float(abs(dh) > alpha * lx);
+	p.x *= float(npos.x >= 0 && npos.y >= 0);
+
+	npos = base + ivec2(diagonal ? -ds : 0, ds);
+	dh = getH(npos) - h;
+	p.y = dh + (dh > 0 ? -1 : 1) * alpha * ly;
+	p.y *= float(abs(dh) > alpha * ly);
+	p.y *= float(npos.x >= 0 && npos.y < size.y);
+	
+	npos = base + ivec2(ds, diagonal ? ds : 0);
+	dh = getH(npos) - h;
+	p.z = dh + (dh > 0 ? -1 : 1) * alpha * lx;
+	p.z *= float(abs(dh) > alpha * lx);
+	p.z *= float(npos.x < size.x && npos.y < size.y);
+	
+	npos = base + ivec2(diagonal ? ds : 0, -ds);
+	dh = getH(npos) - h;
+	p.w = dh + (dh > 0 ? -1 : 1) * alpha * ly;
+	p.w *= float(abs(dh) > alpha * ly);
+	p.w *= float(npos.x < size.x && npos.y >= 0);
+	
+	vec4 d = 0.5 * (p + abs(p));	//positive part
+	vec4 s = p - d;	//negative part
+
+	float mx = max(max(d.x, d.y), max(d.z, d.w));
+
+	h = imageLoad(mapH, base).x;
+	//(Negative min) - can supply at most h material
+	float mn = max(-h, min(min(s.x, s.y), min(s.z, s.w)));
+
+	//clamp instead of min for NaNs
+	float Cd = clamp(Ks * mx / (d.x + d.y + d.z + d.w), 0, 1);
+	float Cs = clamp(Ks * mn / (s.x + s.y + s.z + s.w), 0, 1);
+
+	vec4 ret = s * Cs + d * Cd;
+	
+	imageStore(requests, base, ret);
+}
@@ -0,0 +1,73 @@
+#version 430
+
+// Variant of thermalB which loads requests of the workgroup tile into shared memory.
+// Strides larger than the halo fall back to image loads.
+
+layout(local_size_x = 32, local_size_y = 32, local_size_z = 1) in;
+
+layout (r32f) uniform image2D mapH;
+layout (rgba32f) uniform image2D requests;
+
+layout (r32f) uniform image2D outH;
+
+uniform int ds = 1;
+
+uniform bool diagonal = false;
+
+#define HALO 4
+#define TILE (32 + 2 * HALO)
+
+shared vec4 tile[TILE][TILE];
+
+void load_tile() {
+	ivec2 origin = ivec2(gl_WorkGroupID.xy) * 32 - HALO;
+	for (uint i = gl_LocalInvocationIndex; i < TILE * TILE; i += 32 * 32) {
+		ivec2 local = ivec2(i % TILE, i / TILE);
+		tile[local.y][local.x] = imageLoad(requests, origin + local);
+	}
+	memoryBarrierShared();
+	barrier();
+}
+
+vec4 getRequest(ivec2 pos) {
+	if (ds > HALO) {
+		return imageLoad(requests, pos);
+	}
+	ivec2 local = pos - ivec2(gl_WorkGroupID.xy) * 32 + HALO;
+	return tile[local.y][local.x];
+}
+
+//  1y
+//0x  2z
+//  3w
+
+void main(void) {
+	if (ds <= HALO) {	// uniform for the whole dispatch
+		load_tile();
+	}
+
+	ivec2 base = ivec2(gl_GlobalInvocationID.xy);
+	
+	float nh = imageLoad(mapH, base).x;
+	vec4 request = getRequest(base);
+
+	float inp, sw;
+	
+	inp = -getRequest(base + ivec2(-ds, diagonal ? -ds : 0)).z;
+	sw = inp < 0 ? -1 : 1;
+	nh += (request.x * sw < inp * sw) ? request.x : inp;
+	
+	inp = -getRequest(base + ivec2(diagonal ? -ds : 0, ds)).w;
+	sw = inp < 0 ? -1 : 1;
+	nh += (request.y * sw < inp * sw) ? request.y : inp;
+	
+	inp = -getRequest(base + ivec2(ds, diagonal ? ds : 0)).x;
+	sw = inp < 0 ? -1 : 1;
+	nh += (request.z * sw < inp * sw) ? request.z : inp;
+	
+	inp = -getRequest(base + ivec2(diagonal ? ds : 0, -ds)).y;
+	sw = inp < 0 ? -1 : 1;
+	nh += (request.w * sw < inp * sw) ? request.w : inp;
+	
+	imageStore(outH, base, vec4(nh));
+}
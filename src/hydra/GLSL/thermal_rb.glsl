@@ -0,0 +1,68 @@
+#version 430
+
+// In-place thermal erosion between pairs of cells.
+// Each invocation owns one pair (pos, pos + direction * ds), pairs of one parity never share a cell,
+// so both cells are updated directly in the heightmap. Running both parities covers every neighbor pair.
+
+layout(local_size_x = 32, local_size_y = 32, local_size_z = 1) in;
+
+layout (r32f) uniform image2D mapH;
+layout (r32f) uniform image2D offset;
+
+uniform bool useOffset = false;
+
+uniform float bx = 1.0;
+uniform float by = 1.0;
+
+uniform float Ks = 0.5;
+
+uniform float alpha = 0.005;
+
+uniform ivec2 direction = ivec2(1, 0);	// (1,0), (0,1), (1,1) or (1,-1)
+uniform int parity = 0;
+uniform int ds = 1;
+
+uniform ivec2 size = ivec2(512,512);
+
+float getH(ivec2 pos, float h) {
+	if (useOffset) {
+		return h + imageLoad(offset, pos).x;
+	}
+	else {
+		return h;
+	}
+}
+
+// maps the invocation index along the paired axis to the first cell of its pair
+int pairStart(int k) {
+	return (2 * (k / ds) + parity) * ds + k % ds;
+}
+
+void main(void) {
+	ivec2 id = ivec2(gl_GlobalInvocationID.xy);
+	ivec2 a = direction.x != 0 ? ivec2(pairStart(id.x), id.y) : ivec2(id.x, pairStart(id.y));
+	ivec2 b = a + direction * ds;
+
+	if (any(greaterThanEqual(a, size)) || any(lessThan(b, ivec2(0))) || any(greaterThanEqual(b, size))) {
+		return;
+	}
+
+	bool diagonal = direction.x != 0 && direction.y != 0;
+	float l = ((direction.x != 0 && direction.y >= 0) ? bx : by) * (diagonal ? sqrt(2) : 1) * ds;
+
+	float ha = imageLoad(mapH, a).x;
+	float hb = imageLoad(mapH, b).x;
+
+	float dh = getH(a, ha) - getH(b, hb);
+	float excess = abs(dh) - alpha * l;
+
+	if (excess <= 0) {
+		return;
+	}
+
+	// the higher cell can supply at most its own material
+	float m = dh > 0 ? min(Ks * excess, max(ha, 0)) : -min(Ks * excess, max(hb, 0));
+
+	imageStore(mapH, a, vec4(ha - m));
+	imageStore(mapH, b, vec4(hb + m));
+}
@@ -33,14 +33,20 @@ checkModernGL()
 # Init:
 # ------------------------------------------------------------
 
-import bpy
-from Hydra import startup
-
-if not _hydra_invalid:
+try:
+	import bpy
+except ImportError:
+	bpy = None	# imported outside of Blender as a library, see :mod:`Hydra.core`
+
+if bpy is None:
+	_classes = []
+elif not _hydra_invalid:
+	from Hydra import startup
 	from Hydra import common, opengl
 	from Hydra.addon import get_exports, properties
 	_classes = get_exports()
 else:
+	from Hydra import startup
 	from Hydra.addon.preferences import get_exports
 	_classes = get_exports()
 
@@ -71,6 +77,11 @@ def register():
 			print(f"Failed to initialize OpenGL context: {e}")
 			startup.invalid = True
 
+		try:
+			common.get_preferences().update_shader_variant(bpy.context)
+		except KeyError:
+			pass	# preferences not available yet, stays on default shaders
+
 		bpy.types.Object.hydra_erosion = PointerProperty(type=properties.ErosionGroup)
 		bpy.types.Image.hydra_erosion = PointerProperty(type=properties.ErosionGroup)
 
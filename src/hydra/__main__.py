@@ -0,0 +1,6 @@
+"""Command-line batch simulations. Run `python -m Hydra --help` for usage."""
+
+import sys
+from Hydra.core import batch
+
+sys.exit(batch.main())
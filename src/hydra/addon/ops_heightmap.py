@@ -310,6 +310,85 @@ class ForceReloadOp(ops_common.HydraOperator):
 	def invoke(self, ctx, event):
 		return ctx.window_manager.invoke_confirm(self, event)
 
+#-------------------------------------------- State
+
+class SaveStateOp(ops_common.HydraOperator):
+	"""Save solver state operator."""
+	bl_idname = "hydra.state_save"
+	bl_label = "Save State"
+	bl_description = "Save the result heightmap along with the water state of pipe-based erosion, so that it can be continued later"
+
+	filepath: StringProperty(subtype="FILE_PATH")
+	"""Output file path."""
+	filter_glob: StringProperty(default="*.npz", options={'HIDDEN'})
+	"""File browser filter."""
+
+	def execute(self, ctx):
+		target = self.get_target(ctx)
+		hyd = target.hydra_erosion
+		data = common.data
+
+		state = data.get_state(hyd.map_result, "mei")
+		if state is None:
+			self.report({'ERROR'}, "No solver state to save.")
+			return {'CANCELLED'}
+
+		path = bpy.path.ensure_ext(bpy.path.abspath(self.filepath), ".npz")
+		state.save(path, height=data.get_map(hyd.map_result).texture)
+		self.report({'INFO'}, f"Saved state: {path}")
+		return {'FINISHED'}
+
+	def invoke(self, ctx, event):
+		if not self.filepath:
+			self.filepath = f"{bpy.path.clean_name(self.get_target(ctx).name)}_state.npz"
+		ctx.window_manager.fileselect_add(self)
+		return {'RUNNING_MODAL'}
+
+class LoadStateOp(ops_common.HydraOperator):
+	"""Load solver state operator."""
+	bl_idname = "hydra.state_load"
+	bl_label = "Load State"
+	bl_description = "Load a saved heightmap and water state as the source, and continue pipe-based erosion from it"
+
+	filepath: StringProperty(subtype="FILE_PATH")
+	"""Input file path."""
+	filter_glob: StringProperty(default="*.npz", options={'HIDDEN'})
+	"""File browser filter."""
+
+	def execute(self, ctx):
+		target = self.get_target(ctx)
+		hyd = target.hydra_erosion
+		data = common.data
+
+		if not data.has_map(hyd.map_base):
+			heightmap.prepare_heightmap(target)
+
+		try:
+			state, height = common.SolverState.load(bpy.path.abspath(self.filepath))
+		except (OSError, ValueError, KeyError) as e:
+			self.report({'ERROR'}, f"Failed to load state: {e}")
+			return {'CANCELLED'}
+
+		if height is None or tuple(height.size) != tuple(hyd.get_size()):
+			state.release()
+			if height is not None:
+				height.release()
+			self.report({'ERROR'}, "Saved heightmap doesn't match the size of this entity.")
+			return {'CANCELLED'}
+
+		data.try_release_map(hyd.map_result)
+		hyd.map_result = ""
+		data.try_release_map(hyd.map_source)
+		hyd.map_source = data.create_map("Loaded", height)
+		data.set_state(hyd.map_source, state)
+
+		self.report({'INFO'}, "Loaded state as source.")
+		return {'FINISHED'}
+
+	def invoke(self, ctx, event):
+		ctx.window_manager.fileselect_add(self)
+		return {'RUNNING_MODAL'}
+
 #-------------------------------------------- Goto
 
 class NavToImgOp(ops_common.HydraOperator):
@@ -348,6 +427,8 @@ class NavToObjOp(ops_common.HydraOperator):
 
 def get_exports()->list:
 	return [
+		SaveStateOp,
+		LoadStateOp,
 		ClearOp,
 		MergeOp,
 		MergeShapeOp,
@@ -32,6 +32,24 @@ class AddonPanel(bpy.types.AddonPreferences):
 		description="Enables debug mode, giving access to additional operators"
 	)
 
+	def update_shader_variant(self, context):
+		"""Applies the shader variant preference to the shader bank."""
+		from Hydra import common
+		if common.data is not None:
+			common.data.shaders.variant = None if self.shader_variant == "default" else self.shader_variant
+
+	shader_variant: EnumProperty(
+		default="default",
+		items=(
+			("default", "Default", "Reads neighboring cells directly from images", 0),
+			("shared", "Shared memory", "Loads tiles of cells into shared memory first. Usually faster for pipe-based and thermal erosion on dedicated GPUs", 1),
+		),
+		name="Shader variant",
+		description="Implementation of stencil shaders. Both variants give the same results",
+		update=update_shader_variant
+	)
+	"""Shader variant preference."""
+
 	def draw(self, context):
 		layout = self.layout
 
@@ -44,6 +62,7 @@ class AddonPanel(bpy.types.AddonPreferences):
 			box.enabled = False
 			
 		box.prop(self, "debug_mode")
+		box.prop(self, "shader_variant")
 
 		box = layout.box()
 		if startup.promptFailed:
@@ -71,6 +71,12 @@ class ErosionGroup(bpy.types.PropertyGroup):
 		description="Percentage of heightmap resolution to simulate at. Lower resolution creates larger features and speeds up simulation time. Simulating at 512x512 is a good starting point for erosion"
 	)
 
+	erosion_color: BoolProperty(
+		default=False,
+		name="Transport color",
+		description="Transports the color image along with the eroded material in the same simulation. Writes the result into an image named HYD_<name>_Color"
+	)
+
 	erosion_hardness_src: StringProperty(
 		name="Hardness",
 		description="Terrain hardness texture. Pure white won't be eroded at all, pure black will erode the most"
@@ -147,6 +153,32 @@ class ErosionGroup(bpy.types.PropertyGroup):
 		description="Sediment capacity of the particle. High capacity leads to deeper grooves"
 	)
 	
+	part_dispatch: EnumProperty(
+		default="fixed",
+		items=(
+			("fixed", "Fixed", "Simulates a fixed number of particles in a single workgroup regardless of resolution", 0),
+			("scaled", "Scaled", "Launches particles in proportion to map area across many workgroups. Uses the GPU better on large maps", 1),
+			("pool", "Pool", "Keeps particles in a persistent GPU buffer and removes dead or stalled particles between passes, so that later passes only run on moving particles. Color transport uses the scaled mode instead", 2),
+		),
+		name="Dispatch",
+		description="Defines how particles are launched on the GPU"
+	)
+
+	part_density: FloatProperty(
+		default=0.1,
+		min=0.001, soft_max=1.0, max=4.0,
+		precision=3,
+		name="Density",
+		description="Number of particles launched per pixel in each iteration of the scaled and pool dispatch modes"
+
+	)
+
+	part_atomic: BoolProperty(
+		default=False,
+		name="Atomic deposition",
+		description="Accumulates height changes with integer atomics and applies them after each pass. Results are deterministic and no material is lost when particles collide, but particles only see changes from previous passes"
+	)
+
 	part_max_change: FloatProperty(
 		default=100.0,
 		min=0.1, max=100.0,
@@ -164,6 +196,47 @@ class ErosionGroup(bpy.types.PropertyGroup):
 		description="Number of iterations, each over the entire image"
 	)
 
+	mei_resume: BoolProperty(
+		default=True,
+		name="Keep water",
+		description="Keeps water, sediment and flow of the result, so that continuing the erosion resumes from them instead of a dry terrain. Uses additional GPU memory"
+	)
+
+	mei_sparse: BoolProperty(
+		default=False,
+		name="Skip dry areas",
+		description="Only simulates areas of the map with water, sediment or rain in them. Much faster when water covers a small part of the map, e.g. with a water source. Tiny amounts of leftover water are frozen in place"
+	)
+
+	mei_time_step: EnumProperty(
+		default="fixed",
+		items=(
+			("fixed", "Fixed", "Uses a small fixed time step and a set number of iterations", 0),
+			("adaptive", "Adaptive", "Fits the time step to the fastest flow, keeping it stable and accurate, and simulates a set duration. Slow flow needs up to 7 times fewer steps", 1),
+		),
+		name="Time step",
+		description="Defines how the simulation advances in time"
+	)
+
+	mei_outputs: EnumProperty(
+		default=set(),
+		options={'ENUM_FLAG'},
+		items=(
+			("water", "Water", "Writes water depth into an image named HYD_<name>_Water", 1),
+			("sediment", "Sediment", "Writes suspended sediment into an image named HYD_<name>_Sediment", 2),
+			("velocity", "Velocity", "Writes flow velocity into the red and green channels of an image named HYD_<name>_Velocity", 4),
+		),
+		name="Outputs",
+		description="Additional maps written from the final state of the simulation. Useful for wetness or flow masks in materials"
+	)
+
+	mei_duration: FloatProperty(
+		default=10.0,
+		min=0.01, soft_max=100.0, max=1000.0,
+		name="Duration",
+		description="Simulated time of the adaptive time step mode. A duration of 10 matches 100 fixed iterations"
+	)
+
 	mei_rain: FloatProperty(
 		default=25,
 		min=1, max=100.0,
@@ -212,6 +285,16 @@ class ErosionGroup(bpy.types.PropertyGroup):
 		description="Maximum depth of at which erosion can occur. Can help with very deep bodies of water"
 	)
 
+	mei_variant: EnumProperty(
+		default="separate",
+		items=(
+			("separate", "Separate", "Runs each step of the solver as its own pass", 0),
+			("fused", "Fused", "Merges the solver steps into three passes, which cuts memory traffic on large maps. Recomputes some values for neighboring cells", 1),
+		),
+		name="Kernels",
+		description="Defines how the solver steps are dispatched on the GPU"
+	)
+
 	#------------------------- Thermal
 	
 	thermal_iter_num: IntProperty(
@@ -248,6 +331,22 @@ class ErosionGroup(bpy.types.PropertyGroup):
 		description="Solver neighborhood type"
 	)
 
+	thermal_kernel: EnumProperty(
+		default="requests",
+		items=(
+			("requests", "Requests", "Computes material requests of all cells into a separate texture before moving material. Needs an additional RGBA texture and a copy of the heightmap", 0),
+			("inplace", "In-place", "Moves material between pairs of neighboring cells directly in the heightmap, alternating between two halves of the pairs. Uses far less memory and bandwidth", 1),
+		),
+		name="Kernel",
+		description="Thermal erosion kernel type. Also used for snow simulation"
+	)
+
+	thermal_multigrid: BoolProperty(
+		default=False,
+		name="Multigrid",
+		description="Each iteration erodes the heightmap at halving resolutions and adds the changes back, which moves material across the map in far fewer iterations. Replaces stride and uses the in-place kernel"
+	)
+
 	thermal_advanced: BoolProperty(
 		default=False,
 		name="Advanced",
@@ -267,6 +366,44 @@ class ErosionGroup(bpy.types.PropertyGroup):
 		description="Periodically halves stride for smoother erosion"
 	)
 
+	#------------------------- Convergence
+
+	warm_start: BoolProperty(
+		default=False,
+		name="Warm start",
+		description="Keeps the last converged thermal erosion or snow result of each map and starts from it when simulating the same map again with the same settings and a similar angle. Warm starts always stop early once the result settles. Uses additional GPU memory"
+	)
+	stop_early: BoolProperty(
+		default=False,
+		name="Stop early",
+		description="Periodically measures how much the heightmap changes and stops the simulation once it settles. The iteration count becomes an upper limit"
+	)
+
+	stop_tolerance: FloatProperty(
+		default=1e-6,
+		min=0.0, soft_max=1e-3,
+		precision=6,
+		name="Tolerance",
+		description="Change per iteration in heightmap units, below which the simulation stops"
+	)
+
+	stop_interval: IntProperty(
+		default=10,
+		min=1, soft_max=100,
+		name="Check interval",
+		description="Number of iterations between measurements. Each measurement reads a small amount of data back from the GPU"
+	)
+
+	stop_metric: EnumProperty(
+		default="max",
+		items=(
+			("max", "Maximum", "Largest change of any pixel. Stops only when the whole map has settled", 0),
+			("mean", "Mean", "Average change over the map. Stops when most of the map has settled", 1),
+		),
+		name="Change",
+		description="How the change of the heightmap is measured"
+	)
+
 	#------------------------- Snow
 
 	snow_add: FloatProperty(
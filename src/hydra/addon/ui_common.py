@@ -22,6 +22,14 @@ class HydraPanel(bpy.types.Panel):
 		else:
 			return ctx.object
 		
+	def draw_stop_fragment(self, container, settings):
+		container.prop(settings, "stop_early")
+		if settings.stop_early:
+			g = container.grid_flow(columns=1, align=True)
+			g.prop(settings, "stop_tolerance")
+			g.prop(settings, "stop_interval")
+			g.prop(settings, "stop_metric")
+
 	def draw_nav_fragment(self, container, name, label):
 		if name in bpy.data.images:
 			split = container.split()
@@ -159,6 +167,9 @@ class SnowPanel():
 		col.prop(hyd, "snow_add", slider=True)
 		col.prop(hyd, "snow_iter_num")
 		col.prop(hyd, "snow_angle", slider=True)
+		col.prop(hyd, "thermal_kernel")
+		col.prop(hyd, "warm_start")
+		self.draw_stop_fragment(col.box(), hyd)
 
 
 #-------------------------------------------- Flow
@@ -195,6 +206,12 @@ class ExtrasPanel():
 			g.prop(hyd, "flow_iter_num")
 			g.prop(hyd, "part_lifetime")
 			g.prop(hyd, "part_drag", slider=True)
+
+			if hyd.erosion_advanced:
+				g = p.grid_flow(columns=1, align=True)
+				g.prop(hyd, "part_dispatch")
+				if hyd.part_dispatch != "fixed":
+					g.prop(hyd, "part_density")
 		elif hyd.extras_type == "color":
 			p.prop(hyd, "color_solver")
 
@@ -214,6 +231,12 @@ class ExtrasPanel():
 					g.prop(hyd, "part_lateral_acceleration")
 				g.prop(hyd, "color_detail", slider=True)
 
+				if hyd.erosion_advanced:
+					g = p.grid_flow(columns=1, align=True)
+					g.prop(hyd, "part_dispatch")
+					if hyd.part_dispatch != "fixed":
+						g.prop(hyd, "part_density")
+
 			elif hyd.color_solver == "pipe":
 				p.prop(hyd, "color_iter_num")
 
@@ -347,11 +370,21 @@ class ErosionSettingsPanel(bpy.types.Panel):
 			if hyd.erosion_advanced:
 				p.prop(hyd, "part_max_change")
 
+				g = p.grid_flow(columns=1, align=True)
+				g.prop(hyd, "part_dispatch")
+				if hyd.part_dispatch != "fixed":
+					g.prop(hyd, "part_density")
+
+				p.prop(hyd, "part_atomic")
+
 				box = p.box()
 				box.prop_search(hyd, "erosion_hardness_src", bpy.data, "images")
 				box.prop(hyd, "erosion_invert_hardness")
 		else:
-			p.prop(hyd, "mei_iter_num")
+			if hyd.mei_time_step == "adaptive":
+				p.prop(hyd, "mei_duration")
+			else:
+				p.prop(hyd, "mei_iter_num")
 
 			g = p.grid_flow(columns=1, align=True)
 			g.prop(hyd, "mei_hardness", slider=True)
@@ -364,6 +397,19 @@ class ErosionSettingsPanel(bpy.types.Panel):
 			if hyd.erosion_advanced:
 				g.prop(hyd, "mei_max_depth")
 
+				p.prop(hyd, "mei_variant")
+				p.prop(hyd, "mei_time_step")
+				p.prop(hyd, "mei_sparse")
+				p.prop(hyd, "mei_resume")
+				p.prop(hyd, "mei_outputs")
+				self.draw_stop_fragment(p.box(), hyd)
+
+				row = p.row(align=True)
+				row.operator("hydra.state_load", icon="FILE_FOLDER")
+				save = row.row(align=True)
+				save.operator("hydra.state_save", icon="FILE_TICK")
+				save.enabled = common.data.get_state(hyd.map_result, "mei") is not None
+
 				# p.prop(hyd, "mei_randomize")
 
 				box = p.box()
@@ -372,6 +418,12 @@ class ErosionSettingsPanel(bpy.types.Panel):
 				box.prop_search(hyd, "mei_water_src", bpy.data, "images")
 				# box.prop(hyd, "mei_invert_water")
 
+		p.separator()
+		p.prop(hyd, "erosion_color")
+		if hyd.erosion_color:
+			p.prop_search(hyd, "color_src", bpy.data, "images")
+			p.prop(hyd, "color_mixing", slider=True)
+
 
 class ThermalSettingsPanel():
 	bl_label = "Settings"
@@ -392,8 +444,13 @@ class ThermalSettingsPanel():
 		p.prop(hyd, "thermal_angle", slider=True)
 
 		if hyd.thermal_advanced:
-			p.prop(hyd, "thermal_stride")
-			p.prop(hyd, "thermal_stride_grad")
+			p.prop(hyd, "thermal_multigrid")
+			if not hyd.thermal_multigrid:
+				p.prop(hyd, "thermal_stride")
+				p.prop(hyd, "thermal_stride_grad")
+				p.prop(hyd, "thermal_kernel")
+			p.prop(hyd, "warm_start")
+			self.draw_stop_fragment(p.box(), hyd)
 
 
 #-------------------------------------------- Info
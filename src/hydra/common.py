@@ -1,7 +1,11 @@
-"""Global data and common functions module. Also defines :class:`Heightmap` class."""
+"""Global data and common functions module. Also defines :class:`Heightmap` and :class:`MappedHeightmap` classes."""
 
 import moderngl as mgl
-import bpy, bpy.types
+import numpy as np
+try:
+	import bpy, bpy.types
+except ImportError:
+	bpy = None	# running outside of Blender, only :mod:`Hydra.core` is usable
 from pathlib import Path
 
 import uuid, re
@@ -39,14 +43,208 @@ class Heightmap:
 	size = property(get_size)
 	"""Texture size :class:`tuple` property."""
 
+class MappedHeightmap:
+	"""A heightmap stored in a memory-mapped NumPy `.npy` file. Regions are streamed to the GPU on demand
+	and written back in place, so the map may exceed both video and host memory."""
+	def __init__(self, name: str, path: str | Path, size: tuple[int,int] | None = None):
+		"""Constructor method.
+
+		:param name: Display name of the stored map.
+		:type name: :class:`str`
+		:param path: Path of the `.npy` file.
+		:type path: :class:`str` or :class:`pathlib.Path`
+		:param size: Size of a new map, which replaces the file and is filled with zeros. An existing map is opened if `None`.
+		:type size: :class:`tuple[int,int]` or :class:`None`"""
+		self.name = name
+		self.path = Path(path)
+		if size is None:
+			array = np.lib.format.open_memmap(self.path, mode="r+")
+			if array.dtype != np.float32 or array.ndim != 2:
+				raise ValueError(f"{self.path.name} isn't a single channel float32 map")
+		else:
+			array = np.lib.format.open_memmap(self.path, mode="w+", dtype=np.float32, shape=(size[1], size[0]))
+
+		self.array: np.memmap = array
+		"""Memory-mapped array of shape `(height, width)`."""
+		self._texture: mgl.Texture | None = None
+
+	def release(self)->None:
+		"""Writes pending changes to the file and releases the texture of the whole map, if one was created."""
+		self.array.flush()
+		if self._texture is not None:
+			self._texture.release()
+			self._texture = None
+
+	def read(self)->bytes:
+		"""Reads the whole map. Use :meth:`read_region` for maps larger than host memory.
+
+		:return: Pixel data :class:`bytes`.
+		:rtype: :class:`bytes`"""
+		return self.array.tobytes()
+
+	def read_region(self, region: tuple[int,int,int,int])->np.ndarray:
+		"""Reads a part of the map. Only the rows of the region are loaded from the file.
+
+		:param region: Region as `(x0, y0, x1, y1)`.
+		:type region: :class:`tuple[int,int,int,int]`
+		:return: Copy of the region.
+		:rtype: :class:`numpy.ndarray`"""
+		x0, y0, x1, y1 = region
+		return np.array(self.array[y0:y1, x0:x1])
+
+	def write_region(self, origin: tuple[int,int], values: np.ndarray)->None:
+		"""Writes a part of the map in place.
+
+		:param origin: Position of the first value as `(x, y)`.
+		:type origin: :class:`tuple[int,int]`
+		:param values: Array of shape `(height, width)`.
+		:type values: :class:`numpy.ndarray`"""
+		x, y = origin
+		self.array[y:y + values.shape[0], x:x + values.shape[1]] = values
+		if self._texture is not None:	# texture of the whole map is out of date
+			self._texture.release()
+			self._texture = None
+
+	def upload(self, region: tuple[int,int,int,int])->mgl.Texture:
+		"""Creates a texture from a part of the map. The caller is responsible for releasing it.
+
+		:param region: Region as `(x0, y0, x1, y1)`.
+		:type region: :class:`tuple[int,int,int,int]`
+		:return: Single channel float texture of the region.
+		:rtype: :class:`moderngl.Texture`"""
+		values = self.read_region(region)
+		return data.context.texture((values.shape[1], values.shape[0]), 1, dtype="f4", data=values.tobytes())
+
+	def download(self, txt: mgl.Texture, origin: tuple[int,int] = (0, 0))->None:
+		"""Writes a texture back into the map in place.
+
+		:param txt: Single channel float texture.
+		:type txt: :class:`moderngl.Texture`
+		:param origin: Position of the texture in the map as `(x, y)`.
+		:type origin: :class:`tuple[int,int]`"""
+		values = np.frombuffer(txt.read(), dtype=np.float32).reshape(txt.size[1], txt.size[0])
+		self.write_region(origin, values)
+
+	def get_texture(self)->mgl.Texture:
+		"""Whole map texture property getter. The texture is uploaded on first use and kept until the map changes.
+
+		:return: Texture of the whole map.
+		:rtype: :class:`moderngl.Texture`"""
+		if self._texture is None:
+			self._texture = self.upload((0, 0, *self.size))
+		return self._texture
+
+	texture = property(get_texture)
+	""":class:`moderngl.Texture` of the whole map, for code expecting a :class:`Heightmap`. Only usable if the map fits into a texture."""
+
+	def get_size(self)->tuple[int,int]:
+		"""Stored map size property getter.
+
+		:return: Map size :class:`tuple`.
+		:rtype: :class:`tuple`"""
+		return (self.array.shape[1], self.array.shape[0])
+
+	size = property(get_size)
+	"""Map size :class:`tuple` property."""
+
+class SolverState:
+	"""Named textures of a paused simulation, which can be resumed or saved to disk. CPU simulations store arrays instead."""
+	def __init__(self, kind: str, textures: dict[str, mgl.Texture], params: dict | None = None):
+		"""Constructor method.
+
+		:param kind: Simulation identifier, e.g. `mei`.
+		:type kind: :class:`str`
+		:param textures: Textures by name. All should have the same size.
+		:type textures: :class:`dict[str, moderngl.Texture]`
+		:param params: Simulation parameters the state was created with.
+		:type params: :class:`dict` or :class:`None`"""
+		self.kind = kind
+		self.textures = textures
+		self.params = params if params is not None else {}
+		"""Simulation parameters the state was created with. Used to decide whether a state can be reused."""
+
+	def release(self)->None:
+		"""Releases all stored textures. Arrays of CPU simulations are dropped."""
+		for txt in self.textures.values():
+			if isinstance(txt, mgl.Texture):
+				txt.release()
+		self.textures = {}
+
+	def get_size(self)->tuple[int,int]:
+		"""Stored texture size property getter.
+
+		:return: Texture size :class:`tuple`. Empty if there are no textures.
+		:rtype: :class:`tuple`"""
+		for txt in self.textures.values():
+			return (txt.shape[1], txt.shape[0]) if isinstance(txt, np.ndarray) else tuple(txt.size)
+		return ()
+
+	size = property(get_size)
+	"""Texture size :class:`tuple` property."""
+
+	def save(self, path: str, height: mgl.Texture | None = None)->None:
+		"""Saves the state into a NumPy `.npz` archive.
+
+		:param path: Output file path.
+		:type path: :class:`str`
+		:param height: Optional heightmap saved along with the state.
+		:type height: :class:`moderngl.Texture` or :class:`None`"""
+		textures = dict(self.textures)
+		if height is not None:
+			textures["height"] = height
+
+		arrays = {
+			name: txt.reshape(txt.shape[0], txt.shape[1], -1) if isinstance(txt, np.ndarray) else
+				np.frombuffer(txt.read(), dtype=np.float32).reshape(txt.size[1], txt.size[0], txt.components)
+			for name, txt in textures.items()
+		}
+		np.savez_compressed(path, kind=self.kind, **arrays)
+
+	@staticmethod
+	def load(path: str)->'tuple[SolverState, mgl.Texture | None]':
+		"""Loads a state saved with :meth:`save`.
+
+		:param path: Input file path.
+		:type path: :class:`str`
+		:return: Loaded state and heightmap, if one was saved.
+		:rtype: :class:`tuple[SolverState, moderngl.Texture | None]`"""
+		textures = {}
+		with np.load(path) as archive:
+			kind = str(archive["kind"])
+			for name in archive.files:
+				if name == "kind":
+					continue
+				arr = archive[name].astype(np.float32)
+				textures[name] = data.context.texture((arr.shape[1], arr.shape[0]), arr.shape[2], dtype="f4", data=arr.tobytes())
+
+		height = textures.pop("height", None)
+		return SolverState(kind, textures), height
+
 class ShaderBank:
 	def __init__(self):
 		"""Sets the GLSL files path."""
 		self.source_path = Path(__file__).resolve().parent.joinpath("GLSL")
 
+		self.variant: str | None = None
+		"""Preferred shader variant. Shaders named `<key>_<variant>` are loaded instead of `<key>` if they exist."""
+
+	def resolve(self, key: str)->str:
+		"""Returns the name of the shader loaded for the specified key, taking :attr:`variant` into account.
+
+		:param key: Shader name.
+		:type key: :class:`str`
+		:return: Name of the variant shader if it exists, `key` otherwise.
+		:rtype: :class:`str`"""
+		if self.variant is not None:
+			name = f"{key}_{self.variant}"
+			if name in data._shaders_ or self.source_path.joinpath(name + ".glsl").exists():
+				return name
+		return key
+
 	def __getitem__(self, key: str)->mgl.ComputeShader:
-		"""Lazy-loads and returns the specified compute shader.
+		"""Lazy-loads and returns the specified compute shader, preferring its :attr:`variant`.
 		Raises `KeyError` if not found."""
+		key = self.resolve(key)
 		if key not in data._shaders_:
 			path = self.source_path.joinpath(key + ".glsl")
 			if path.exists():
@@ -66,9 +264,15 @@ class HydraData(object):
 		self.context: mgl.Context = None
 		"""Addon's ModernGL context. Attached to Blender's OpenGL context."""
 
-		self._maps_: dict[str, Heightmap] = {}
+		self._maps_: dict[str, Heightmap | MappedHeightmap] = {}
 		"""Heightmap dictionary. Uses UUID strings as keys."""
 
+		self._states_: dict[str, dict[str, SolverState]] = {}
+		"""Solver states of heightmaps. Uses heightmap IDs and simulation identifiers as keys."""
+
+		self._images_: dict[tuple, tuple[tuple, mgl.Texture]] = {}
+		"""Cached textures of Blender images with their change stamps, least recently used first."""
+
 		self.programs: dict[str, mgl.Program] = {}
 		"""Compiled ModernGL program list."""
 
@@ -97,7 +301,7 @@ class HydraData(object):
 		:rtype: :class:`bool`"""
 		return id in self._maps_
 
-	def get_map(self, id: str | None)->Heightmap | None:
+	def get_map(self, id: str | None)->Heightmap | MappedHeightmap | None:
 		"""Returns map by ID. Returns `None` if not found."""
 		if id in self._maps_:
 			return self._maps_[id]
@@ -110,6 +314,42 @@ class HydraData(object):
 		if id in self._maps_:
 			self._maps_[id].release()
 			del self._maps_[id]
+		self.try_release_state(id)
+
+	def get_state(self, id: str | None, kind: str)->SolverState | None:
+		"""Returns the solver state of a map. Returns `None` if not found or of a different kind.
+
+		:param id: Map ID.
+		:type id: :class:`str` or :class:`None`
+		:param kind: Simulation identifier.
+		:type kind: :class:`str`
+		:return: Stored state or `None`.
+		:rtype: :class:`SolverState` or :class:`None`"""
+		return self._states_.get(id, {}).get(kind)
+
+	def set_state(self, id: str, state: SolverState)->None:
+		"""Stores the solver state of a map, replacing any previous state of the same kind.
+
+		:param id: Map ID.
+		:type id: :class:`str`
+		:param state: State to store.
+		:type state: :class:`SolverState`"""
+		self.try_release_state(id, state.kind)
+		self._states_.setdefault(id, {})[state.kind] = state
+
+	def try_release_state(self, id: str | None, kind: str | None = None)->None:
+		"""Release solver states of a map. Does nothing on invalid `id`.
+
+		:param id: Map ID.
+		:type id: :class:`str` or :class:`None`
+		:param kind: Simulation identifier of the state to release. Releases all states of the map if `None`.
+		:type kind: :class:`str` or :class:`None`"""
+		states = self._states_.get(id, {})
+		for k in [k for k in states if kind is None or k == kind]:
+			states.pop(k).release()
+
+		if id in self._states_ and len(states) == 0:
+			del self._states_[id]
 	
 	def create_map(self, name: str, txt: mgl.Texture)->str:
 		"""Creates and adds a heightmap into maps. Returns map ID.
@@ -123,7 +363,22 @@ class HydraData(object):
 		id = str(uuid.uuid4())
 		self._maps_[id] = Heightmap(name, txt)
 		return id
-	
+
+	def create_mapped_map(self, name: str, path: str | Path, size: tuple[int,int] | None = None)->str:
+		"""Creates and adds a memory-mapped heightmap into maps. Returns map ID.
+
+		:param name: Name of created map.
+		:type name: :class:`str`
+		:param path: Path of the `.npy` file, see :class:`MappedHeightmap`.
+		:type path: :class:`str` or :class:`pathlib.Path`
+		:param size: Size of a new map. An existing file is opened if `None`.
+		:type size: :class:`tuple[int,int]` or :class:`None`
+		:return: New map UUID string.
+		:rtype: :class:`str`"""
+		id = str(uuid.uuid4())
+		self._maps_[id] = MappedHeightmap(name, path, size)
+		return id
+
 	def report(self, caller, callerName:str="Hydra")->None:
 		"""Shows either stored error or info messages and clears them.
 
@@ -140,11 +395,20 @@ class HydraData(object):
 		self._error_ = []
 	
 	def free_all(self)->None:
-		"""Frees all allocated maps."""
+		"""Frees all allocated maps, solver states and cached image textures."""
 		for i in self._maps_.values():
 			i.release()
 		self._maps_ = {}
 
+		for states in self._states_.values():
+			for i in states.values():
+				i.release()
+		self._states_ = {}
+
+		for _, txt in self._images_.values():
+			txt.release()
+		self._images_ = {}
+
 	def add_message(self, message: str, error: bool=False)->None:
 		"""Adds an info message.
 
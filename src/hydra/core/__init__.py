@@ -0,0 +1,19 @@
+"""Simulation core. Runs all simulations on ModernGL textures or NumPy arrays without Blender.
+
+Simulations run on OpenGL after :func:`create_context` was called, or on NumPy where implemented,
+see :mod:`Hydra.core.backend`::
+
+	import numpy as np
+	from Hydra import core
+
+	core.create_context()
+	result = core.erode_particle(np.zeros((512, 512), dtype=np.float32), core.Settings(part_iter_num=100))
+	eroded = result.height
+"""
+
+from Hydra.core.context import create_context, open_context, PROVIDERS
+from Hydra.core.settings import Settings
+from Hydra.core.result import Result
+from Hydra.core.backend import BACKENDS, get_backend, select_backend
+from Hydra.core.tiling import simulate_tiled
+from Hydra.core.api import erode_particle, erode_mei, erode_thermal, simulate_snow, generate_flow, transport_color
@@ -0,0 +1,156 @@
+"""Module defining simulation functions that accept NumPy arrays as well as ModernGL textures and run on any backend."""
+
+import numpy as np
+from moderngl import Texture
+from Hydra import common
+from Hydra.core import textures
+from Hydra.core.backend import select_backend
+from Hydra.core.settings import Settings
+from Hydra.core.result import Result
+
+Map = np.ndarray | Texture
+"""Heightmap or another map, either as an array of shape `(height, width[, channels])` or as a texture."""
+
+def _size(m: Map)->tuple[int,int]:
+	"""Gets the size of a map.
+
+	:param m: Array or texture.
+	:type m: :class:`numpy.ndarray` or :class:`moderngl.Texture`
+	:return: Map size.
+	:rtype: :class:`tuple[int,int]`"""
+	return tuple(m.size) if isinstance(m, Texture) else (m.shape[1], m.shape[0])
+
+def _run(solver: str, func, maps: list[Map | None], backend: str)->Result:
+	"""Converts maps to the selected backend, runs a simulation and converts the result to the type of the first map.
+
+	:param solver: Simulation name, see :data:`Hydra.core.backend.SOLVER_NAMES`.
+	:type solver: :class:`str`
+	:param func: Function calling the simulation it receives with the converted maps.
+	:type func: :class:`Callable`
+	:param maps: Maps in the order expected by `func`. The first one is the heightmap.
+	:type maps: :class:`list`
+	:param backend: Backend name, or `auto` for automatic selection.
+	:type backend: :class:`str`
+	:return: Simulation result.
+	:rtype: :class:`Hydra.core.result.Result`"""
+	selected = select_backend(_size(maps[0]), solver, backend, prefer="gl" if isinstance(maps[0], Texture) else None)
+
+	converted = []
+	for m in maps:
+		if m is None or selected.is_map(m):
+			converted.append(m)
+		else:
+			converted.append(selected.upload(m if isinstance(m, np.ndarray) else textures.to_array(m)))
+
+	try:
+		result = func(selected.solvers[solver], *converted)
+	finally:
+		for m, c in zip(maps, converted):
+			if c is not m:
+				selected.release(c)
+
+	if isinstance(maps[0], np.ndarray):
+		result.to_arrays()
+	else:
+		result.to_textures()
+	return result
+
+# --------------------------------------------------------- Simulations
+
+def erode_particle(height: Map, settings: Settings | None = None, hardness: Map | None = None, color: Map | None = None, backend: str = "auto")->Result:
+	"""Erodes a heightmap with particles. See :func:`Hydra.core.particle.erode`.
+
+	:param height: Heightmap to erode.
+	:type height: :class:`numpy.ndarray` or :class:`moderngl.Texture`
+	:param settings: Simulation settings. Defaults are used if not specified.
+	:type settings: :class:`Hydra.core.settings.Settings` or :class:`None`
+	:param hardness: Optional hardness map.
+	:type hardness: :class:`numpy.ndarray` or :class:`moderngl.Texture` or :class:`None`
+	:param color: Optional RGBA color map of the simulation size to move along with the material.
+	:type color: :class:`numpy.ndarray` or :class:`moderngl.Texture` or :class:`None`
+	:param backend: Backend name from :data:`Hydra.core.backend.BACKENDS`, or `auto` for automatic selection.
+	:type backend: :class:`str`
+	:return: Simulation result with maps of the same type as `height`.
+	:rtype: :class:`Hydra.core.result.Result`"""
+	return _run("particle", lambda f, h, hd, c: f(h, settings or Settings(), hd, c), [height, hardness, color], backend)
+
+def erode_mei(height: Map, settings: Settings | None = None, hardness: Map | None = None, water_src: Map | None = None, color: Map | None = None, state: common.SolverState | None = None, backend: str = "auto")->Result:
+	"""Erodes a heightmap with the pipe model. See :func:`Hydra.core.mei.erode`.
+
+	:param height: Heightmap to erode.
+	:type height: :class:`numpy.ndarray` or :class:`moderngl.Texture`
+	:param settings: Simulation settings. Defaults are used if not specified.
+	:type settings: :class:`Hydra.core.settings.Settings` or :class:`None`
+	:param hardness: Optional hardness map of the simulation size.
+	:type hardness: :class:`numpy.ndarray` or :class:`moderngl.Texture` or :class:`None`
+	:param water_src: Optional rain intensity map of the simulation size.
+	:type water_src: :class:`numpy.ndarray` or :class:`moderngl.Texture` or :class:`None`
+	:param color: Optional RGBA color map of the simulation size to move along with the water.
+	:type color: :class:`numpy.ndarray` or :class:`moderngl.Texture` or :class:`None`
+	:param state: Optional state of a previous result to resume from.
+	:type state: :class:`Hydra.common.SolverState` or :class:`None`
+	:param backend: Backend name from :data:`Hydra.core.backend.BACKENDS`, or `auto` for automatic selection.
+	:type backend: :class:`str`
+	:return: Simulation result with maps of the same type as `height`. The state stays on the backend.
+	:rtype: :class:`Hydra.core.result.Result`"""
+	return _run("mei", lambda f, h, hd, w, c: f(h, settings or Settings(), hd, w, c, state), [height, hardness, water_src, color], backend)
+
+def erode_thermal(height: Map, settings: Settings | None = None, warm: common.SolverState | None = None, backend: str = "auto")->Result:
+	"""Erodes a heightmap until its slopes are below the maximum angle. See :func:`Hydra.core.thermal.erode`.
+
+	:param height: Heightmap to erode.
+	:type height: :class:`numpy.ndarray` or :class:`moderngl.Texture`
+	:param settings: Simulation settings. Defaults are used if not specified.
+	:type settings: :class:`Hydra.core.settings.Settings` or :class:`None`
+	:param warm: Optional state of a previous result on the same heightmap to start from.
+	:type warm: :class:`Hydra.common.SolverState` or :class:`None`
+	:param backend: Backend name from :data:`Hydra.core.backend.BACKENDS`, or `auto` for automatic selection.
+	:type backend: :class:`str`
+	:return: Simulation result with maps of the same type as `height`.
+	:rtype: :class:`Hydra.core.result.Result`"""
+	return _run("thermal", lambda f, h: f(h, settings or Settings(), warm), [height], backend)
+
+def simulate_snow(height: Map, settings: Settings | None = None, warm: common.SolverState | None = None, backend: str = "auto")->Result:
+	"""Simulates snow sliding on a heightmap. See :func:`Hydra.core.snow.simulate`.
+
+	:param height: Heightmap to place snow on.
+	:type height: :class:`numpy.ndarray` or :class:`moderngl.Texture`
+	:param settings: Simulation settings. Defaults are used if not specified.
+	:type settings: :class:`Hydra.core.settings.Settings` or :class:`None`
+	:param warm: Optional state of a previous result on the same heightmap to start from.
+	:type warm: :class:`Hydra.common.SolverState` or :class:`None`
+	:param backend: Backend name from :data:`Hydra.core.backend.BACKENDS`, or `auto` for automatic selection.
+	:type backend: :class:`str`
+	:return: Simulation result with maps of the same type as `height`.
+	:rtype: :class:`Hydra.core.result.Result`"""
+	return _run("snow", lambda f, h: f(h, settings or Settings(), warm), [height], backend)
+
+def generate_flow(height: Map, settings: Settings | None = None, backend: str = "auto")->Result:
+	"""Simulates a flow map. See :func:`Hydra.core.particle.generate_flow`.
+
+	:param height: Heightmap to flow over.
+	:type height: :class:`numpy.ndarray` or :class:`moderngl.Texture`
+	:param settings: Simulation settings. Defaults are used if not specified.
+	:type settings: :class:`Hydra.core.settings.Settings` or :class:`None`
+	:param backend: Backend name from :data:`Hydra.core.backend.BACKENDS`, or `auto` for automatic selection.
+	:type backend: :class:`str`
+	:return: Simulation result with the `flow` output of the same type as `height`.
+	:rtype: :class:`Hydra.core.result.Result`"""
+	return _run("flow", lambda f, h: f(h, settings or Settings()), [height], backend)
+
+def transport_color(height: Map, color: Map, settings: Settings | None = None, backend: str = "auto")->Result:
+	"""Moves colors with water flowing over a heightmap, using the solver selected by `color_solver`.
+
+	:param height: Heightmap to flow over.
+	:type height: :class:`numpy.ndarray` or :class:`moderngl.Texture`
+	:param color: RGBA color map of the heightmap size.
+	:type color: :class:`numpy.ndarray` or :class:`moderngl.Texture`
+	:param settings: Simulation settings. Defaults are used if not specified.
+	:type settings: :class:`Hydra.core.settings.Settings` or :class:`None`
+	:param backend: Backend name from :data:`Hydra.core.backend.BACKENDS`, or `auto` for automatic selection.
+	:type backend: :class:`str`
+	:return: Simulation result with the `color` output of the same type as `height`.
+	:rtype: :class:`Hydra.core.result.Result`"""
+	settings = settings or Settings()
+	solver = "color_particle" if settings.color_solver == "particle" else "color_mei"
+	return _run(solver, lambda f, h, c: f(h, c, settings), [height, color], backend)
@@ -0,0 +1,245 @@
+"""Module defining compute backends, which store maps and run kernels and simulations on them."""
+
+import numpy as np
+import moderngl as mgl
+from Hydra import common
+from Hydra.core import textures, particle, mei, thermal, snow, cpu
+from Hydra.core.cpu import kernels
+
+SOLVER_NAMES = ("particle", "mei", "thermal", "snow", "flow", "color_particle", "color_mei")
+"""Simulations a backend can implement. Each takes maps of the backend type and returns a :class:`Hydra.core.result.Result`."""
+
+NUMPY_MAX_PIXELS = 128 * 128
+"""Largest map in pixels that runs on NumPy in automatic selection when OpenGL is available.
+Shader setup and transfers outweigh the GPU's throughput on smaller maps."""
+
+#-------------------------------------------- Interface
+
+class Backend:
+	"""Compute backend. Maps are stored in a backend specific type, e.g. :class:`moderngl.Texture`."""
+
+	name: str = ""
+	"""Backend identifier used for selection."""
+
+	def is_available(self)->bool:
+		"""Checks whether the backend can run.
+
+		:return: `True` if maps can be created and kernels run.
+		:rtype: :class:`bool`"""
+		return True
+
+	def fits(self, size: tuple[int,int])->bool:
+		"""Checks whether a map of the given size can be stored.
+
+		:param size: Map size.
+		:type size: :class:`tuple[int,int]`
+		:return: `True` if supported.
+		:rtype: :class:`bool`"""
+		return True
+
+	@property
+	def solvers(self)->dict:
+		"""Implemented simulations by name from :data:`SOLVER_NAMES`."""
+		raise NotImplementedError()
+
+	def is_map(self, value)->bool:
+		"""Checks whether a value is a map of this backend.
+
+		:param value: Value to check.
+		:return: `True` if `value` is stored by this backend.
+		:rtype: :class:`bool`"""
+		raise NotImplementedError()
+
+	def create(self, size: tuple[int,int], channels: int = 1):
+		"""Creates a map cleared to zero.
+
+		:param size: Map size.
+		:type size: :class:`tuple[int,int]`
+		:param channels: Channel count.
+		:type channels: :class:`int`
+		:return: Created map."""
+		raise NotImplementedError()
+
+	def upload(self, array: np.ndarray):
+		"""Creates a map from an array.
+
+		:param array: Array of shape `(height, width)` or `(height, width, channels)`.
+		:type array: :class:`numpy.ndarray`
+		:return: Created map, which doesn't share memory with `array`."""
+		raise NotImplementedError()
+
+	def download(self, m)->np.ndarray:
+		"""Reads a map back into an array.
+
+		:param m: Map to read.
+		:return: Array of shape `(height, width)` or `(height, width, channels)`, which doesn't share memory with `m`.
+		:rtype: :class:`numpy.ndarray`"""
+		raise NotImplementedError()
+
+	def release(self, m)->None:
+		"""Frees a map.
+
+		:param m: Map to free."""
+		pass
+
+	def kernel(self, name: str):
+		"""Gets a kernel by its shader name.
+
+		:param name: Shader name, e.g. `scaled_add`.
+		:type name: :class:`str`
+		:return: Backend specific kernel."""
+		raise NotImplementedError()
+
+	def dispatch(self, kernel, groups: tuple[int,int], maps: dict, **uniforms)->None:
+		"""Runs a kernel.
+
+		:param kernel: Kernel from :meth:`kernel`.
+		:param groups: Work group counts.
+		:type groups: :class:`tuple[int,int]`
+		:param maps: Maps by uniform name. The first map is the output.
+		:type maps: :class:`dict`
+		:param uniforms: Uniform values by name."""
+		raise NotImplementedError()
+
+#-------------------------------------------- OpenGL
+
+class GLBackend(Backend):
+	"""Runs compute shaders on ModernGL textures in the context of :data:`Hydra.common.data`."""
+
+	name = "gl"
+
+	def is_available(self)->bool:
+		return common.data.context is not None
+
+	def fits(self, size: tuple[int,int])->bool:
+		return max(size) <= common.data.context.info["GL_MAX_TEXTURE_SIZE"]
+
+	@property
+	def solvers(self)->dict:
+		return {
+			"particle": particle.erode,
+			"mei": mei.erode,
+			"thermal": thermal.erode,
+			"snow": snow.simulate,
+			"flow": particle.generate_flow,
+			"color_particle": particle.transport_color,
+			"color_mei": mei.transport_color,
+		}
+
+	def is_map(self, value)->bool:
+		return isinstance(value, mgl.Texture)
+
+	def create(self, size: tuple[int,int], channels: int = 1)->mgl.Texture:
+		return textures.create_texture(size, channels=channels)
+
+	def upload(self, array: np.ndarray)->mgl.Texture:
+		return textures.from_array(array)
+
+	def download(self, m: mgl.Texture)->np.ndarray:
+		return textures.to_array(m)
+
+	def release(self, m: mgl.Texture)->None:
+		m.release()
+
+	def kernel(self, name: str)->mgl.ComputeShader:
+		return common.data.shaders[name]
+
+	def dispatch(self, kernel: mgl.ComputeShader, groups: tuple[int,int], maps: dict, **uniforms)->None:
+		for unit, (key, txt) in enumerate(maps.items(), start=1):	# unit 0 is left to Blender
+			txt.bind_to_image(unit, read=True, write=unit == 1)
+			kernel[key].value = unit
+		for key, value in uniforms.items():
+			kernel[key] = value
+		kernel.run(group_x=groups[0], group_y=groups[1])
+		common.data.context.memory_barrier()
+
+#-------------------------------------------- NumPy
+
+class NumpyBackend(Backend):
+	"""Runs vectorized NumPy code on float32 arrays. Work groups are ignored, kernels run over whole maps."""
+
+	name = "numpy"
+
+	@property
+	def solvers(self)->dict:
+		return cpu.SOLVERS
+
+	def is_map(self, value)->bool:
+		return isinstance(value, np.ndarray)
+
+	def create(self, size: tuple[int,int], channels: int = 1)->np.ndarray:
+		shape = (size[1], size[0]) if channels == 1 else (size[1], size[0], channels)
+		return np.zeros(shape, dtype=np.float32)
+
+	def upload(self, array: np.ndarray)->np.ndarray:
+		return np.array(array, dtype=np.float32, order="C")
+
+	def download(self, m: np.ndarray)->np.ndarray:
+		return m.copy()
+
+	def kernel(self, name: str):
+		if name not in kernels.KERNELS:
+			raise KeyError(f"Kernel '{name}' isn't implemented by the NumPy backend")
+		return kernels.KERNELS[name]
+
+	def dispatch(self, kernel, groups: tuple[int,int], maps: dict, **uniforms)->None:
+		kernel(**maps, **uniforms)
+
+#-------------------------------------------- Selection
+
+BACKENDS = {
+	"gl": GLBackend(),
+	"numpy": NumpyBackend(),
+}
+"""Backends by name."""
+
+def get_backend(name: str)->Backend:
+	"""Gets a backend by name.
+
+	:param name: One of the :data:`BACKENDS` keys.
+	:type name: :class:`str`
+	:return: Backend.
+	:rtype: :class:`Backend`"""
+	if name not in BACKENDS:
+		raise ValueError(f"Unknown backend '{name}', expected one of auto, {', '.join(BACKENDS)}")
+	return BACKENDS[name]
+
+def select_backend(size: tuple[int,int], solver: str, name: str = "auto", prefer: str | None = None)->Backend:
+	"""Selects a backend to run a simulation on.
+
+	Automatic selection uses OpenGL if a context was created and the map fits into a texture,
+	unless the map is at most :data:`NUMPY_MAX_PIXELS` large or NumPy is preferred. Only backends
+	implementing `solver` are considered.
+
+	:param size: Map size.
+	:type size: :class:`tuple[int,int]`
+	:param solver: Simulation name from :data:`SOLVER_NAMES`.
+	:type solver: :class:`str`
+	:param name: Backend name, or `auto` for automatic selection.
+	:type name: :class:`str`
+	:param prefer: Backend to use when it can run the simulation, e.g. the one already storing the inputs.
+	:type prefer: :class:`str` or :class:`None`
+	:return: Selected backend.
+	:rtype: :class:`Backend`"""
+	if name != "auto":
+		backend = get_backend(name)
+		if not backend.is_available():
+			raise RuntimeError(f"The {name} backend isn't available, create a context first")
+		if solver not in backend.solvers:
+			raise NotImplementedError(f"Simulation '{solver}' isn't implemented by the {name} backend")
+		if not backend.fits(size):
+			raise ValueError(f"Maps of size {size[0]}x{size[1]} don't fit into the {name} backend")
+		return backend
+
+	usable = [b for b in BACKENDS.values() if b.is_available() and solver in b.solvers and b.fits(size)]
+	if len(usable) == 0:
+		raise RuntimeError(f"No backend can run '{solver}' on a {size[0]}x{size[1]} map, create a context first")
+
+	for backend in usable:
+		if backend.name == prefer:
+			return backend
+
+	gl, numpy = BACKENDS["gl"], BACKENDS["numpy"]
+	if numpy in usable and (gl not in usable or size[0] * size[1] <= NUMPY_MAX_PIXELS):
+		return numpy
+	return usable[0]
@@ -0,0 +1,303 @@
+"""Module responsible for batch simulations from the command line. Run as `python -m Hydra`."""
+
+import argparse
+import json
+import os
+import numpy as np
+from dataclasses import fields
+from datetime import datetime
+from pathlib import Path
+
+from Hydra import common
+from Hydra.core import api, backend, context, io, textures, tiling
+from Hydra.core.settings import Settings
+from Hydra.core.cpu import bands
+from Hydra.core.cpu import textures as cpu_textures
+
+SOLVERS = ("particle", "pipe", "thermal", "snow", "flow", "color")
+"""Solvers that can be chained. Solvers after `flow` and `color` run on the last heightmap."""
+
+BACKEND_SOLVERS = {"particle": "particle", "pipe": "mei", "thermal": "thermal", "snow": "snow", "flow": "flow"}
+"""Backend simulation names of :data:`SOLVERS`, see :data:`Hydra.core.backend.SOLVER_NAMES`. `color` depends on `color_solver`."""
+
+SHADER_CACHE_ENVIRONMENT = ("MESA_SHADER_CACHE_DIR", "__GL_SHADER_DISK_CACHE_PATH")
+"""Environment variables of driver shader caches, which are pointed to the shader cache directory."""
+
+#-------------------------------------------- Settings
+
+def parse_value(settings: Settings, key: str, value: str)->None:
+	"""Sets a settings field from its text form.
+
+	:param settings: Settings to modify.
+	:type settings: :class:`Hydra.core.settings.Settings`
+	:param key: Field name.
+	:type key: :class:`str`
+	:param value: Field value. Booleans accept `true`/`false`, sets are comma-separated.
+	:type value: :class:`str`"""
+	current = getattr(settings, key, None)
+	if key not in {f.name for f in fields(settings)}:
+		raise ValueError(f"Unknown setting '{key}'")
+
+	if isinstance(current, bool):
+		if value.lower() not in ("true", "false", "1", "0"):
+			raise ValueError(f"Expected true or false for '{key}'")
+		parsed = value.lower() in ("true", "1")
+	elif isinstance(current, set):
+		parsed = {v.strip() for v in value.split(",") if v.strip()}
+	else:
+		parsed = type(current)(value)
+
+	setattr(settings, key, parsed)
+
+def load_settings(config: str | None, overrides: list[str])->tuple[Settings, list[str]]:
+	"""Loads settings and the solver sequence from a JSON file and command-line overrides.
+
+	:param config: Path to a JSON object with settings fields and an optional `solvers` list.
+	:type config: :class:`str` or :class:`None`
+	:param overrides: Overrides in the form `key=value`.
+	:type overrides: :class:`list[str]`
+	:return: Settings and solver sequence, which is empty if not specified.
+	:rtype: :class:`tuple[Settings, list[str]]`"""
+	settings = Settings()
+	solvers = []
+
+	if config is not None:
+		values = json.loads(Path(config).read_text("utf-8"))
+		solvers = values.pop("solvers", [])
+		for key, value in values.items():
+			if isinstance(value, list):
+				value = ",".join(value)
+			elif isinstance(value, bool):
+				value = str(value).lower()
+			parse_value(settings, key, str(value))
+
+	for override in overrides:
+		key, sep, value = override.partition("=")
+		if not sep:
+			raise ValueError(f"Expected key=value, got '{override}'")
+		parse_value(settings, key.strip(), value.strip())
+
+	return settings, solvers
+
+#-------------------------------------------- Processing
+
+def find_inputs(paths: list[str])->list[Path]:
+	"""Expands directories into the supported map files they contain.
+
+	:param paths: Files and directories.
+	:type paths: :class:`list[str]`
+	:return: Sorted map files.
+	:rtype: :class:`list[pathlib.Path]`"""
+	ret = []
+	for path in map(Path, paths):
+		if path.is_dir():
+			ret += sorted(p for p in path.iterdir() if p.suffix.lower() in io.FORMATS)
+		else:
+			ret.append(path)
+	return ret
+
+def fit_map(array: np.ndarray, size: tuple[int,int])->np.ndarray:
+	"""Resizes a single channel map to the given size if needed.
+
+	:param array: Map of shape `(height, width)`.
+	:type array: :class:`numpy.ndarray`
+	:param size: Target size as `(width, height)`.
+	:type size: :class:`tuple[int,int]`
+	:return: Map of the target size.
+	:rtype: :class:`numpy.ndarray`"""
+	if array.shape[:2] == (size[1], size[0]):
+		return array
+
+	return cpu_textures.resize(array, size)
+
+def read_input(template: str | None, stem: str, raw_size: tuple[int,int] | None, channels: int, mmap: bool = False)->np.ndarray | None:
+	"""Reads an additional input map, e.g. hardness, whose path may depend on the heightmap name.
+
+	:param template: Path, where `{stem}` is replaced by the heightmap file name without its extension.
+	:type template: :class:`str` or :class:`None`
+	:param stem: Heightmap file name without its extension.
+	:type stem: :class:`str`
+	:param raw_size: Size of raw files.
+	:type raw_size: :class:`tuple[int,int]` or :class:`None`
+	:param channels: Required channel count, either 1 or 4.
+	:type channels: :class:`int`
+	:param mmap: Memory-maps the file if possible, see :func:`Hydra.core.io.read_map`.
+	:type mmap: :class:`bool`
+	:return: Map or `None` if no template is given.
+	:rtype: :class:`numpy.ndarray` or :class:`None`"""
+	if template is None:
+		return None
+
+	array = io.read_map(template.replace("{stem}", stem), raw_size, mmap)
+	if channels == 1:
+		return array if array.ndim == 2 else np.ascontiguousarray(array[..., 0])
+
+	if array.ndim == 2:
+		array = np.dstack((array, array, array))
+	if array.shape[2] == 3:
+		array = np.dstack((array, np.ones(array.shape[:2], dtype=np.float32)))
+	return array
+
+def process(path: Path, output: Path, solvers: list[str], settings: Settings, args: argparse.Namespace)->None:
+	"""Runs the solver sequence on a single heightmap and writes the results.
+
+	:param path: Heightmap file.
+	:type path: :class:`pathlib.Path`
+	:param output: Output directory.
+	:type output: :class:`pathlib.Path`
+	:param solvers: Solver sequence.
+	:type solvers: :class:`list[str]`
+	:param settings: Simulation settings.
+	:type settings: :class:`Hydra.core.settings.Settings`
+	:param args: Parsed command-line arguments.
+	:type args: :class:`argparse.Namespace`"""
+	height = io.read_map(path, args.raw_size, mmap=args.mmap)
+	if height.ndim == 3:
+		height = np.ascontiguousarray(height[..., 0])
+
+	stem = path.stem
+	size = (height.shape[1], height.shape[0])
+	sim_size = textures.subres_size(size, settings.erosion_subres)
+
+	hardness = read_input(args.hardness, stem, args.raw_size, 1, args.mmap)
+	water_src = read_input(args.water_src, stem, args.raw_size, 1, args.mmap)
+	color = read_input(args.color, stem, args.raw_size, 4)
+
+	tile = args.tile
+	if tile is None and args.backend != "numpy" and common.data.context is not None and not backend.BACKENDS["gl"].fits(size):
+		tile = tiling.TILE_SIZE	# too large for a texture
+
+	mapped = None
+	if args.mmap:
+		if any(solver not in ("pipe", "thermal") for solver in solvers):
+			raise ValueError("Only pipe and thermal erosion can run on memory-mapped maps")
+		if args.format not in (None, ".npy"):
+			raise ValueError("Memory-mapped results are written as .npy files")
+		target = output.joinpath(stem + ".npy")
+		if target.resolve() == path.resolve():
+			raise ValueError("Memory-mapped results can't replace their input")
+		mapped = common.MappedHeightmap(stem, target, size)
+		tile = tile if tile is not None else tiling.TILE_SIZE
+
+	outputs = {}
+	for solver in solvers:
+		if solver == "particle":
+			result = api.erode_particle(height, settings, hardness, backend=args.backend)
+		elif solver == "pipe":
+			maps = (fit_map(hardness, sim_size) if hardness is not None else None,
+				fit_map(water_src, sim_size) if water_src is not None else None)
+			if tile is not None:
+				result = tiling.simulate_tiled("mei", height, settings, *maps, tile_size=tile, out=mapped.array if mapped is not None else None)
+			else:
+				result = api.erode_mei(height, settings, *maps, backend=args.backend)
+		elif solver == "thermal":
+			if tile is not None:
+				result = tiling.simulate_tiled("thermal", height, settings, tile_size=tile, out=mapped.array if mapped is not None else None)
+			else:
+				result = api.erode_thermal(height, settings, backend=args.backend)
+		elif solver == "snow":
+			result = api.simulate_snow(height, settings, backend=args.backend)
+		elif solver == "flow":
+			result = api.generate_flow(height, settings, backend=args.backend)
+		else:
+			if color is None:
+				raise ValueError("Color transport needs a --color map")
+			if color.shape[:2] != height.shape:
+				raise ValueError("The color map has to be of the heightmap size")
+			result = api.transport_color(height, color, settings, backend=args.backend)
+
+		if result.state is not None:	# no later simulation resumes from it
+			result.state.release()
+
+		if result.height is not None:
+			height = result.height
+		outputs.update(result.outputs)
+
+	ext = args.format or path.suffix.lower()
+	if mapped is not None:	# written in place
+		ext = ".npy"
+		mapped.release()
+	else:
+		io.write_map(output.joinpath(stem + ext), height)
+	for name, array in outputs.items():
+		io.write_map(output.joinpath(f"{stem}_{name}{ext}"), array)
+
+#-------------------------------------------- Entry
+
+def main(argv: list[str] | None = None)->int:
+	"""Command-line entry point.
+
+	:param argv: Arguments, `sys.argv` is used if not specified.
+	:type argv: :class:`list[str]` or :class:`None`
+	:return: Exit code, 1 if any input failed.
+	:rtype: :class:`int`"""
+	parser = argparse.ArgumentParser(prog="python -m Hydra", description="Runs Hydra simulations on heightmap files without Blender.")
+	parser.add_argument("inputs", nargs="+", help=f"heightmap files or directories of them ({', '.join(io.FORMATS)})")
+	parser.add_argument("-o", "--output", required=True, help="output directory")
+	parser.add_argument("-s", "--solvers", help=f"comma-separated solver sequence from {', '.join(SOLVERS)}")
+	parser.add_argument("-c", "--config", help="JSON file with settings and an optional 'solvers' list")
+	parser.add_argument("--set", action="append", default=[], metavar="KEY=VALUE", help="overrides a setting, can be repeated")
+	parser.add_argument("-f", "--format", choices=io.FORMATS, help="output format, same as the input by default")
+	parser.add_argument("--raw-size", type=int, nargs=2, metavar=("WIDTH", "HEIGHT"), help="size of raw inputs, square by default")
+	parser.add_argument("--hardness", help="hardness map, '{stem}' is replaced by the input name")
+	parser.add_argument("--water-src", help="water source map for the pipe solver, '{stem}' is replaced by the input name")
+	parser.add_argument("--color", help="color map for color transport, '{stem}' is replaced by the input name")
+	parser.add_argument("--backend", choices=("auto", *backend.BACKENDS), default="auto", help="compute backend, chosen by context availability and map size by default")
+	parser.add_argument("--tile", type=int, metavar="SIZE", help="runs pipe and thermal erosion on the GPU in tiles of this size, used for maps larger than a texture by default")
+	parser.add_argument("--mmap", action="store_true", help="memory-maps .npy and .r32 maps and simulates into .npy files in tiles, for maps larger than host memory")
+	parser.add_argument("--workers", type=int, help="threads and processes used by the NumPy backend, all cores by default")
+	parser.add_argument("--provider", choices=context.PROVIDERS, default="auto", help="OpenGL context provider")
+	parser.add_argument("--device", type=int, help="EGL device index")
+	parser.add_argument("--shader-cache", help="directory of the driver's persistent shader cache")
+	args = parser.parse_args(argv)
+
+	settings, solvers = load_settings(args.config, args.set)
+	if args.solvers is not None:
+		solvers = [s.strip() for s in args.solvers.split(",") if s.strip()]
+	if len(solvers) == 0:
+		parser.error("no solvers specified")
+	for solver in solvers:
+		if solver not in SOLVERS:
+			parser.error(f"unknown solver '{solver}'")
+
+	if args.shader_cache is not None:
+		Path(args.shader_cache).mkdir(parents=True, exist_ok=True)
+		for key in SHADER_CACHE_ENVIRONMENT:
+			os.environ[key] = str(Path(args.shader_cache).resolve())
+
+	if args.workers is not None:
+		bands.workers = max(args.workers, 1)
+
+	output = Path(args.output)
+	output.mkdir(parents=True, exist_ok=True)
+
+	if args.backend != "numpy":
+		try:
+			context.create_context(provider=args.provider, device=args.device)	# one context for all inputs, shaders are compiled once
+		except RuntimeError as e:
+			if args.backend == "gl":
+				raise
+			print(f"OpenGL isn't available, using NumPy. {e}")
+
+	if args.backend == "numpy" or common.data.context is None:	# fail before any input is processed
+		implemented = backend.BACKENDS["numpy"].solvers
+		for solver in solvers:
+			name = BACKEND_SOLVERS.get(solver, "color_particle" if settings.color_solver == "particle" else "color_mei")
+			if name not in implemented:
+				parser.error(f"solver '{solver}' isn't implemented by the NumPy backend")
+
+	failed = 0
+	inputs = find_inputs(args.inputs)
+	for path in inputs:
+		time = datetime.now()
+		try:
+			process(path, output, solvers, settings, args)
+			print(f"{path.name}: {(datetime.now() - time).total_seconds():.2f} s")
+		except Exception as e:
+			print(f"{path.name}: failed, {e}")
+			failed += 1
+
+		common.data._info_ = []	# messages are only shown in Blender
+
+	print(f"Processed {len(inputs) - failed} of {len(inputs)} maps")
+	return 1 if failed != 0 else 0
@@ -0,0 +1,79 @@
+"""Module responsible for creating a ModernGL context outside of Blender."""
+
+import moderngl as mgl
+import os
+from Hydra import common, opengl
+
+PROVIDERS = ("auto", "egl", "software", "x11")
+"""Standalone context providers. `egl` runs headless on the default EGL device, `software` forces
+Mesa's llvmpipe rasterizer through EGL for hosts without a GPU, `x11` needs a display,
+and `auto` tries them in this order."""
+
+SOFTWARE_ENVIRONMENT = {
+	"LIBGL_ALWAYS_SOFTWARE": "1",
+	"GALLIUM_DRIVER": "llvmpipe",
+	"EGL_PLATFORM": "surfaceless",
+}
+"""Environment variables selecting Mesa's software rasterizer while the `software` context is created."""
+
+def open_context(provider: str = "auto", device: int | None = None)->mgl.Context:
+	"""Creates a standalone OpenGL 4.3 context without a window.
+
+	:param provider: One of :data:`PROVIDERS`.
+	:type provider: :class:`str`
+	:param device: Index of the EGL device to use for the `egl` provider. Uses the default device if not specified.
+	:type device: :class:`int` or :class:`None`
+	:return: Created context.
+	:rtype: :class:`moderngl.Context`"""
+	if provider not in PROVIDERS:
+		raise ValueError(f"Unknown context provider '{provider}', expected one of {', '.join(PROVIDERS)}")
+
+	if provider == "auto":
+		errors = []
+		for option in PROVIDERS[1:]:
+			try:
+				return open_context(option, device)
+			except Exception as e:
+				errors.append(f"{option}: {e}")
+		raise RuntimeError("Failed to create an OpenGL 4.3 context. " + "; ".join(errors))
+
+	if provider == "x11":
+		return mgl.create_context(standalone=True, require=430)
+
+	settings = {} if device is None or provider == "software" else {"device_index": device}
+
+	if provider == "egl":
+		return mgl.create_context(standalone=True, backend="egl", require=430, **settings)
+
+	saved = {key: os.environ.get(key) for key in SOFTWARE_ENVIRONMENT}
+	os.environ.update(SOFTWARE_ENVIRONMENT)
+	try:
+		return mgl.create_context(standalone=True, backend="egl", require=430)
+	finally:
+		for key, value in saved.items():
+			if value is None:
+				del os.environ[key]
+			else:
+				os.environ[key] = value
+
+def create_context(ctx: mgl.Context | None = None, provider: str = "auto", device: int | None = None)->mgl.Context:
+	"""Prepares :data:`Hydra.common.data` for simulations outside of Blender.
+
+	Replaces any previous global data, so all maps, states and shaders of a previous context are dropped.
+
+	:param ctx: Context to use. A standalone context is created with :func:`open_context` if not specified.
+	:type ctx: :class:`moderngl.Context` or :class:`None`
+	:param provider: Standalone context provider, one of :data:`PROVIDERS`.
+	:type provider: :class:`str`
+	:param device: Index of the EGL device to use.
+	:type device: :class:`int` or :class:`None`
+	:return: Used context.
+	:rtype: :class:`moderngl.Context`"""
+	if ctx is None:
+		ctx = open_context(provider, device)
+		print(f"Using {ctx.info['GL_RENDERER']}")
+
+	common.data = common.HydraData()
+	common.data.context = ctx
+	opengl.init_context()
+	return ctx
@@ -0,0 +1,15 @@
+"""CPU simulations running on NumPy arrays, used by the NumPy backend on machines without OpenGL 4.3.
+
+Stencil kernels run in row bands on :data:`Hydra.core.cpu.bands.workers` threads,
+particles run in as many processes on tiles of a shared heightmap."""
+
+from Hydra.core.cpu import thermal, snow, mei, particle
+
+SOLVERS = {
+	"particle": particle.erode,
+	"thermal": thermal.erode,
+	"snow": snow.simulate,
+	"mei": mei.erode,
+	"color_mei": mei.transport_color,
+}
+"""Simulations by backend solver name, see :data:`Hydra.core.backend.SOLVER_NAMES`."""
@@ -0,0 +1,67 @@
+"""Module responsible for splitting CPU work into row bands.
+
+NumPy releases the GIL inside vectorized operations, so bands of a map run in parallel on threads."""
+
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+MIN_BAND_ROWS = 64
+"""Smallest band height. Maps with fewer rows per worker are split into fewer bands."""
+
+workers: int = os.cpu_count() or 1
+"""Number of threads used by CPU simulations, and of processes used by particle simulations. Set to 1 to run on the calling thread only."""
+
+_pool: ThreadPoolExecutor | None = None
+_pool_size = 0
+
+def split(rows: int)->list[tuple[int,int]]:
+	"""Splits rows into contiguous bands of similar height, one per worker.
+
+	:param rows: Number of map rows.
+	:type rows: :class:`int`
+	:return: Bands as `(start, end)` row ranges.
+	:rtype: :class:`list[tuple[int,int]]`"""
+	count = max(1, min(workers, rows // MIN_BAND_ROWS))
+	bounds = [rows * i // count for i in range(count + 1)]
+	return list(zip(bounds[:-1], bounds[1:]))
+
+def run(func, bands: list[tuple[int,int]])->None:
+	"""Runs a function on every band and waits for all of them to finish.
+
+	:param func: Function taking the `start` and `end` rows of a band. Bands must only write their own rows.
+	:type func: :class:`Callable`
+	:param bands: Bands from :func:`split`.
+	:type bands: :class:`list[tuple[int,int]]`"""
+	if len(bands) == 1:
+		func(*bands[0])
+		return
+
+	global _pool, _pool_size
+	if _pool is None or _pool_size < len(bands):
+		if _pool is not None:
+			_pool.shutdown()
+		_pool = ThreadPoolExecutor(len(bands), thread_name_prefix="hydra")
+		_pool_size = len(bands)
+
+	for future in [_pool.submit(func, *band) for band in bands]:
+		future.result()
+
+def view(array, pad: int, start: int, end: int, dx: int = 0, dy: int = 0):
+	"""Returns rows of a map stored with a border, shifted by the given offset. Leading axes, e.g. channels, are kept.
+
+	:param array: Map with a border of `pad` cells on every side.
+	:type array: :class:`numpy.ndarray`
+	:param pad: Border width.
+	:type pad: :class:`int`
+	:param start: First row without the border.
+	:type start: :class:`int`
+	:param end: Row after the last one.
+	:type end: :class:`int`
+	:param dx: Column shift, at most `pad` cells.
+	:type dx: :class:`int`
+	:param dy: Row shift, at most `pad` cells.
+	:type dy: :class:`int`
+	:return: View of shape `(..., end - start, columns)`.
+	:rtype: :class:`numpy.ndarray`"""
+	cols = array.shape[-1] - 2 * pad
+	return array[..., pad + start + dy:pad + end + dy, pad + dx:pad + cols + dx]
@@ -0,0 +1,39 @@
+"""Module defining NumPy counterparts of simple compute shaders.
+
+Kernels modify their first map in place, take the remaining maps and uniforms as keyword arguments
+named like the shader uniforms, and run over whole maps at once."""
+
+import numpy as np
+
+def scaled_add(A: np.ndarray, B: np.ndarray, factor: float = 1.0, scale: float = 1.0)->None:
+	"""Counterpart of `scaled_add.glsl`. Computes `A = scale * (A + factor * B)`.
+
+	:param A: Output map.
+	:type A: :class:`numpy.ndarray`
+	:param B: Added map.
+	:type B: :class:`numpy.ndarray`
+	:param factor: Multiplication factor for `B`.
+	:type factor: :class:`float`
+	:param scale: Scale factor for the result.
+	:type scale: :class:`float`"""
+	if factor == 1.0:
+		A += B
+	else:
+		A += np.float32(factor) * B
+	if scale != 1.0:
+		A *= np.float32(scale)
+
+def scaling(A: np.ndarray, scale: float = 1.0)->None:
+	"""Counterpart of `scaling.glsl`. Computes `A = scale * A`.
+
+	:param A: Output map.
+	:type A: :class:`numpy.ndarray`
+	:param scale: Scale factor.
+	:type scale: :class:`float`"""
+	A *= np.float32(scale)
+
+KERNELS = {
+	"scaled_add": scaled_add,
+	"scaling": scaling,
+}
+"""Kernels by shader name."""
@@ -0,0 +1,569 @@
+"""Module responsible for pipe-model erosion on the CPU. Counterpart of :mod:`Hydra.core.mei`."""
+
+import numpy as np
+from datetime import datetime
+from Hydra import common
+from Hydra.core import textures, mei
+from Hydra.core.cpu import bands, reduction
+from Hydra.core.cpu import textures as cpu_textures
+from Hydra.core.cpu.thermal import as_array
+from Hydra.core.settings import Settings
+from Hydra.core.result import Result
+
+#  1y -1
+#0x  2z
+#  3w +1
+LEFT, UP, RIGHT, DOWN = range(4)
+"""Pipe channels, matching the shaders."""
+
+def _pcg(v: np.ndarray, tmp: np.ndarray)->None:
+	"""Hashes unsigned integers in place, counterpart of `pcg` in `mei1.glsl`.
+
+	:param v: Values to hash.
+	:type v: :class:`numpy.ndarray`
+	:param tmp: Buffer of the same shape and type.
+	:type tmp: :class:`numpy.ndarray`"""
+	v *= np.uint32(747796405)
+	v += np.uint32(2891336453)
+	np.right_shift(v, np.uint32(28), out=tmp)
+	tmp += np.uint32(4)
+	np.right_shift(v, tmp, out=tmp)
+	v ^= tmp
+	v *= np.uint32(277803737)
+	np.right_shift(v, np.uint32(22), out=tmp)
+	v ^= tmp
+
+class PipeModel:
+	"""State and passes of the pipe model, counterparts of `mei1.glsl` to `mei6.glsl` and `mei_color.glsl`.
+
+	Maps are stored with a zero border of one cell, which stands in for reads outside of the texture.
+	Passes run in row bands on preallocated buffers and only write the rows of their band."""
+
+	def __init__(self, height: np.ndarray, state: common.SolverState | None = None, color: np.ndarray | None = None):
+		"""Constructor method.
+
+		:param height: Initial heightmap, which is copied.
+		:type height: :class:`numpy.ndarray`
+		:param state: Optional state of a previous simulation of the same size to resume from.
+		:type state: :class:`Hydra.common.SolverState` or :class:`None`
+		:param color: Optional RGBA color map to move with the water, which is copied.
+		:type color: :class:`numpy.ndarray` or :class:`None`"""
+		rows, cols = height.shape
+		self.size = (cols, rows)
+		padded = (rows + 2, cols + 2)
+
+		self.height = np.zeros(padded, dtype=np.float32)
+		self.water = np.zeros(padded, dtype=np.float32)
+		self.sediment = np.zeros(padded, dtype=np.float32)
+		self.temp = np.zeros(padded, dtype=np.float32)
+		"""Mean water depth, capacity and new sediment at different stages."""
+		self.pipe = np.zeros((4, *padded), dtype=np.float32)
+		self.velocity = np.zeros((2, *padded), dtype=np.float32)
+		self.total = np.zeros(padded, dtype=np.float32)
+		"""Height of the water surface."""
+
+		self.interior(self.height)[...] = height
+		if state is not None:
+			for name, target in (("water", self.water), ("sediment", self.sediment), ("temp", self.temp)):
+				self.interior(target)[...] = as_array(state.textures[name])
+			self.interior(self.pipe)[...] = np.moveaxis(as_array(state.textures["pipe"]), -1, 0)
+			self.interior(self.velocity)[...] = np.moveaxis(as_array(state.textures["velocity"]), -1, 0)
+
+		self.color = self.color_out = None
+		if color is not None:
+			self.color = np.zeros((4, *padded), dtype=np.float32)
+			self.color_out = np.zeros((4, *padded), dtype=np.float32)
+			self.interior(self.color)[...] = np.moveaxis(color, -1, 0)
+
+		self.bands = bands.split(rows)
+		self.scratch = []
+		for start, end in self.bands:
+			shape = (end - start, cols)
+			y, x = np.mgrid[start:end, 0:cols]
+			self.scratch.append({
+				"f": np.empty((6, *shape), dtype=np.float32),
+				"mask": np.empty(shape, dtype=bool),
+				"x": x.astype(np.float32),
+				"y": y.astype(np.float32),
+				"hash": (x * 7877 + y * 2833).astype(np.uint32),
+				"u": np.empty((2, *shape), dtype=np.uint32),
+				"clamp": cpu_textures.Sampler(shape, self.size),
+				"repeat": cpu_textures.Sampler(shape, self.size, repeat=True),
+			})
+
+	def interior(self, array: np.ndarray)->np.ndarray:
+		"""Returns a map without its border.
+
+		:param array: Map with a border.
+		:type array: :class:`numpy.ndarray`
+		:return: View of the map.
+		:rtype: :class:`numpy.ndarray`"""
+		return bands.view(array, 1, 0, self.size[1])
+
+	def run(self, func, *args)->None:
+		"""Runs a pass on all bands.
+
+		:param func: Pass taking the band rows, its scratch buffers and `args`.
+		:type func: :class:`Callable`"""
+		bands.run(lambda start, end: func(start, end, self.scratch[self.bands.index((start, end))], *args), self.bands)
+
+	def state(self)->dict[str, np.ndarray]:
+		"""Copies the water state in the layout of :data:`Hydra.core.mei.STATE_TEXTURES`.
+
+		:return: Arrays by name.
+		:rtype: :class:`dict[str, numpy.ndarray]`"""
+		return {
+			"pipe": np.ascontiguousarray(np.moveaxis(self.interior(self.pipe), 0, -1)),
+			"velocity": np.ascontiguousarray(np.moveaxis(self.interior(self.velocity), 0, -1)),
+			"water": self.interior(self.water).copy(),
+			"sediment": self.interior(self.sediment).copy(),
+			"temp": self.interior(self.temp).copy(),
+		}
+
+	# ----------------------------------------------------- Passes
+
+	def _surface(self, start: int, end: int, scratch: dict)->None:
+		"""Sums terrain and water heights."""
+		np.add(bands.view(self.height, 1, start, end), bands.view(self.water, 1, start, end), out=bands.view(self.total, 1, start, end))
+
+	def _rain(self, start: int, end: int, scratch: dict, dt: float, Ke: float, Kr: float, water_src: np.ndarray | None, seed: int | None)->None:
+		"""`mei1`: Adds rain and evaporates water."""
+		d = bands.view(self.water, 1, start, end)
+		d *= np.float32(1 - dt * Ke)
+
+		if seed is None and water_src is None:
+			d += np.float32(dt * Kr)
+			return
+
+		kr = scratch["f"][0]
+		if seed is not None:
+			v, tmp = scratch["u"]
+			np.add(scratch["hash"], np.uint32(seed), out=v)
+			_pcg(v, tmp)
+			v &= np.uint32(0xFF)
+			np.greater(v, 0xFA, out=scratch["mask"])
+			np.multiply(scratch["mask"], np.float32(Kr), out=kr)
+		else:
+			kr.fill(Kr)
+
+		if water_src is not None:
+			kr *= water_src[start:end]
+		kr *= np.float32(dt)
+		d += kr
+
+	def _outflow(self, start: int, end: int, scratch: dict, dt: float, A: float, lx: float, ly: float, drain_dt: float)->None:
+		"""`mei2`: Accelerates outflow towards lower neighbors and limits it to the available water."""
+		t, total, water, K = scratch["f"][:4]
+		mask = scratch["mask"]
+		rows, cols = self.size[1], self.size[0]
+		h = bands.view(self.total, 1, start, end)
+
+		total.fill(0)
+		for channel, dx, dy, length in ((LEFT, -1, 0, lx), (UP, 0, -1, ly), (RIGHT, 1, 0, lx), (DOWN, 0, 1, ly)):
+			p = bands.view(self.pipe[channel], 1, start, end)
+			np.subtract(h, bands.view(self.total, 1, start, end, dx, dy), out=t)
+			t *= np.float32(dt * A * length)
+			p += t
+			np.maximum(p, 0, out=p)
+
+			# no outflow over the map edge
+			if dx < 0:
+				p[:, 0] = 0
+			elif dx > 0:
+				p[:, cols - 1] = 0
+			if dy < 0 and start == 0:
+				p[0] = 0
+			elif dy > 0 and end == rows:
+				p[-1] = 0
+
+			total += p
+
+		np.multiply(bands.view(self.water, 1, start, end), np.float32(lx * ly), out=water)
+		np.greater(total, water, out=mask)
+		total *= np.float32(drain_dt)
+		with np.errstate(divide="ignore"):	# clamped like in the shader
+			np.divide(water, total, out=K, where=mask)
+		np.clip(K, 0, 1, out=K)
+		for channel in range(4):
+			p = bands.view(self.pipe[channel], 1, start, end)
+			np.multiply(p, K, out=p, where=mask)
+
+	def _update_water(self, start: int, end: int, scratch: dict, dt: float, lx: float, ly: float)->None:
+		"""`mei3`: Moves water through the pipes. Stores the mean depth of the step in `temp`."""
+		dv, t = scratch["f"][:2]
+		pipe = self.pipe
+
+		np.add(bands.view(pipe[RIGHT], 1, start, end, -1, 0), bands.view(pipe[LEFT], 1, start, end, 1, 0), out=dv)
+		dv += bands.view(pipe[DOWN], 1, start, end, 0, -1)
+		dv += bands.view(pipe[UP], 1, start, end, 0, 1)
+
+		np.add(bands.view(pipe[LEFT], 1, start, end), bands.view(pipe[UP], 1, start, end), out=t)
+		t += bands.view(pipe[RIGHT], 1, start, end)
+		t += bands.view(pipe[DOWN], 1, start, end)
+		dv -= t
+		dv *= np.float32(dt / (lx * ly))
+
+		d = bands.view(self.water, 1, start, end)
+		np.multiply(dv, 0.5, out=t)
+		t += d
+		np.maximum(t, 0, out=bands.view(self.temp, 1, start, end))
+		d += dv
+		np.maximum(d, 0, out=d)
+
+	def _capacity(self, start: int, end: int, scratch: dict, Kc: float, lx: float, ly: float, scale: float, depth_scale: float)->None:
+		"""`mei4`: Calculates flow velocity and sediment capacity. Stores the capacity in `temp`."""
+		dmean, du, dv, sx, sy = scratch["f"][:5]
+		pipe = self.pipe
+		c = bands.view(self.temp, 1, start, end)
+		np.maximum(c, 1e-5, out=dmean)
+
+		np.subtract(bands.view(pipe[RIGHT], 1, start, end, -1, 0), bands.view(pipe[LEFT], 1, start, end, 1, 0), out=du)
+		du += bands.view(pipe[RIGHT], 1, start, end)
+		du -= bands.view(pipe[LEFT], 1, start, end)
+		u = bands.view(self.velocity[0], 1, start, end)
+		np.multiply(dmean, np.float32(ly), out=sx)
+		np.divide(du, sx, out=u)
+		u *= 0.5
+
+		np.subtract(bands.view(pipe[DOWN], 1, start, end, 0, -1), bands.view(pipe[UP], 1, start, end, 0, 1), out=dv)
+		dv += bands.view(pipe[DOWN], 1, start, end)
+		dv -= bands.view(pipe[UP], 1, start, end)
+		v = bands.view(self.velocity[1], 1, start, end)
+		np.multiply(dmean, np.float32(lx), out=sx)
+		np.divide(dv, sx, out=v)
+		v *= 0.5
+
+		np.subtract(bands.view(self.total, 1, start, end, 1, 0), bands.view(self.total, 1, start, end, -1, 0), out=sx)
+		np.abs(sx, out=sx)
+		sx *= np.float32(0.5 * scale)
+		np.subtract(bands.view(self.total, 1, start, end, 0, 1), bands.view(self.total, 1, start, end, 0, -1), out=sy)
+		np.abs(sy, out=sy)
+		sy *= np.float32(0.5 * scale)
+		np.hypot(sx, sy, out=sx)	# slope
+
+		np.hypot(u, v, out=sy)	# speed
+		sx *= sy
+		sx *= np.float32(Kc)
+
+		np.multiply(dmean, np.float32(-depth_scale), out=sy)
+		sy += 1
+		np.maximum(sy, 0, out=sy)
+		np.multiply(sx, sy, out=c)
+
+	def _erode(self, start: int, end: int, scratch: dict, Ks: float, Kd: float, hardness: np.ndarray | None)->None:
+		"""`mei5`: Exchanges material between terrain and sediment. Stores the new sediment in `temp`."""
+		dif, ks, t = scratch["f"][:3]
+		mask = scratch["mask"]
+		c = bands.view(self.temp, 1, start, end)
+		b = bands.view(self.height, 1, start, end)
+		s = bands.view(self.sediment, 1, start, end)
+		d = bands.view(self.water, 1, start, end)
+
+		if hardness is not None:
+			np.multiply(hardness[start:end], np.float32(Ks), out=ks)
+			np.clip(ks, 0, 1, out=ks)
+		else:
+			ks.fill(Ks)
+		np.greater(c, s, out=mask)
+		t.fill(Kd)
+		np.copyto(t, ks, where=mask)
+
+		np.subtract(c, s, out=dif)
+		dif *= t
+		np.negative(d, out=t)
+		np.maximum(dif, t, out=dif)
+		np.minimum(dif, b, out=dif)
+
+		b -= dif
+		d += dif
+		np.add(s, dif, out=c)
+		np.maximum(c, 0, out=c)
+
+	def _advect(self, start: int, end: int, scratch: dict, dt: float)->None:
+		"""`mei6`: Moves sediment along the flow with a semi-Lagrangian step."""
+		vx, vy, px, py = scratch["f"][:4]
+		x, y = scratch["x"], scratch["y"]
+		sampler: cpu_textures.Sampler = scratch["clamp"]
+
+		# back-trace, then correct by half of the error of tracing forward again
+		np.multiply(bands.view(self.velocity[0], 1, start, end), np.float32(-dt), out=px)
+		px += x
+		np.multiply(bands.view(self.velocity[1], 1, start, end), np.float32(-dt), out=py)
+		py += y
+		self._correct(scratch, px, py, vx, vy, dt)
+
+		sampler.locate(px, py)
+		out = bands.view(self.sediment, 1, start, end)
+		sampler.sample(self.temp, vx)
+		np.maximum(vx, 0, out=out)
+
+	def _correct(self, scratch: dict, px: np.ndarray, py: np.ndarray, vx: np.ndarray, vy: np.ndarray, dt: float)->None:
+		"""Moves back-traced positions by half of the error of tracing them forward again."""
+		sampler: cpu_textures.Sampler = scratch["clamp"]
+		sampler.locate(px, py)
+		sampler.sample(self.velocity[0], vx)
+		sampler.sample(self.velocity[1], vy)
+
+		# vpos += 0.5 * (pos - (vpos + dt * vel))
+		vx *= np.float32(dt)
+		vx += px
+		np.subtract(scratch["x"], vx, out=vx)
+		vx *= 0.5
+		px += vx
+		vy *= np.float32(dt)
+		vy += py
+		np.subtract(scratch["y"], vy, out=vy)
+		vy *= 0.5
+		py += vy
+
+	def _move_color(self, start: int, end: int, scratch: dict, dt: float, scaling: float, factor_min: float, factor_max: float)->None:
+		"""`mei_color`: Moves colors along the flow and mixes them with the current ones."""
+		vx, vy, px, py, factor, t = scratch["f"]
+		sampler: cpu_textures.Sampler = scratch["repeat"]
+
+		u = bands.view(self.velocity[0], 1, start, end)
+		v = bands.view(self.velocity[1], 1, start, end)
+		np.multiply(u, u, out=factor)
+		np.multiply(v, v, out=t)
+		factor += t
+		factor *= np.float32(scaling)
+		np.clip(factor, factor_min, factor_max, out=factor)
+
+		np.multiply(u, np.float32(-dt), out=px)
+		px += scratch["x"]
+		np.multiply(v, np.float32(-dt), out=py)
+		py += scratch["y"]
+		self._correct(scratch, px, py, vx, vy, dt)
+
+		sampler.locate(px, py)
+		for channel in range(4):
+			out = bands.view(self.color_out[channel], 1, start, end)
+			sampler.sample(self.color[channel], t)
+			np.subtract(t, bands.view(self.color[channel], 1, start, end), out=t)
+			t *= factor
+			np.add(bands.view(self.color[channel], 1, start, end), t, out=out)	# new * f + current * (1 - f)
+
+	# ----------------------------------------------------- Steps
+
+	def step_water(self, dt: float, pipe_dt: float, Ke: float, Kr: float, lx: float, ly: float, water_src: np.ndarray | None = None, seed: int | None = None)->None:
+		"""Runs rain, outflow and water update passes.
+
+		:param dt: Time step.
+		:type dt: :class:`float`
+		:param pipe_dt: Time step of the outflow acceleration.
+		:type pipe_dt: :class:`float`
+		:param Ke: Evaporation rate.
+		:type Ke: :class:`float`
+		:param Kr: Rain rate.
+		:type Kr: :class:`float`
+		:param lx: X pipe length.
+		:type lx: :class:`float`
+		:param ly: Y pipe length.
+		:type ly: :class:`float`
+		:param water_src: Optional rain intensity map.
+		:type water_src: :class:`numpy.ndarray` or :class:`None`
+		:param seed: Seed of randomized rainfall, rain falls everywhere if not specified.
+		:type seed: :class:`int` or :class:`None`"""
+		self.run(self._rain, dt, Ke, Kr, water_src, seed)
+		self.run(self._surface)
+		self.run(self._outflow, pipe_dt, 1, lx, ly, mei.PIPE_DT)
+		self.run(self._update_water, dt, lx, ly)
+
+	def step_capacity(self, Kc: float, lx: float, ly: float, scale: float, depth_scale: float)->None:
+		"""Runs the velocity and capacity pass.
+
+		:param Kc: Capacity rate.
+		:type Kc: :class:`float`
+		:param lx: X pipe length.
+		:type lx: :class:`float`
+		:param ly: Y pipe length.
+		:type ly: :class:`float`
+		:param scale: Height scale of slopes.
+		:type scale: :class:`float`
+		:param depth_scale: Inverse of the water depth that stops erosion.
+		:type depth_scale: :class:`float`"""
+		self.run(self._surface)
+		self.run(self._capacity, Kc, lx, ly, scale, depth_scale)
+
+	def step_sediment(self, dt: float, Ks: float, Kd: float, hardness: np.ndarray | None = None)->None:
+		"""Runs erosion, deposition and sediment advection passes.
+
+		:param dt: Time step.
+		:type dt: :class:`float`
+		:param Ks: Erosion rate.
+		:type Ks: :class:`float`
+		:param Kd: Deposition rate.
+		:type Kd: :class:`float`
+		:param hardness: Optional erosion factor map.
+		:type hardness: :class:`numpy.ndarray` or :class:`None`"""
+		self.run(self._erode, Ks, Kd, hardness)
+		self.run(self._advect, dt)
+
+	def step_color(self, dt: float, scaling: float, factor_min: float = 0.05, factor_max: float = 0.9)->None:
+		"""Runs the color pass.
+
+		:param dt: Time step.
+		:type dt: :class:`float`
+		:param scaling: Mixing factor per squared speed.
+		:type scaling: :class:`float`
+		:param factor_min: Smallest mixing factor.
+		:type factor_min: :class:`float`
+		:param factor_max: Largest mixing factor.
+		:type factor_max: :class:`float`"""
+		self.run(self._move_color, dt, scaling, factor_min, factor_max)
+		self.color, self.color_out = self.color_out, self.color
+
+	def get_color(self)->np.ndarray:
+		"""Copies the moved colors.
+
+		:return: RGBA array.
+		:rtype: :class:`numpy.ndarray`"""
+		return np.ascontiguousarray(np.moveaxis(self.interior(self.color), 0, -1))
+
+	def flow_speed(self)->float:
+		"""Finds the maximum flow speed along either axis in water deeper than :data:`Hydra.core.mei.MIN_FLOW_DEPTH`, like the `mei_reduce` shader.
+
+		:return: Maximum speed.
+		:rtype: :class:`float`"""
+		speed = np.abs(self.interior(self.velocity)).max(axis=0)
+		return float(speed.max(initial=0, where=self.interior(self.water) > mei.MIN_FLOW_DEPTH))
+
+# --------------------------------------------------------- Erosion
+
+def erode(height: np.ndarray, settings: Settings, hardness: np.ndarray | None = None, water_src: np.ndarray | None = None, color: np.ndarray | None = None, state: common.SolverState | None = None)->Result:
+	"""Erodes a heightmap with the pipe model. Counterpart of :func:`Hydra.core.mei.erode`.
+
+	The `mei_variant` and `mei_sparse` settings only select GPU kernels and are ignored.
+
+	:param height: Heightmap to erode. Stays unchanged.
+	:type height: :class:`numpy.ndarray`
+	:param settings: Simulation settings.
+	:type settings: :class:`Hydra.core.settings.Settings`
+	:param hardness: Optional hardness map of the simulation size.
+	:type hardness: :class:`numpy.ndarray` or :class:`None`
+	:param water_src: Optional map of rain intensity of the simulation size.
+	:type water_src: :class:`numpy.ndarray` or :class:`None`
+	:param color: Optional RGBA color map of the simulation size. Its colors are moved along with the water.
+	:type color: :class:`numpy.ndarray` or :class:`None`
+	:param state: Optional state of a previous simulation to resume from. Ignored if its size differs.
+	:type state: :class:`Hydra.common.SolverState` or :class:`None`
+	:return: Eroded heightmap, outputs listed in `mei_outputs`, moved colors as the `color` output, and the water state if `mei_resume` is set.
+	:rtype: :class:`Hydra.core.result.Result`"""
+	print("Preparing for water erosion")
+
+	source = height
+	source_size = (source.shape[1], source.shape[0])
+	size = textures.subres_size(source_size, settings.erosion_subres)
+
+	if size != source_size:
+		height = cpu_textures.resize(source, size)
+		height_base = height.copy()
+	else:
+		height_base = None
+
+	if state is not None and state.size == size:
+		print("Resuming from previous state")
+	else:
+		state = None
+
+	model = PipeModel(height, state, color)
+
+	if hardness is not None:
+		hardness = hardness if settings.erosion_invert_hardness else 1 - hardness
+
+	pipe_len = 1
+	evaporation = 0.01
+	deposition = 0.25
+	erosion = 1 - (1 - (settings.mei_hardness / 100 - 1) ** 2) ** 0.15 # maps interval 0.5-1.0 to hardness 0.9-1.0
+	rain = (1 - (1 - (0.25 * settings.mei_rain / 100) ** 2) ** 0.5) * 0.1
+	capacity = (settings.mei_capacity / 100) * 0.25 * 0.002
+	depth_scale = 1 / (settings.mei_max_depth * 0.002)
+	color_scaling = 1 / (100 - 99 * (settings.color_mixing / 100))
+
+	def step(i: int, dt: float):
+		ratio = dt / mei.BASE_DT
+		model.step_water(dt, mei.PIPE_DT * ratio, evaporation, rain, pipe_len, pipe_len, water_src, i if settings.mei_randomize else None)
+		model.step_capacity(capacity, pipe_len, pipe_len, size[0] / 2, depth_scale)
+		model.step_sediment(dt, mei.scale_rate(erosion, ratio), mei.scale_rate(deposition, ratio), hardness)
+		if color is not None:
+			model.step_color(dt, color_scaling)
+
+	current = model.interior(model.height)
+	monitor = reduction.ChangeMonitor(current, settings.stop_tolerance, settings.stop_interval, settings.stop_metric) if settings.stop_early else None
+
+	time = datetime.now()
+	if settings.mei_time_step == "adaptive":
+		elapsed = 0
+		steps = 0
+		dt = mei.cfl_time_step(model.flow_speed(), pipe_len)	# resumed states may already flow
+		while elapsed < settings.mei_duration:
+			if steps > 0 and steps % mei.REDUCE_INTERVAL == 0:
+				dt = mei.cfl_time_step(model.flow_speed(), pipe_len)
+			step_dt = min(dt, settings.mei_duration - elapsed) # last step ends exactly at the duration
+			step(steps, step_dt)
+			elapsed += step_dt
+			steps += 1
+			if monitor is not None and monitor.check(current, steps):
+				break
+
+		print(f"Simulated {elapsed:.3g} of {settings.mei_duration} in {steps} steps")
+	else:
+		steps = settings.mei_iter_num * 10
+		for i in range(settings.mei_iter_num * 10):
+			step(i, mei.BASE_DT)
+			if monitor is not None and monitor.check(current, i + 1):
+				steps = i + 1
+				break
+
+	if monitor is not None:
+		monitor.report(steps)
+		monitor.release()
+
+	print((datetime.now() - time).total_seconds())
+
+	fields = model.state()
+	outputs = {name: fields[name].copy() for name in settings.mei_outputs}
+	if color is not None:
+		outputs["color"] = model.get_color()
+
+	state = common.SolverState("mei", fields) if settings.mei_resume else None
+
+	height = current.copy()
+	if height_base is not None: # resize back to original size
+		height -= height_base
+		height = cpu_textures.resize(height, source_size)
+		height += source
+
+	print("Erosion finished")
+	return Result(height, outputs, state, steps if monitor is not None else None)
+
+def transport_color(height: np.ndarray, color: np.ndarray, settings: Settings)->Result:
+	"""Moves colors with water flowing over a heightmap. Counterpart of :func:`Hydra.core.mei.transport_color`.
+
+	:param height: Heightmap to flow over. Stays unchanged.
+	:type height: :class:`numpy.ndarray`
+	:param color: RGBA color map of the heightmap size. Stays unchanged.
+	:type color: :class:`numpy.ndarray`
+	:param settings: Simulation settings.
+	:type settings: :class:`Hydra.core.settings.Settings`
+	:return: Moved colors as the `color` output.
+	:rtype: :class:`Hydra.core.result.Result`"""
+	print("Preparing for color transport")
+	model = PipeModel(height, color=color)
+
+	dt = 0.25 + 0.25 * (settings.color_detail / 100)
+	pipe_len = 1 + 2 * settings.color_speed / 100
+	evaporation = settings.color_evaporation / 100
+	rain = (1 - (1 - (settings.color_rain / 500) ** 2) ** 0.15) * 0.1
+	color_scaling = 1 / (100 - 99 * (settings.color_mixing / 100))
+
+	time = datetime.now()
+	for _ in range(settings.color_iter_num):
+		model.step_water(dt, mei.PIPE_DT, evaporation, rain, pipe_len, pipe_len)
+		model.step_capacity(0, pipe_len, pipe_len, height.shape[1] / 2, 1)
+		model.step_color(dt, color_scaling)
+
+	print((datetime.now() - time).total_seconds())
+
+	print("Simulation finished")
+	return Result(None, {"color": model.get_color()})
@@ -0,0 +1,428 @@
+"""Module responsible for particle-based water erosion on the CPU. Counterpart of :mod:`Hydra.core.particle`.
+
+Particles run in a pool of worker processes on maps in shared memory. The map is split into tiles,
+which are simulated in four phases by the parity of their coordinates. Tiles of the same phase are
+further apart than a particle can travel, so concurrent workers never touch the same cells."""
+
+import numpy as np
+import math
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+from datetime import datetime
+from Hydra.core import textures
+from Hydra.core.cpu import bands
+from Hydra.core.cpu import textures as cpu_textures
+from Hydra.core.particle import PARTICLE_MULTIPLIER, particle_grid
+from Hydra.core.settings import Settings
+from Hydra.core.result import Result
+
+FIXED_GRID = (32, 32)
+"""Particle grid of the *fixed* dispatch mode, one cell per shader invocation."""
+
+REACH_MARGIN = 3
+"""Cells around a particle's path that it reads or writes, covering bilinear samples one step ahead."""
+
+_pool: ProcessPoolExecutor | None = None
+_pool_size = 0
+
+_attached: dict[str, tuple[shared_memory.SharedMemory, np.ndarray]] = {}
+"""Shared maps opened by a worker process, by block name."""
+
+# --------------------------------------------------------- Shared maps
+
+def _share(array: np.ndarray)->shared_memory.SharedMemory:
+	"""Copies a bordered map into a new shared memory block.
+
+	:param array: Map with a border.
+	:type array: :class:`numpy.ndarray`
+	:return: Shared block, which has to be closed and unlinked.
+	:rtype: :class:`multiprocessing.shared_memory.SharedMemory`"""
+	shm = shared_memory.SharedMemory(create=True, size=array.nbytes)
+	np.copyto(np.ndarray(array.shape, dtype=np.float32, buffer=shm.buf), array)
+	return shm
+
+def _attach(name: str | None, shape: tuple)->np.ndarray | None:
+	"""Opens a shared map in a worker process. Blocks of previous simulations are closed.
+
+	:param name: Block name or `None`.
+	:type name: :class:`str` or :class:`None`
+	:param shape: Bordered map shape.
+	:type shape: :class:`tuple`
+	:return: Map stored in the block.
+	:rtype: :class:`numpy.ndarray` or :class:`None`"""
+	if name is None:
+		return None
+
+	if name not in _attached:
+		shm = shared_memory.SharedMemory(name)
+		_attached[name] = (shm, np.ndarray(shape, dtype=np.float32, buffer=shm.buf))
+	return _attached[name][1]
+
+def _detach(keep: tuple)->None:
+	"""Closes shared maps not listed in `keep`."""
+	for name in [n for n in _attached if n not in keep]:
+		_attached.pop(name)[0].close()
+
+def _get_pool(count: int)->ProcessPoolExecutor:
+	"""Gets a process pool with at least `count` workers. Workers are spawned, as forking a process
+	with threads and an OpenGL context isn't safe."""
+	global _pool, _pool_size
+	if _pool is None or _pool_size < count:
+		if _pool is not None:
+			_pool.shutdown()
+		_pool = ProcessPoolExecutor(count, mp_context=multiprocessing.get_context("spawn"))
+		_pool_size = count
+	return _pool
+
+# --------------------------------------------------------- Particles
+
+def _hash(x: np.ndarray, y: np.ndarray, seed: int)->tuple[np.ndarray, np.ndarray]:
+	"""Hashes particle grid cells, counterpart of the `pcg3d` hash in `particle.glsl`.
+
+	:return: First two hash components.
+	:rtype: :class:`tuple[numpy.ndarray, numpy.ndarray]`"""
+	v = np.stack((x, y, np.full_like(x, seed))).astype(np.uint32)
+	v *= np.uint32(1664525)
+	v += np.uint32(1013904223)
+	a, b, c = v
+	a += b * c; b += c * a; c += a * b
+	v ^= v >> np.uint32(16)
+	a += b * c; b += c * a
+	return a, b
+
+def _spawn(tile: tuple[int,int,int,int], spawn: dict)->np.ndarray:
+	"""Places the particles of an iteration that start inside a tile, like `particle.glsl` does.
+
+	:param tile: Tile as `(x0, y0, x1, y1)`.
+	:type tile: :class:`tuple[int,int,int,int]`
+	:param spawn: Particle grid, grid cell size and seeds.
+	:type spawn: :class:`dict`
+	:return: Positions of shape `(2, count)`.
+	:rtype: :class:`numpy.ndarray`"""
+	grid, cell = spawn["grid"], spawn["cell"]
+	# particles start up to two cells after their grid cell
+	gx = np.arange(max(math.floor(tile[0] / cell[0]) - 2, 0), min(math.ceil(tile[2] / cell[0]), grid[0]))
+	gy = np.arange(max(math.floor(tile[1] / cell[1]) - 2, 0), min(math.ceil(tile[3] / cell[1]), grid[1]))
+	gx, gy = (v.reshape(-1) for v in np.meshgrid(gx, gy))
+
+	ret = []
+	for seed in spawn["seeds"]:
+		hx, hy = _hash(gx, gy, seed)
+		x = ((hx & np.uint32(16383)) / np.float32(8192) + gx) * np.float32(cell[0])
+		y = ((hy & np.uint32(16383)) / np.float32(8192) + gy) * np.float32(cell[1])
+		inside = (x >= tile[0]) & (x < tile[2]) & (y >= tile[1]) & (y < tile[3])
+		ret.append(np.stack((x[inside], y[inside])).astype(np.float32))
+	return np.concatenate(ret, axis=1)
+
+def _flat(height: np.ndarray, x: np.ndarray, y: np.ndarray)->tuple[np.ndarray, np.ndarray]:
+	"""Converts cell coordinates into indices of a flattened bordered map.
+
+	:return: Indices and a mask of cells inside the map. Cells outside point to the zero corner of the border, like out of bounds image loads.
+	:rtype: :class:`tuple[numpy.ndarray, numpy.ndarray]`"""
+	rows, cols = height.shape[-2] - 2, height.shape[-1] - 2
+	inside = (x >= 0) & (x < cols) & (y >= 0) & (y < rows)
+	return np.where(inside, (y + 1) * (cols + 2) + (x + 1), 0), inside
+
+def simulate(height: np.ndarray, hardness: np.ndarray | None, color: np.ndarray | None, pos: np.ndarray, params: dict)->None:
+	"""Moves a batch of particles over a bordered heightmap in lockstep, counterpart of `particle.glsl`.
+
+	Height changes are applied after every step, so particles see each other's erosion one step late.
+	Particles whose velocity vanishes stop, as their direction is undefined.
+
+	:param height: Heightmap with a border of one cell, modified in place.
+	:type height: :class:`numpy.ndarray`
+	:param hardness: Optional hardness map with a border of one cell, of any size.
+	:type hardness: :class:`numpy.ndarray` or :class:`None`
+	:param color: Optional RGBA map of shape `(4, height, width)` with a border, modified in place.
+	:type color: :class:`numpy.ndarray` or :class:`None`
+	:param pos: Starting positions of shape `(2, count)`.
+	:type pos: :class:`numpy.ndarray`
+	:param params: Shader uniforms by name.
+	:type params: :class:`dict`"""
+	count = pos.shape[1]
+	if count == 0:
+		return
+
+	size = (height.shape[1] - 2, height.shape[0] - 2)
+	sampler = cpu_textures.Sampler((count,), size)
+	flat = height.reshape(-1)
+
+	def sample(x: np.ndarray, y: np.ndarray)->np.ndarray:
+		sampler.locate(x - 0.5, y - 0.5)	# texel centers
+		return sampler.sample(height, np.empty(count, dtype=np.float32))
+
+	x, y = pos[0].copy(), pos[1].copy()
+	acceleration = np.float32(params["acceleration"])
+	lateral = np.float32(params["lateral_acceleration"])
+
+	if hardness is not None:
+		hardness_size = (hardness.shape[1] - 2, hardness.shape[0] - 2)
+		hardness_sampler = cpu_textures.Sampler((count,), hardness_size)
+		hardness_scale = (hardness_size[0] / size[0], hardness_size[1] / size[1])
+		hardness_value = np.empty(count, dtype=np.float32)
+
+	h = sample(x, y)
+	vx = acceleration * (h - sample(x + 1, y))
+	vy = acceleration * (h - sample(x, y + 1))
+
+	with np.errstate(invalid="ignore", divide="ignore"):
+		length = np.hypot(vx, vy)
+		alive = length > 0
+		dx, dy = vx / length, vy / length
+		dx[~alive] = 0
+		dy[~alive] = 0
+
+		saturation = np.zeros(count, dtype=np.float32)
+		if color is not None:
+			index, inside = _flat(height, np.floor(x).astype(np.intp), np.floor(y).astype(np.intp))
+			color_flat = color.reshape(4, -1)
+			col = color_flat[:, index]
+
+		for i in range(params["lifetime"]):
+			sign = 1 if i % 2 == 0 else -1	# swapping lateral checks prevents biased rotation
+			px, py = -dy * sign, dx * sign
+
+			h = sample(x, y)
+			h_vel = sample(x + dx, y + dy)
+			h_dir = sample(x + px, y + py)
+
+			vx += acceleration * ((h - h_vel) * dx + lateral * (h - h_dir) * px)
+			vy += acceleration * ((h - h_vel) * dy + lateral * (h - h_dir) * py)
+
+			length = np.hypot(vx, vy)
+			alive &= length > 0
+			np.divide(vx, length, out=dx, where=alive)
+			np.divide(vy, length, out=dy, where=alive)
+			dx[~alive] = 0
+			dy[~alive] = 0
+			np.minimum(length, params["max_velocity"], out=length)
+			vx = dx * length
+			vy = dy * length
+
+			capacity = np.float32(params["capacity_factor"]) * length * (h > h_vel)
+			dif = capacity - saturation
+
+			erosion = np.full(count, params["erosion_strength"], dtype=np.float32)
+			if hardness is not None:
+				hardness_sampler.locate(x * hardness_scale[0] - 0.5, y * hardness_scale[1] - 0.5)
+				hardness_sampler.sample(hardness, hardness_value)
+				if not params["invert_hardness"]:
+					np.subtract(1, hardness_value, out=hardness_value)
+				erosion *= np.clip(hardness_value, 0, 1)
+
+			dif *= np.where(dif >= 0, erosion, np.float32(params["deposition_strength"]))
+			np.clip(dif, -params["max_change"], params["max_change"], out=dif)
+			dif[~alive] = 0
+			saturation += dif
+
+			cx, cy = np.floor(x).astype(np.intp), np.floor(y).astype(np.intp)
+			index, inside = _flat(height, cx, cy)
+			inside &= alive
+			np.subtract.at(flat, index[inside], dif[inside])
+
+			if color is not None:
+				# eroded material picks up the surface color, deposited material paints it
+				col += (color_flat[:, index] - col) * ((1 - params["color_strength"]) * (dif > 0))
+				_colorize(color_flat, height, x, y, col, np.where(dif < 0, np.float32(params["color_strength"]), 0))
+
+			x += dx
+			y += dy
+
+			vx *= np.float32(params["drag"])
+			vy *= np.float32(params["drag"])
+
+def _colorize(color: np.ndarray, height: np.ndarray, x: np.ndarray, y: np.ndarray, col: np.ndarray, strength: np.ndarray)->None:
+	"""Mixes particle colors into the four cells around them, counterpart of `colorize` in `particle.glsl`.
+	Particles painting the same cell in one step mix in their colors averaged by weight."""
+	x = x - 0.5
+	y = y - 0.5
+	fx, fy = x - np.floor(x), y - np.floor(y)
+	cx, cy = np.floor(x).astype(np.intp), np.floor(y).astype(np.intp)
+
+	indices, weights, colors = [], [], []
+	for ox, oy, f in ((0, 0, (1 - fx) * (1 - fy)), (1, 0, fx * (1 - fy)), (0, 1, (1 - fx) * fy), (1, 1, fx * fy)):
+		index, inside = _flat(height, cx + ox, cy + oy)
+		f = f * strength
+		inside &= f > 0
+		indices.append(index[inside])
+		weights.append(f[inside])
+		colors.append(col[:, inside])
+
+	index = np.concatenate(indices)
+	if len(index) == 0:
+		return
+
+	cells, inverse = np.unique(index, return_inverse=True)
+	weight = np.concatenate(weights)
+	total = np.bincount(inverse, weight)
+	amount = np.minimum(total, 1)
+	for channel, values in enumerate(np.concatenate(colors, axis=1)):
+		mean = np.bincount(inverse, weight * values) / total
+		color[channel, cells] += (mean - color[channel, cells]) * amount
+
+def _run_tiles(job: dict)->None:
+	"""Simulates the particles of an iteration in a group of tiles of the same phase. Runs in worker processes.
+
+	:param job: Shared map names and shapes, tiles, spawn parameters and uniforms.
+	:type job: :class:`dict`"""
+	maps = job["maps"]
+	if "height" in maps:
+		names = tuple(name for name, _ in maps.values() if name is not None)
+		_detach(names)
+		height, hardness, color = (_attach(*maps[key]) for key in ("height", "hardness", "color"))
+	else:
+		height, hardness, color = job["arrays"]
+
+	pos = np.concatenate([_spawn(tile, job["spawn"]) for tile in job["tiles"]], axis=1)
+	simulate(height, hardness, color, pos, job["params"])
+
+# --------------------------------------------------------- Scheduling
+
+def tile_phases(size: tuple[int,int], lifetime: int)->list[list[tuple[int,int,int,int]]]:
+	"""Splits a map into tiles at least twice as large as the distance a particle can reach, grouped into four phases.
+
+	:param size: Map size.
+	:type size: :class:`tuple[int,int]`
+	:param lifetime: Particle steps.
+	:type lifetime: :class:`int`
+	:return: Tiles as `(x0, y0, x1, y1)` for each phase.
+	:rtype: :class:`list[list[tuple[int,int,int,int]]]`"""
+	side = 2 * (lifetime + REACH_MARGIN)
+	phases = [[] for _ in range(4)]
+	for ty in range(math.ceil(size[1] / side)):
+		for tx in range(math.ceil(size[0] / side)):
+			tile = (tx * side, ty * side, min((tx + 1) * side, size[0]), min((ty + 1) * side, size[1]))
+			phases[(ty % 2) * 2 + tx % 2].append(tile)
+	return [phase for phase in phases if len(phase) != 0]
+
+def run(height: np.ndarray, hardness: np.ndarray | None, color: np.ndarray | None, spawns: list[dict], params: dict)->None:
+	"""Simulates iterations of particles in phases of disjoint tiles, split among :data:`Hydra.core.cpu.bands.workers` processes.
+
+	Each tile is simulated as one batch per iteration. Results don't depend on the number of workers.
+
+	:param height: Heightmap with a border of one cell, modified in place.
+	:type height: :class:`numpy.ndarray`
+	:param hardness: Optional hardness map with a border of one cell.
+	:type hardness: :class:`numpy.ndarray` or :class:`None`
+	:param color: Optional RGBA map of shape `(4, height, width)` with a border, modified in place.
+	:type color: :class:`numpy.ndarray` or :class:`None`
+	:param spawns: Spawn parameters for each iteration, see :func:`_spawn`.
+	:type spawns: :class:`list[dict]`
+	:param params: Shader uniforms by name.
+	:type params: :class:`dict`"""
+	size = (height.shape[1] - 2, height.shape[0] - 2)
+	phases = tile_phases(size, params["lifetime"])
+	workers = min(bands.workers, max(len(p) for p in phases))
+
+	if workers == 1:
+		for spawn in spawns:
+			for phase in phases:
+				_run_tiles({"maps": {}, "arrays": (height, hardness, color), "tiles": phase, "spawn": spawn, "params": params})
+		return
+
+	blocks = {}
+	maps = {}
+	for key, array in (("height", height), ("hardness", hardness), ("color", color)):
+		if array is not None:
+			blocks[key] = _share(array)
+		maps[key] = (blocks[key].name, array.shape) if array is not None else (None, None)
+
+	try:
+		pool = _get_pool(workers)
+		for spawn in spawns:
+			for phase in phases:
+				jobs = [{"maps": maps, "tiles": phase[i::workers], "spawn": spawn, "params": params} for i in range(workers)]
+				for future in [pool.submit(_run_tiles, job) for job in jobs if len(job["tiles"]) != 0]:
+					future.result()
+
+		for key in ("height", "color"):	# hardness is only read
+			if key in blocks:
+				array = height if key == "height" else color
+				np.copyto(array, np.ndarray(array.shape, dtype=np.float32, buffer=blocks[key].buf))
+	finally:
+		for shm in blocks.values():
+			shm.close()
+			shm.unlink()
+
+# --------------------------------------------------------- Erosion
+
+def erode(height: np.ndarray, settings: Settings, hardness: np.ndarray | None = None, color: np.ndarray | None = None)->Result:
+	"""Erodes a heightmap with particles. Counterpart of :func:`Hydra.core.particle.erode`.
+
+	Spawning follows the *fixed* and *scaled* dispatch modes, the *pool* mode spawns like *scaled*.
+	Height changes are always accumulated in order, so `part_atomic` is ignored.
+
+	:param height: Heightmap to erode. Stays unchanged.
+	:type height: :class:`numpy.ndarray`
+	:param settings: Simulation settings.
+	:type settings: :class:`Hydra.core.settings.Settings`
+	:param hardness: Optional hardness map of any size.
+	:type hardness: :class:`numpy.ndarray` or :class:`None`
+	:param color: Optional RGBA color map of the simulation size, see :func:`Hydra.core.textures.subres_size`. Its colors are moved along with the eroded material.
+	:type color: :class:`numpy.ndarray` or :class:`None`
+	:return: Eroded heightmap, and the moved colors as the `color` output.
+	:rtype: :class:`Hydra.core.result.Result`"""
+	print("Preparing for water erosion")
+
+	source = height
+	source_size = (source.shape[1], source.shape[0])
+	size = textures.subres_size(source_size, settings.erosion_subres)
+
+	if size != source_size:
+		height = cpu_textures.resize(source, size)
+		height_base = height.copy()
+	else:
+		height_base = None
+
+	padded = np.zeros((size[1] + 2, size[0] + 2), dtype=np.float32)
+	bands.view(padded, 1, 0, size[1])[...] = height
+
+	if hardness is not None:
+		hardness_padded = np.zeros((hardness.shape[0] + 2, hardness.shape[1] + 2), dtype=np.float32)
+		bands.view(hardness_padded, 1, 0, hardness.shape[0])[...] = hardness
+	else:
+		hardness_padded = None
+
+	if color is not None:
+		color_padded = np.zeros((4, size[1] + 2, size[0] + 2), dtype=np.float32)
+		bands.view(color_padded, 1, 0, size[1])[...] = np.moveaxis(color, -1, 0)
+	else:
+		color_padded = None
+
+	params = {
+		"erosion_strength": settings.part_fineness / 100,
+		"deposition_strength": settings.part_deposition / 100,
+		"capacity_factor": settings.part_capacity / 100,
+		"max_velocity": 2,
+		"acceleration": settings.part_acceleration / 100,
+		"lateral_acceleration": settings.part_lateral_acceleration / 100,
+		"lifetime": settings.part_lifetime,
+		"max_change": settings.part_max_change / (100 * 100), # from percent to 0-0.01
+		"drag": 1 - (settings.part_drag / 100),
+		"invert_hardness": settings.erosion_invert_hardness,
+		"color_strength": settings.color_mixing / 100,
+	}
+
+	if settings.part_dispatch == "fixed":
+		cell = (math.ceil(size[0] / FIXED_GRID[0]), math.ceil(size[1] / FIXED_GRID[1]))
+		spawns = [{"grid": FIXED_GRID, "cell": cell, "seeds": range(i * PARTICLE_MULTIPLIER + 1, (i + 1) * PARTICLE_MULTIPLIER + 1)} for i in range(settings.part_iter_num)]
+	else:
+		grid = particle_grid(size, settings.part_density)
+		cell = (size[0] / grid[0], size[1] / grid[1])
+		spawns = [{"grid": grid, "cell": cell, "seeds": (i + 1,)} for i in range(settings.part_iter_num)]
+
+	time = datetime.now()
+	run(padded, hardness_padded, color_padded, spawns, params)
+	print((datetime.now() - time).total_seconds())
+
+	height = bands.view(padded, 1, 0, size[1]).copy()
+	if height_base is not None: # resize back to original size
+		height -= height_base
+		height = cpu_textures.resize(height, source_size)
+		height += source
+
+	print("Erosion finished")
+	if color is not None:
+		return Result(height, {"color": np.ascontiguousarray(np.moveaxis(bands.view(color_padded, 1, 0, size[1]), 0, -1))})
+	return Result(height)
@@ -0,0 +1,58 @@
+"""Module responsible for convergence checks of CPU simulations."""
+
+import numpy as np
+import math
+from Hydra.utils import reduction
+
+class ChangeMonitor(reduction.ChangeMonitor):
+	"""NumPy counterpart of :class:`Hydra.utils.reduction.ChangeMonitor`."""
+
+	def __init__(self, source: np.ndarray, tolerance: float, interval: int, metric: str="max"):
+		"""Constructor method.
+
+		:param source: Map to monitor. Its current content is used as the first reference.
+		:type source: :class:`numpy.ndarray`
+		:param tolerance: Change per iteration, below which the map is considered converged.
+		:type tolerance: :class:`float`
+		:param interval: Number of iterations between checks.
+		:type interval: :class:`int`
+		:param metric: Either `max` or `mean`.
+		:type metric: :class:`str`"""
+		self.size = (source.shape[1], source.shape[0])
+		self.tolerance = tolerance
+		self.interval = max(interval, 1)
+		self.metric = metric
+		self.change = math.inf
+
+		self.prior = source.copy()
+		"""Copy of the map from the previous check."""
+		self.difference = np.empty_like(source)
+		"""Preallocated change buffer."""
+
+	def check(self, source: np.ndarray, iteration: int)->bool:
+		"""Measures the change of the map if a check is due after `iteration` iterations.
+
+		:param source: Current map.
+		:type source: :class:`numpy.ndarray`
+		:param iteration: Number of finished iterations.
+		:type iteration: :class:`int`
+		:return: `True` if the map changes less than the tolerance.
+		:rtype: :class:`bool`"""
+		if iteration % self.interval != 0:
+			return False
+
+		np.subtract(source, self.prior, out=self.difference)
+		np.abs(self.difference, out=self.difference)
+		np.copyto(self.prior, source)
+
+		if self.metric == "max":
+			change = float(self.difference.max())
+		else:
+			change = float(self.difference.sum(dtype=np.float64)) / self.difference.size
+
+		self.change = change / self.interval
+		return self.change < self.tolerance
+
+	def release(self)->None:
+		"""Drops the reference copy."""
+		self.prior = self.difference = None
@@ -0,0 +1,90 @@
+"""Module responsible for snow simulation on the CPU. Counterpart of :mod:`Hydra.core.snow`."""
+
+import numpy as np
+import math
+from datetime import datetime
+from Hydra import common
+from Hydra.core.cpu import reduction
+from Hydra.core.cpu.thermal import Stencil, run_inplace, as_array
+from Hydra.core.snow import SNOW_SCALE, warm_params
+from Hydra.core.settings import Settings
+from Hydra.core.result import Result
+
+def simulate(offset: np.ndarray, settings: Settings, warm: common.SolverState | None = None)->Result:
+	"""Simulates snow sliding on a heightmap. Counterpart of :func:`Hydra.core.snow.simulate`.
+
+	:param offset: Heightmap to place snow on. Stays unchanged.
+	:type offset: :class:`numpy.ndarray`
+	:param settings: Simulation settings.
+	:type settings: :class:`Hydra.core.settings.Settings`
+	:param warm: Optional state of a previous simulation on the same heightmap to start from.
+	:type warm: :class:`Hydra.common.SolverState` or :class:`None`
+	:return: Heightmap with snow unless `snow_output` is `texture`, snow amount normalized to 0-1 as the `snow` output unless `snow_output` is `displacement`,
+		and a state to start from next time if `warm_start` is set and the snow converged.
+	:rtype: :class:`Hydra.core.result.Result`"""
+	print("Preparing for snow simulation")
+
+	if warm is not None: # rescale cached snow to the new amount
+		print("Starting from cached state")
+		snow = as_array(warm.textures["snow"]) * np.float32(settings.snow_add / warm.params["snow_add"])
+	else:
+		snow = np.full(offset.shape, (settings.snow_add / 100) * SNOW_SCALE, dtype=np.float32)
+
+	alpha = math.tan(settings.snow_angle) * 2 / offset.shape[1] # images are scaled to 2 z/x -> angle depends only on image width
+	by = settings.scale_ratio
+
+	inplace = settings.thermal_kernel == "inplace"
+	if inplace:
+		stencil = None
+		current = snow
+	else:
+		stencil = Stencil(snow, offset)
+		current = stencil.height
+
+	# warm starts are close to convergence -> always check, cached states have to be converged
+	monitor = reduction.ChangeMonitor(current, settings.stop_tolerance, settings.stop_interval, settings.stop_metric) if settings.stop_early or settings.warm_start or warm is not None else None
+	iterations = settings.snow_iter_num
+
+	time = datetime.now()
+	for i in range(settings.snow_iter_num):
+		diagonal = (i&1) == 1
+
+		if inplace:
+			run_inplace(current, offset, alpha, 0.5, 1.0, by, diagonal, 1, i // 2) # alternate halves between pairs of cardinal and diagonal iterations
+		else:
+			stencil.step(alpha, 0.5, 1.0, by, diagonal, 1)
+			current = stencil.height
+
+		if monitor is not None and monitor.check(current, i + 1):
+			iterations = i + 1
+			break
+
+	print((datetime.now() - time).total_seconds())
+
+	snow = current.copy()
+
+	converged = monitor is not None and monitor.converged
+	if monitor is not None:
+		monitor.report(iterations)
+		monitor.release()
+
+	if settings.warm_start and converged:
+		params = {"angle": settings.snow_angle, "snow_add": settings.snow_add, **warm_params(settings)}
+		state = common.SolverState("snow", {"snow": snow.copy()}, params)
+	else:
+		state = None
+
+	outputs = {}
+
+	if settings.snow_output != "displacement":
+		outputs["snow"] = snow * np.float32(1 / (SNOW_SCALE * settings.snow_add / 100))
+
+	if settings.snow_output != "texture":
+		snow += offset
+		height = snow
+	else:
+		height = None
+
+	print("Simulation finished")
+
+	return Result(height, outputs, state, iterations if monitor is not None else None)
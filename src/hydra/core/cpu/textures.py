@@ -0,0 +1,98 @@
+"""Module responsible for NumPy counterparts of texture operations."""
+
+import numpy as np
+
+def resize(array: np.ndarray, size: tuple[int,int])->np.ndarray:
+	"""Resizes a map with bilinear filtering, sampling at texel centers like a linear texture sampler with clamped edges.
+
+	:param array: Map of shape `(height, width)` or `(height, width, channels)`.
+	:type array: :class:`numpy.ndarray`
+	:param size: Target size.
+	:type size: :class:`tuple[int,int]`
+	:return: Resized float32 map.
+	:rtype: :class:`numpy.ndarray`"""
+	def weights(target: int, source: int)->tuple[np.ndarray, np.ndarray, np.ndarray]:
+		coords = np.clip((np.arange(target) + 0.5) * (source / target) - 0.5, 0, source - 1)
+		low = np.floor(coords).astype(np.intp)
+		high = np.minimum(low + 1, source - 1)
+		return low, high, (coords - low).astype(np.float32)
+
+	y0, y1, fy = weights(size[1], array.shape[0])
+	x0, x1, fx = weights(size[0], array.shape[1])
+	if array.ndim == 3:
+		fy = fy[:, None]
+		fx = fx[:, None]
+
+	rows = array[y0] * (1 - fy[:, None]) + array[y1] * fy[:, None]
+	return np.ascontiguousarray(rows[:, x0] * (1 - fx) + rows[:, x1] * fx, dtype=np.float32)
+
+class Sampler:
+	"""Bilinear sampling of maps at arbitrary positions, counterpart of a linear texture sampler.
+
+	Positions are located once with :meth:`locate` and then sampled from any number of maps of the same size.
+	Maps are stored with a border of one cell, which is never sampled. All buffers are allocated once."""
+
+	def __init__(self, shape: tuple[int,int], size: tuple[int,int], repeat: bool = False):
+		"""Constructor method.
+
+		:param shape: Shape of the sampled position arrays.
+		:type shape: :class:`tuple[int,int]`
+		:param size: Size of the sampled maps without the border.
+		:type size: :class:`tuple[int,int]`
+		:param repeat: Wraps positions around the map instead of clamping them to its edges.
+		:type repeat: :class:`bool`"""
+		self.size = size
+		self.repeat = repeat
+		self.fx, self.fy, self.low, self.high = (np.empty(shape, dtype=np.float32) for _ in range(4))
+		self.x0, self.x1, self.y0, self.y1, self.index = (np.empty(shape, dtype=np.intp) for _ in range(5))
+
+	def _axis(self, coords: np.ndarray, frac: np.ndarray, i0: np.ndarray, i1: np.ndarray, count: int)->None:
+		"""Splits coordinates into the two nearest texel indices and the weight of the second one."""
+		np.floor(coords, out=frac)
+		i0[...] = frac
+		np.subtract(coords, frac, out=frac)
+		np.add(i0, 1, out=i1)
+		if self.repeat:
+			np.mod(i0, count, out=i0)
+			np.mod(i1, count, out=i1)
+		else:
+			np.clip(i0, 0, count - 1, out=i0)
+			np.clip(i1, 0, count - 1, out=i1)
+		i0 += 1	# border
+		i1 += 1
+
+	def locate(self, x: np.ndarray, y: np.ndarray)->None:
+		"""Prepares sampling at the given positions, where integer positions are texel centers.
+
+		:param x: X positions.
+		:type x: :class:`numpy.ndarray`
+		:param y: Y positions.
+		:type y: :class:`numpy.ndarray`"""
+		self._axis(x, self.fx, self.x0, self.x1, self.size[0])
+		self._axis(y, self.fy, self.y0, self.y1, self.size[1])
+		self.y0 *= self.size[0] + 2	# row offsets into the flattened map
+		self.y1 *= self.size[0] + 2
+
+	def sample(self, plane: np.ndarray, out: np.ndarray)->np.ndarray:
+		"""Samples a single channel map at the located positions.
+
+		:param plane: Contiguous map of the located size with a border of one cell.
+		:type plane: :class:`numpy.ndarray`
+		:param out: Output array of the position shape.
+		:type out: :class:`numpy.ndarray`
+		:return: `out`.
+		:rtype: :class:`numpy.ndarray`"""
+		flat = plane.reshape(-1)
+		for y, row in ((self.y0, self.low), (self.y1, self.high)):
+			np.add(y, self.x0, out=self.index)
+			np.take(flat, self.index, out=row)
+			np.add(y, self.x1, out=self.index)
+			np.take(flat, self.index, out=out)
+			out -= row
+			out *= self.fx
+			row += out	# row = a + fx * (b - a)
+
+		np.subtract(self.high, self.low, out=out)
+		out *= self.fy
+		out += self.low
+		return out
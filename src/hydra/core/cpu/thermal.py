@@ -0,0 +1,397 @@
+"""Module responsible for thermal erosion on the CPU. Counterpart of :mod:`Hydra.core.thermal`."""
+
+import numpy as np
+import math
+from datetime import datetime
+from Hydra import common
+from Hydra.core import textures, thermal
+from Hydra.core.cpu import bands, reduction
+from Hydra.core.cpu import textures as cpu_textures
+from Hydra.core.settings import Settings
+from Hydra.core.result import Result
+
+# --------------------------------------------------------- Requests kernel
+
+class Stencil:
+	"""Two-pass thermal kernel, counterpart of `thermalA.glsl` and `thermalB.glsl`.
+
+	The first pass computes material requests between each cell and its four neighbors, the second one
+	settles them. Maps are stored with a zero border of the largest stride, so neighbors are read
+	through shifted views, and all buffers are allocated once. Both passes run in row bands."""
+
+	def __init__(self, height: np.ndarray, offset: np.ndarray | None = None, pad: int = 1):
+		"""Constructor method.
+
+		:param height: Initial heightmap, which is copied.
+		:type height: :class:`numpy.ndarray`
+		:param offset: Optional static map added to the height when comparing neighbors, e.g. terrain under snow.
+		:type offset: :class:`numpy.ndarray` or :class:`None`
+		:param pad: Largest stride used.
+		:type pad: :class:`int`"""
+		rows, cols = height.shape
+		self.pad = pad
+		self.offset = offset
+
+		padded = (rows + 2 * pad, cols + 2 * pad)
+		self.buffers = [np.zeros(padded, dtype=np.float32), np.zeros(padded, dtype=np.float32)]
+		"""Ping-pong heightmaps."""
+		self.current = 0
+		"""Index of the buffer holding the current heightmap."""
+		self.total = np.zeros(padded, dtype=np.float32) if offset is not None else None
+		"""Height including the offset."""
+		self.requests = np.zeros((4, *padded), dtype=np.float32)
+		"""Requested material changes towards the left, bottom, right and top neighbors."""
+
+		self.bands = bands.split(rows)
+		self.scratch = [np.empty((5, end - start, cols), dtype=np.float32) for start, end in self.bands]
+		self.masks = [np.empty((end - start, cols), dtype=bool) for start, end in self.bands]
+
+		np.copyto(self.height, height)
+
+	def _view(self, array: np.ndarray, start: int, end: int, dx: int = 0, dy: int = 0)->np.ndarray:
+		"""Returns a band of a padded map, shifted by the given offset. See :func:`Hydra.core.cpu.bands.view`."""
+		return bands.view(array, self.pad, start, end, dx, dy)
+
+	@property
+	def height(self)->np.ndarray:
+		"""Current heightmap without the border."""
+		return self._view(self.buffers[self.current], 0, self.buffers[0].shape[0] - 2 * self.pad)
+
+	def step(self, alpha: float, Ks: float, bx: float, by: float, diagonal: bool, ds: int)->None:
+		"""Runs one iteration.
+
+		:param alpha: Talus height difference per unit of distance.
+		:type alpha: :class:`float`
+		:param Ks: Fraction of the excess material moved, at most 0.5.
+		:type Ks: :class:`float`
+		:param bx: X pixel size.
+		:type bx: :class:`float`
+		:param by: Y pixel size.
+		:type by: :class:`float`
+		:param diagonal: Compares diagonal neighbors instead of the XY ones.
+		:type diagonal: :class:`bool`
+		:param ds: Distance to the neighbors in pixels, at most the padding.
+		:type ds: :class:`int`"""
+		rows, cols = self.height.shape
+		diag = ds if diagonal else 0
+		#  1y
+		#0x  2z
+		#  3w
+		shifts = ((-ds, -diag), (-diag, ds), (ds, diag), (diag, -ds))
+		scale = math.sqrt(2) * ds if diagonal else ds
+		thresholds = (alpha * bx * scale, alpha * by * scale, alpha * bx * scale, alpha * by * scale)
+
+		source = self.buffers[self.current]
+		target = self.buffers[1 - self.current]
+
+		if self.total is not None:
+			def add_offset(start: int, end: int):
+				np.add(self._view(source, start, end), self.offset[start:end], out=self._view(self.total, start, end))
+			bands.run(add_offset, self.bands)
+		total = self.total if self.total is not None else source
+
+		def request(start: int, end: int):
+			index = self.bands.index((start, end))
+			t, mx, mn, sd, ss = self.scratch[index]
+			mask = self.masks[index]
+			center = self._view(total, start, end)
+
+			mx.fill(0)
+			mn.fill(0)
+			sd.fill(0)
+			ss.fill(0)
+			for k, ((dx, dy), threshold) in enumerate(zip(shifts, thresholds)):
+				r = self._view(self.requests[k], start, end)
+				np.subtract(self._view(total, start, end, dx, dy), center, out=t)
+				np.abs(t, out=r)
+				r -= threshold
+				np.maximum(r, 0, out=r)
+				np.copysign(r, t, out=r)	# height difference beyond the talus, 0 inside it
+
+				# neighbors outside of the map don't exchange material
+				if dx < 0:
+					r[:, :-dx] = 0
+				elif dx > 0:
+					r[:, cols - dx:] = 0
+				if dy < 0:
+					r[:max(0, -dy - start)] = 0
+				elif dy > 0:
+					r[max(0, rows - dy - start):] = 0
+
+				np.maximum(mx, r, out=mx)
+				np.minimum(mn, r, out=mn)
+				np.maximum(r, 0, out=t)
+				sd += t
+				np.minimum(r, 0, out=t)
+				ss += t
+
+			# a cell can supply at most its own material
+			np.negative(self._view(source, start, end), out=t)
+			np.maximum(mn, t, out=mn)
+
+			np.greater(sd, 0, out=mask)
+			np.divide(mx, sd, out=mx, where=mask)	# mx is 0 where nothing is received
+			mx *= Ks
+			np.clip(mx, 0, 1, out=mx)
+
+			np.less(ss, 0, out=mask)
+			np.divide(mn, ss, out=mn, where=mask)
+			mn *= Ks
+			np.clip(mn, 0, 1, out=mn)	# requests are 0 where nothing is supplied, mn doesn't matter there
+
+			for k in range(4):
+				r = self._view(self.requests[k], start, end)
+				np.copyto(t, mn)
+				np.greater(r, 0, out=mask)
+				np.copyto(t, mx, where=mask)
+				r *= t
+
+		def settle(start: int, end: int):
+			index = self.bands.index((start, end))
+			t, low, high = self.scratch[index][:3]
+			mask = self.masks[index]
+			out = self._view(target, start, end)
+
+			np.copyto(out, self._view(source, start, end))
+			for k, (dx, dy) in enumerate(shifts):
+				r = self._view(self.requests[k], start, end)
+				np.negative(self._view(self.requests[(k + 2) % 4], start, end, dx, dy), out=t)	# what the neighbor offers
+
+				# take the smaller exchange of both requests
+				np.minimum(r, t, out=low)
+				np.maximum(r, t, out=high)
+				np.less(t, 0, out=mask)
+				np.copyto(low, high, where=mask)
+				out += low
+
+		bands.run(request, self.bands)
+		bands.run(settle, self.bands)
+		self.current = 1 - self.current
+
+# --------------------------------------------------------- In-place kernel
+
+def _relax_pairs(a: np.ndarray, b: np.ndarray, oa: np.ndarray | None, ob: np.ndarray | None, threshold: float, Ks: float)->None:
+	"""Moves material between paired cells in place, counterpart of `thermal_rb.glsl`.
+
+	:param a: First cells of the pairs.
+	:type a: :class:`numpy.ndarray`
+	:param b: Second cells of the pairs.
+	:type b: :class:`numpy.ndarray`
+	:param oa: Offset of the first cells.
+	:type oa: :class:`numpy.ndarray` or :class:`None`
+	:param ob: Offset of the second cells.
+	:type ob: :class:`numpy.ndarray` or :class:`None`
+	:param threshold: Talus height difference between the cells.
+	:type threshold: :class:`float`
+	:param Ks: Fraction of the excess material moved.
+	:type Ks: :class:`float`"""
+	dh = (a + oa) - (b + ob) if oa is not None else a - b
+	excess = np.abs(dh)
+	excess -= threshold
+	np.maximum(excess, 0, out=excess)
+	excess *= Ks
+
+	# the higher cell can supply at most its own material
+	supply = np.where(dh > 0, a, b)
+	np.maximum(supply, 0, out=supply)
+	np.minimum(excess, supply, out=excess)
+	np.copysign(excess, dh, out=excess)
+
+	a -= excess
+	b += excess
+
+def run_inplace(height: np.ndarray, offset: np.ndarray | None, alpha: float, Ks: float, bx: float, by: float, diagonal: bool, stride: int, iteration: int)->None:
+	"""Runs one iteration of the in-place kernel. Counterpart of :func:`Hydra.core.thermal.run_inplace`.
+
+	:param height: Heightmap to erode in place.
+	:type height: :class:`numpy.ndarray`
+	:param offset: Optional static map added to the height when comparing cells.
+	:type offset: :class:`numpy.ndarray` or :class:`None`
+	:param alpha: Talus height difference per unit of distance.
+	:type alpha: :class:`float`
+	:param Ks: Fraction of the excess material moved.
+	:type Ks: :class:`float`
+	:param bx: X pixel size.
+	:type bx: :class:`float`
+	:param by: Y pixel size.
+	:type by: :class:`float`
+	:param diagonal: Moves material along diagonals instead of the XY directions.
+	:type diagonal: :class:`bool`
+	:param stride: Distance between paired cells in pixels.
+	:type stride: :class:`int`
+	:param iteration: Index of the iteration.
+	:type iteration: :class:`int`"""
+	directions = ((1, 1), (1, -1)) if diagonal else ((1, 0), (0, 1))
+	parities = (1, 0) if iteration & 1 else (0, 1)
+
+	for direction in directions:
+		length = (bx if direction[0] != 0 and direction[1] >= 0 else by) * (math.sqrt(2) if diagonal else 1) * stride
+
+		# pairs along Y are pairs along X of the transposed map
+		h, o = (height, offset) if direction[0] != 0 else (height.T, offset.T if offset is not None else None)
+		dy = direction[1] if direction[0] != 0 else 0
+		rows, cols = h.shape
+		ya = slice(max(0, -dy * stride), rows - max(0, dy * stride))
+		yb = slice(max(0, dy * stride), rows - max(0, -dy * stride))
+
+		for parity in parities:
+			# pairs start in every other block of `stride` columns, each block offset is a strided slice
+			for j in range(stride):
+				start = parity * stride + j
+				count = len(range(start, cols - stride, 2 * stride))
+				if count == 0:
+					continue
+				xa = slice(start, start + 2 * stride * (count - 1) + 1, 2 * stride)
+				xb = slice(start + stride, start + stride + 2 * stride * (count - 1) + 1, 2 * stride)
+				_relax_pairs(h[ya, xa], h[yb, xb],
+					o[ya, xa] if o is not None else None, o[yb, xb] if o is not None else None,
+					alpha * length, Ks)
+
+def relax(height: np.ndarray, Ks: float, by: float, angle: float, solver: str, iterations: int)->None:
+	"""Runs in-place thermal erosion on a heightmap of any size. Counterpart of :func:`Hydra.core.thermal.relax`.
+
+	:param height: Heightmap to erode in place.
+	:type height: :class:`numpy.ndarray`
+	:param Ks: Fraction of the excess material moved.
+	:type Ks: :class:`float`
+	:param by: Y pixel size.
+	:type by: :class:`float`
+	:param angle: Maximum surface angle.
+	:type angle: :class:`float`
+	:param solver: Neighborhood type, one of `both`, `cardinal` or `diagonal`.
+	:type solver: :class:`str`
+	:param iterations: Number of iterations.
+	:type iterations: :class:`int`"""
+	alpha = math.tan(angle) * 2 / height.shape[1] # talus per pixel grows with pixel size
+
+	for i in range(iterations):
+		if solver == "both":
+			run_inplace(height, None, alpha, Ks, 1.0, by, (i&1) == 1, 1, i // 2)
+		else:
+			run_inplace(height, None, alpha, Ks, 1.0, by, solver == "diagonal", 1, i)
+
+def v_cycle(height: np.ndarray, Ks: float, by: float, angle: float, solver: str)->np.ndarray:
+	"""Runs a single multigrid V-cycle of thermal erosion. Counterpart of :func:`Hydra.core.thermal.v_cycle`.
+
+	:param height: Heightmap to erode.
+	:type height: :class:`numpy.ndarray`
+	:param Ks: Fraction of the excess material moved.
+	:type Ks: :class:`float`
+	:param by: Y pixel size.
+	:type by: :class:`float`
+	:param angle: Maximum surface angle.
+	:type angle: :class:`float`
+	:param solver: Neighborhood type, one of `both`, `cardinal` or `diagonal`.
+	:type solver: :class:`str`
+	:return: Eroded heightmap.
+	:rtype: :class:`numpy.ndarray`"""
+	size = (height.shape[1], height.shape[0])
+	coarse_size = (math.ceil(size[0] / 2), math.ceil(size[1] / 2))
+	if min(coarse_size) < thermal.MULTIGRID_MIN_SIZE:
+		relax(height, Ks, by, angle, solver, thermal.MULTIGRID_COARSE_ITERATIONS)
+		return height
+
+	relax(height, Ks, by, angle, solver, thermal.MULTIGRID_SMOOTHING)
+
+	coarse = cpu_textures.resize(height, coarse_size)
+	coarse_prior = coarse.copy()
+	coarse = v_cycle(coarse, Ks, by, angle, solver)
+
+	coarse -= coarse_prior
+	fine = cpu_textures.resize(coarse, size)
+	fine += height
+
+	relax(fine, Ks, by, angle, solver, thermal.MULTIGRID_SMOOTHING)
+	return fine
+
+# --------------------------------------------------------- Erosion
+
+def as_array(m)->np.ndarray:
+	"""Reads a state map into an array if it was created by the OpenGL backend.
+
+	:param m: Array or texture.
+	:type m: :class:`numpy.ndarray` or :class:`moderngl.Texture`
+	:return: Array, which may be `m` itself.
+	:rtype: :class:`numpy.ndarray`"""
+	return m if isinstance(m, np.ndarray) else textures.to_array(m)
+
+def erode(height: np.ndarray, settings: Settings, warm: common.SolverState | None = None)->Result:
+	"""Erodes a heightmap until its slopes are below the maximum angle. Counterpart of :func:`Hydra.core.thermal.erode`.
+
+	:param height: Heightmap to erode. Stays unchanged.
+	:type height: :class:`numpy.ndarray`
+	:param settings: Simulation settings.
+	:type settings: :class:`Hydra.core.settings.Settings`
+	:param warm: Optional state of a previous erosion of the same heightmap to start from.
+	:type warm: :class:`Hydra.common.SolverState` or :class:`None`
+	:return: Eroded heightmap, and a state to start from next time if `warm_start` is set and the map converged.
+	:rtype: :class:`Hydra.core.result.Result`"""
+	print("Preparing for thermal erosion")
+
+	if warm is not None:
+		print("Starting from cached state")
+		height = as_array(warm.textures["height"])
+
+	multigrid = settings.thermal_multigrid
+	inplace = settings.thermal_kernel == "inplace" or multigrid
+
+	stride = settings.thermal_stride
+	if settings.thermal_stride_grad:
+		next_pass = settings.thermal_iter_num // 2
+
+	Ks = (settings.thermal_strength / 100) * 0.5	#0-1 -> 0-0.5, higher is unstable
+	alpha = math.tan(settings.thermal_angle) * 2 / height.shape[1] # images are scaled to 2 z/x -> angle depends only on image width
+	by = settings.scale_ratio
+
+	if inplace:
+		stencil = None
+		current = height.copy()
+	else:
+		stencil = Stencil(height, pad=stride)
+		current = stencil.height
+
+	diagonal = settings.thermal_solver == "diagonal"
+	alternate = settings.thermal_solver == "both"
+
+	# warm starts are close to convergence -> always check, cached states have to be converged
+	monitor = reduction.ChangeMonitor(current, settings.stop_tolerance, settings.stop_interval, settings.stop_metric) if settings.stop_early or settings.warm_start or warm is not None else None
+	iterations = settings.thermal_iter_num
+
+	time = datetime.now()
+	for i in range(settings.thermal_iter_num):
+		if alternate:
+			diagonal = (i&1) == 1
+
+		if multigrid:
+			current = v_cycle(current, Ks, by, settings.thermal_angle, settings.thermal_solver)
+		elif inplace:
+			run_inplace(current, None, alpha, Ks, 1.0, by, diagonal, stride, i // 2 if alternate else i)
+		else:
+			stencil.step(alpha, Ks, 1.0, by, diagonal, stride)
+			current = stencil.height
+
+		if settings.thermal_stride_grad and i >= next_pass:
+			stride = math.ceil(stride / 2)
+			next_pass += (settings.thermal_iter_num - i) // 2
+
+		if monitor is not None and monitor.check(current, i + 1):
+			iterations = i + 1
+			break
+
+	print((datetime.now() - time).total_seconds())
+
+	height = np.ascontiguousarray(current) if inplace else current.copy()
+
+	converged = monitor is not None and monitor.converged
+	if monitor is not None:
+		monitor.report(iterations)
+		monitor.release()
+
+	if settings.warm_start and converged:
+		params = {"angle": settings.thermal_angle, **thermal.warm_params(settings)}
+		state = common.SolverState("thermal", {"height": height.copy()}, params)
+	else:
+		state = None
+
+	print("Erosion finished")
+	return Result(height, None, state, iterations if monitor is not None else None)
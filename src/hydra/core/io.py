@@ -0,0 +1,150 @@
+"""Module responsible for reading and writing maps in common terrain file formats.
+
+Rows are stored in file order and aren't flipped, so a map read and written again keeps its orientation.
+PNG files require Pillow and EXR files require the OpenEXR package."""
+
+import numpy as np
+import math
+from pathlib import Path
+
+FORMATS = (".npy", ".raw", ".r16", ".r32", ".png", ".exr")
+"""Supported file extensions. `.raw` and `.r16` store square 16-bit unsigned maps, `.r32` square 32-bit float maps."""
+
+#-------------------------------------------- Reading
+
+def read_map(path: str | Path, size: tuple[int,int] | None = None, mmap: bool = False)->np.ndarray:
+	"""Reads a map from a file.
+
+	Integer data is normalized to the range 0-1.
+
+	:param path: File path with one of the :data:`FORMATS` extensions.
+	:type path: :class:`str` or :class:`pathlib.Path`
+	:param size: Size of raw files. Raw files are assumed to be square if not specified.
+	:type size: :class:`tuple[int,int]` or :class:`None`
+	:param mmap: Memory-maps `.npy` and `.r32` files read-only instead of loading them. Only float32 data stays mapped.
+	:type mmap: :class:`bool`
+	:return: Float32 array of shape `(height, width)` or `(height, width, channels)`.
+	:rtype: :class:`numpy.ndarray`"""
+	path = Path(path)
+	ext = path.suffix.lower()
+
+	if ext == ".npy":
+		array = np.load(path, mmap_mode="r" if mmap else None)
+	elif ext in (".raw", ".r16", ".r32"):
+		dtype = np.dtype("<f4") if ext == ".r32" else np.dtype("<u2")
+		array = np.memmap(path, dtype=dtype, mode="r") if mmap and ext == ".r32" else np.fromfile(path, dtype=dtype)
+		if size is None:
+			side = math.isqrt(array.size)
+			if side * side != array.size:
+				raise ValueError(f"{path.name} isn't square, specify its size")
+			size = (side, side)
+		array = array.reshape(size[1], size[0])
+	elif ext == ".png":
+		try:
+			from PIL import Image
+		except ImportError:
+			raise ImportError("Reading PNG files requires Pillow") from None
+		with Image.open(path) as img:
+			array = np.array(img)
+			if img.mode in ("I", "I;16", "I;16B"):
+				array = array.astype(np.uint16)	# Pillow widens 16-bit grayscale to 32-bit integers
+	elif ext == ".exr":
+		try:
+			import OpenEXR
+		except ImportError:
+			raise ImportError("Reading EXR files requires the OpenEXR package") from None
+		with OpenEXR.File(str(path)) as exr:
+			channels = exr.channels()
+			for name in ("Y", "RGBA", "RGB", "R"):
+				if name in channels:
+					array = channels[name].pixels
+					break
+			else:
+				array = next(iter(channels.values())).pixels
+	else:
+		raise ValueError(f"Unsupported file type '{ext}'")
+
+	if np.issubdtype(array.dtype, np.integer):
+		array = array / np.iinfo(array.dtype).max
+
+	return np.ascontiguousarray(array, dtype=np.float32)
+
+#-------------------------------------------- Writing
+
+def write_map(path: str | Path, array: np.ndarray)->None:
+	"""Writes a map into a file.
+
+	Integer formats clamp values to the range 0-1. PNG stores single channel maps
+	as 16-bit grayscale and multichannel maps as 8-bit RGBA.
+
+	:param path: File path with one of the :data:`FORMATS` extensions.
+	:type path: :class:`str` or :class:`pathlib.Path`
+	:param array: Array of shape `(height, width)` or `(height, width, channels)`.
+	:type array: :class:`numpy.ndarray`"""
+	path = Path(path)
+	ext = path.suffix.lower()
+
+	if ext == ".npy":
+		np.save(path, array)
+		return
+
+	if ext == ".exr":
+		try:
+			import OpenEXR
+		except ImportError:
+			raise ImportError("Writing EXR files requires the OpenEXR package") from None
+		if array.ndim == 2:
+			channels = {"Y": array.astype(np.float32)}
+		else:
+			array = _pad_rgb(array)
+			channels = {"RGBA"[:array.shape[2]]: array.astype(np.float32)}
+		header = {"compression": OpenEXR.ZIP_COMPRESSION, "type": OpenEXR.scanlineimage}
+		with OpenEXR.File(header, channels) as exr:
+			exr.write(str(path))
+		return
+
+	if ext in (".raw", ".r16", ".r32"):
+		if array.ndim != 2:
+			raise ValueError("Raw files only store single channel maps")
+		if ext == ".r32":
+			array.astype("<f4").tofile(path)
+		else:
+			_quantize(array, np.uint16).astype("<u2").tofile(path)
+	elif ext == ".png":
+		try:
+			from PIL import Image
+		except ImportError:
+			raise ImportError("Writing PNG files requires Pillow") from None
+		if array.ndim == 2:
+			img = Image.fromarray(_quantize(array, np.uint16))
+		else:
+			rgba = _pad_rgb(array)
+			if rgba.shape[2] == 3:
+				rgba = np.dstack((rgba, np.ones(rgba.shape[:2], dtype=rgba.dtype)))
+			img = Image.fromarray(_quantize(rgba, np.uint8))
+		img.save(path)
+	else:
+		raise ValueError(f"Unsupported file type '{ext}'")
+
+def _quantize(array: np.ndarray, dtype: type)->np.ndarray:
+	"""Converts values in the range 0-1 to an unsigned integer type, clamping values outside of it.
+
+	:param array: Array to convert.
+	:type array: :class:`numpy.ndarray`
+	:param dtype: Unsigned integer type.
+	:type dtype: :class:`type`
+	:return: Converted array.
+	:rtype: :class:`numpy.ndarray`"""
+	scale = np.iinfo(dtype).max
+	return (np.clip(array, 0, 1) * scale + 0.5).astype(dtype)
+
+def _pad_rgb(array: np.ndarray)->np.ndarray:
+	"""Pads two channel maps, e.g. velocity, with a zero blue channel.
+
+	:param array: Array of shape `(height, width, channels)`.
+	:type array: :class:`numpy.ndarray`
+	:return: Array with 1, 3 or 4 channels.
+	:rtype: :class:`numpy.ndarray`"""
+	if array.shape[2] != 2:
+		return array
+	return np.dstack((array, np.zeros(array.shape[:2], dtype=array.dtype)))
@@ -0,0 +1,617 @@
+"""Module responsible for pipe-based water erosion and color transport."""
+
+from Hydra.core import textures
+from Hydra.core.settings import Settings
+from Hydra.core.result import Result
+from Hydra.utils.reduction import Reduction, ChangeMonitor
+from Hydra import common
+from moderngl import Texture, ComputeShader
+
+import numpy as np
+import math
+
+from datetime import datetime
+
+BASE_DT = 1e-2
+"""Time step of the fixed time stepping mode."""
+
+PIPE_DT = 0.25
+"""Time step of the outflow pass at :data:`BASE_DT`. Scaled along with the time step in the adaptive mode.
+Outflow is still limited to the water a cell can lose in this time, so drainage doesn't depend on the step."""
+
+CFL_NUMBER = 0.5
+"""Fraction of a cell that flow may cross in a single adaptive step, and fraction of the stability limit of the outflow pass used by it."""
+
+MIN_FLOW_DEPTH = 1e-3
+"""Water depth, below which flow speed is ignored by adaptive steps. Thin films drain within a single step,
+so their speed only reflects the step size."""
+
+REDUCE_INTERVAL = 10
+"""Number of adaptive steps between reductions of the flow speed, which pick the next time step."""
+
+STATE_TEXTURES = ("pipe", "velocity", "water", "sediment", "temp")
+"""Names of textures stored in the solver state."""
+
+def cfl_time_step(speed: float, pipe_len: float=1.0, A: float=1.0)->float:
+	"""Calculates the largest time step for the current flow.
+
+	Outflow is accelerated by differences of the water surface alone, not by the water depth,
+	so its stability limit is the same on any terrain. Within that limit, the step shrinks
+	as the flow speeds up, so that sediment isn't carried further than :data:`CFL_NUMBER` cells per step.
+
+	:param speed: Maximum flow speed along either axis.
+	:type speed: :class:`float`
+	:param pipe_len: Cell size.
+	:type pipe_len: :class:`float`
+	:param A: Pipe cross-section of the outflow pass.
+	:type A: :class:`float`
+	:return: Time step, never shorter than :data:`BASE_DT` nor above the stability limit.
+	:rtype: :class:`float`"""
+	wave = math.sqrt(8 * A * PIPE_DT / BASE_DT / pipe_len) # fastest surface wave, outflow acceleration grows with the step
+	limit = 2 * CFL_NUMBER / wave	# explicit outflow is stable for dt * wave <= 2
+	if speed > 0:
+		limit = min(limit, CFL_NUMBER * pipe_len / speed)
+	return max(limit, BASE_DT)
+
+def scale_rate(rate: float, ratio: float)->float:
+	"""Rescales a per-step exchange rate to a time step `ratio` times longer, keeping the rate over time.
+
+	:param rate: Exchange rate at :data:`BASE_DT`.
+	:type rate: :class:`float`
+	:param ratio: Ratio of the new time step to :data:`BASE_DT`.
+	:type ratio: :class:`float`
+	:return: Exchange rate at the new time step.
+	:rtype: :class:`float`"""
+	if ratio == 1:
+		return rate
+	return 1 - (1 - min(max(rate, 0), 1)) ** ratio
+
+# --------------------------------------------------------- Erosion
+
+def erode(height: Texture, settings: Settings, hardness: Texture | None = None, water_src: Texture | None = None, color: Texture | None = None, state: common.SolverState | None = None)->Result:
+	"""Erodes a heightmap with the pipe model.
+
+	All optional maps have to be of the simulation size, see :func:`Hydra.core.textures.subres_size`.
+
+	:param height: Heightmap to erode. Stays unchanged.
+	:type height: :class:`moderngl.Texture`
+	:param settings: Simulation settings.
+	:type settings: :class:`Hydra.core.settings.Settings`
+	:param hardness: Optional hardness map.
+	:type hardness: :class:`moderngl.Texture` or :class:`None`
+	:param water_src: Optional map of rain intensity.
+	:type water_src: :class:`moderngl.Texture` or :class:`None`
+	:param color: Optional RGBA color map. Its colors are moved along with the water.
+	:type color: :class:`moderngl.Texture` or :class:`None`
+	:param state: Optional state of a previous simulation to resume from. Ignored if its size differs.
+	:type state: :class:`Hydra.common.SolverState` or :class:`None`
+	:return: Eroded heightmap, outputs listed in `mei_outputs`, moved colors as the `color` output, and the water state if `mei_resume` is set.
+	:rtype: :class:`Hydra.core.result.Result`"""
+	print("Preparing for water erosion")
+	data = common.data
+	ctx = data.context
+
+	BIND_HEIGHT = 1 # don't use 0 -> default value -> cross-contamination
+	BIND_PIPE = 2
+	BIND_VELOCITY = 3
+	BIND_WATER = 4
+	BIND_SEDIMENT = 5
+	BIND_TEMP = 6
+	BIND_EXTRA = 7
+
+	BIND_TILE_FLAGS = 6 # storage buffer bindings
+	BIND_TILES = 7
+
+	LOC_SEDIMENT = 1
+	LOC_VELOCITY = 2
+	LOC_HEIGHT = 3
+	LOC_WATER = 4
+	LOC_PIPE = 5
+	LOC_COLOR = 6
+
+	source = height
+	size = textures.subres_size(source.size, settings.erosion_subres)
+
+	if size != tuple(source.size):
+		height = textures.resize_texture(source, size)
+		height_base = textures.clone(height)
+	else:
+		height = textures.clone(source)
+		height_base = None
+
+	if state is not None and state.size == size:
+		print("Resuming from previous state")
+		pipe, velocity, water, sediment, temp = (textures.clone(state.textures[name]) for name in STATE_TEXTURES)
+	else:
+		pipe = textures.create_texture(size, channels=4)
+		velocity = textures.create_texture(size, channels=2)
+		water = textures.create_texture(size)
+		sediment = textures.create_texture(size)
+		temp = textures.create_texture(size)	# capacity, water and sediment at different stages
+
+	height.bind_to_image(BIND_HEIGHT, read=True, write=True)
+	pipe.bind_to_image(BIND_PIPE, read=True, write=True)
+	velocity.bind_to_image(BIND_VELOCITY, read=True, write=True)
+	water.bind_to_image(BIND_WATER, read=True, write=True)
+	sediment.bind_to_image(BIND_SEDIMENT, read=True, write=True)
+	temp.bind_to_image(BIND_TEMP, read=True, write=True)
+
+	sedimentSampler = ctx.sampler(texture=temp, repeat_x=False, repeat_y=False) # sediment will be in temp at stage 6
+	temp.use(LOC_SEDIMENT)
+	sedimentSampler.use(LOC_SEDIMENT)
+
+	velocity_sampler = ctx.sampler(texture=velocity, repeat_x=False, repeat_y=False)
+	velocity_sampler.use(LOC_VELOCITY)
+	velocity.use(LOC_VELOCITY)
+
+	group_x = math.ceil(size[0] / 32)
+	group_y = math.ceil(size[1] / 32)
+
+	progs = [
+		data.shaders["mei1"],
+		data.shaders["mei2"],
+		data.shaders["mei3"],
+		data.shaders["mei4"],
+		data.shaders["mei5"],
+		data.shaders["mei6"]
+	]
+
+	dt = BASE_DT
+	pipe_len = 1
+	evaporation = 0.01
+	deposition = 0.25
+	erosion = 1 - (1 - (settings.mei_hardness / 100 - 1) ** 2) ** 0.15 # maps interval 0.5-1.0 to hardness 0.9-1.0
+
+	progs[0]["d_map"].value = BIND_WATER
+	progs[0]["dt"] = dt
+	progs[0]["Ke"] = evaporation
+	progs[0]["Kr"] = (1 - (1 - (0.25 * settings.mei_rain / 100) ** 2) ** 0.5) * 0.1
+	progs[0]["water_src"].value = BIND_EXTRA
+	progs[0]["use_water_src"] = water_src is not None
+	progs[0]["rainfall"] = settings.mei_randomize
+
+	progs[1]["b_map"].value = BIND_HEIGHT
+	progs[1]["pipe_map"].value = BIND_PIPE
+	progs[1]["d_map"].value = BIND_WATER
+	progs[1]["size"] = size
+	progs[1]["lx"] = pipe_len
+	progs[1]["ly"] = pipe_len
+	progs[1]["A"] = 1
+	progs[1]["drain_dt"] = PIPE_DT
+
+	progs[2]["pipe_map"].value = BIND_PIPE
+	progs[2]["d_map"].value = BIND_WATER
+	progs[2]["c_map"].value = BIND_TEMP
+	progs[2]["dt"] = dt
+	progs[2]["lx"] = pipe_len
+	progs[2]["ly"] = pipe_len
+
+	progs[3]["b_map"].value = BIND_HEIGHT
+	progs[3]["pipe_map"].value = BIND_PIPE
+	progs[3]["v_map"].value = BIND_VELOCITY
+	progs[3]["d_map"].value = BIND_WATER
+	progs[3]["dmean_map"].value = BIND_TEMP
+	progs[3]["Kc"] = (settings.mei_capacity / 100) * 0.25 * 0.002
+	progs[3]["lx"] = pipe_len
+	progs[3]["ly"] = pipe_len
+	progs[3]["scale"] = size[0] / 2
+	progs[3]["depth_scale"] = 1 / (settings.mei_max_depth * 0.002)
+
+	progs[4]["b_map"].value = BIND_HEIGHT
+	progs[4]["s_map"].value = BIND_SEDIMENT
+	progs[4]["c_map"].value = BIND_TEMP
+	progs[4]["d_map"].value = BIND_WATER
+	progs[4]["hardness_map"].value = BIND_EXTRA
+	progs[4]["use_hardness"] = hardness is not None
+	progs[4]["invert_hardness"] = settings.erosion_invert_hardness
+
+	progs[5]["out_s_map"].value = BIND_SEDIMENT
+	progs[5]["v_map"].value = BIND_VELOCITY
+	progs[5]["s_sampler"] = LOC_SEDIMENT
+	progs[5]["v_sampler"] = LOC_VELOCITY
+	progs[5]["dt"] = dt
+	progs[5]["tile_mult"] = (1 / size[0], 1 / size[1])
+
+	fused = settings.mei_variant == "fused"
+	if fused:
+		# mei1+mei2 and mei3+mei4+mei5 in single passes, mei6 stays separate
+		fused_progs = [data.shaders["mei12"], data.shaders["mei345"]]
+		height_b = textures.clone(height) # tiles skipped by sparse dispatch keep their values
+
+		water_b = textures.create_texture(size)
+
+		for prog in fused_progs:
+			prog["b_sampler"] = LOC_HEIGHT
+			prog["d_sampler"] = LOC_WATER
+			prog["out_d_map"].value = BIND_WATER
+			prog["size"] = size
+			prog["lx"] = pipe_len
+			prog["ly"] = pipe_len
+
+		fused_progs[0]["pipe_map"].value = BIND_PIPE
+		fused_progs[0]["Ke"] = evaporation
+		fused_progs[0]["Kr"] = progs[0]["Kr"].value
+		fused_progs[0]["water_src"].value = BIND_EXTRA
+		fused_progs[0]["use_water_src"] = water_src is not None
+		fused_progs[0]["rainfall"] = settings.mei_randomize
+		fused_progs[0]["A"] = 1
+		fused_progs[0]["drain_dt"] = PIPE_DT
+
+		fused_progs[1]["pipe_sampler"] = LOC_PIPE
+		fused_progs[1]["out_b_map"].value = BIND_HEIGHT
+		fused_progs[1]["v_map"].value = BIND_VELOCITY
+		fused_progs[1]["s_map"].value = BIND_SEDIMENT
+		fused_progs[1]["c_map"].value = BIND_TEMP
+		fused_progs[1]["Kc"] = progs[3]["Kc"].value
+		fused_progs[1]["scale"] = size[0] / 2
+		fused_progs[1]["depth_scale"] = progs[3]["depth_scale"].value
+		fused_progs[1]["hardness_map"].value = BIND_EXTRA
+		fused_progs[1]["use_hardness"] = hardness is not None
+		fused_progs[1]["invert_hardness"] = settings.erosion_invert_hardness
+
+		pipe.use(LOC_PIPE)
+
+	sparse = settings.mei_sparse
+	if sparse:
+		# per-workgroup flags and a compacted list of active tiles for indirect dispatch
+		tile_count = group_x * group_y
+		tile_list = ctx.buffer(reserve=16 + 8 * tile_count)
+		tile_wet = ctx.buffer(bytes(4 * tile_count))
+		tile_prog = data.shaders["mei_tiles"]
+		tile_prog["pipe_map"].value = BIND_PIPE
+		tile_prog["v_map"].value = BIND_VELOCITY
+		tile_prog["d_map"].value = BIND_WATER
+		tile_prog["s_map"].value = BIND_SEDIMENT
+		tile_prog["c_map"].value = BIND_TEMP
+		tile_prog["water_src"].value = BIND_EXTRA
+		tile_prog["use_water_src"] = water_src is not None
+		tile_prog["raining"] = progs[0]["Kr"].value > 0
+
+	for prog in progs + (fused_progs if fused else []):
+		prog["sparse"] = sparse
+
+	transport = color is not None
+	if transport:
+		# color is advected by the final velocity of each step, output is bound to the free extra unit
+		colorA = textures.clone(color)
+		colorB = textures.create_texture(size, channels=4)
+		colorSamplerA = ctx.sampler(texture=colorA)
+		colorSamplerB = ctx.sampler(texture=colorB)
+
+		color_prog = data.shaders["mei_color"]
+		color_prog["v_map"].value = BIND_VELOCITY
+		color_prog["out_color_map"].value = BIND_EXTRA
+		color_prog["color_sampler"] = LOC_COLOR
+		color_prog["v_sampler"] = LOC_VELOCITY
+		color_prog["color_scaling"] = 1 / (100 - 99 * (settings.color_mixing / 100))
+		color_prog["tile_mult"] = (1 / size[0], 1 / size[1])
+
+	def update_tiles():
+		tile_list.write(np.array([0, 1, 1, 0], dtype=np.uint32).tobytes())
+		tile_list.bind_to_storage_buffer(BIND_TILES)
+		tile_wet.bind_to_storage_buffer(BIND_TILE_FLAGS)
+		if water_src is not None:
+			water_src.bind_to_image(BIND_EXTRA, read=True, write=False)
+
+		ctx.memory_barrier()
+		tile_prog.run(group_x=group_x, group_y=group_y)
+		ctx.memory_barrier()
+
+	def dispatch(prog: ComputeShader):
+		if sparse:
+			prog.run_indirect(tile_list)
+		else:
+			prog.run(group_x=group_x, group_y=group_y)
+
+	def set_dt(dt: float):
+		ratio = dt / BASE_DT
+		ks = scale_rate(erosion, ratio)
+		kd = scale_rate(deposition, ratio)
+
+		progs[0]["dt"] = dt
+		progs[1]["dt"] = PIPE_DT * ratio
+		progs[2]["dt"] = dt
+		progs[4]["Ks"] = ks
+		progs[4]["Kd"] = kd
+		progs[5]["dt"] = dt
+
+		if transport:
+			color_prog["dt"] = dt
+
+		if fused:
+			fused_progs[0]["dt"] = dt
+			fused_progs[0]["pipe_dt"] = PIPE_DT * ratio
+			fused_progs[1]["dt"] = dt
+			fused_progs[1]["Ks"] = ks
+			fused_progs[1]["Kd"] = kd
+
+	def step_separate(i: int):
+		if sparse:
+			update_tiles()
+
+		if water_src is not None:
+			water_src.bind_to_image(BIND_EXTRA, read=True, write=False)
+		
+		progs[0]["seed"] = i
+		dispatch(progs[0])
+		
+		dispatch(progs[1])
+		dispatch(progs[2])
+		dispatch(progs[3])
+
+		if hardness is not None:
+			hardness.bind_to_image(BIND_EXTRA, read=True, write=False)
+		dispatch(progs[4])
+
+		dispatch(progs[5])
+
+	def step_fused(i: int):
+		nonlocal height, height_b
+		if sparse:
+			update_tiles()
+
+		if water_src is not None:
+			water_src.bind_to_image(BIND_EXTRA, read=True, write=False)
+
+		height.use(LOC_HEIGHT)
+		water.use(LOC_WATER)
+		water_b.bind_to_image(BIND_WATER, read=True, write=True)
+		fused_progs[0]["seed"] = i
+		dispatch(fused_progs[0])
+		ctx.memory_barrier()
+
+		if hardness is not None:
+			hardness.bind_to_image(BIND_EXTRA, read=True, write=False)
+
+		water_b.use(LOC_WATER)
+		water.bind_to_image(BIND_WATER, read=True, write=True)
+		height_b.bind_to_image(BIND_HEIGHT, read=True, write=True)
+		dispatch(fused_progs[1])
+		ctx.memory_barrier()
+
+		dispatch(progs[5])
+		ctx.memory_barrier()
+
+		height, height_b = height_b, height
+
+	simulate = step_fused if fused else step_separate
+
+	def step(i: int):
+		nonlocal colorA, colorB, colorSamplerA, colorSamplerB
+		simulate(i)
+
+		if transport:
+			ctx.memory_barrier()
+			colorA.use(LOC_COLOR)
+			colorSamplerA.use(LOC_COLOR)
+			colorB.bind_to_image(BIND_EXTRA, read=False, write=True)
+			color_prog.run(group_x=group_x, group_y=group_y)
+
+			colorA, colorB = colorB, colorA
+			colorSamplerA, colorSamplerB = colorSamplerB, colorSamplerA
+
+	monitor = ChangeMonitor(height, settings.stop_tolerance, settings.stop_interval, settings.stop_metric) if settings.stop_early else None
+
+	def converged(steps: int)->bool:
+		# extra unit is rebound by every step that uses it
+		return monitor is not None and monitor.check(height, steps, BIND_HEIGHT, BIND_EXTRA)
+
+	time = datetime.now()
+	if settings.mei_time_step == "adaptive":
+		reduction = Reduction(group_x * group_y)
+		reduce_prog = data.shaders["mei_reduce"]
+		reduce_prog["v_map"].value = BIND_VELOCITY
+		reduce_prog["d_map"].value = BIND_WATER
+		reduce_prog["min_depth"] = MIN_FLOW_DEPTH
+
+		def flow_speed()->float:
+			ctx.memory_barrier()
+			reduction.bind()
+			reduce_prog.run(group_x=group_x, group_y=group_y)
+			return float(reduction.max()[0])
+
+		elapsed = 0
+		steps = 0
+		dt = cfl_time_step(flow_speed(), pipe_len)	# resumed states may already flow
+		while elapsed < settings.mei_duration:
+			if steps > 0 and steps % REDUCE_INTERVAL == 0:
+				dt = cfl_time_step(flow_speed(), pipe_len)
+			step_dt = min(dt, settings.mei_duration - elapsed) # last step ends exactly at the duration
+			set_dt(step_dt)
+			step(steps)
+			elapsed += step_dt
+			steps += 1
+			if converged(steps):
+				break
+
+		reduction.release()
+		print(f"Simulated {elapsed:.3g} of {settings.mei_duration} in {steps} steps")
+	else:
+		set_dt(BASE_DT)
+		steps = settings.mei_iter_num * 10
+		for i in range(settings.mei_iter_num * 10):
+			step(i)
+			if converged(i + 1):
+				steps = i + 1
+				break
+
+	if monitor is not None:
+		monitor.report(steps)
+		monitor.release()
+
+	if fused:
+		height_b.release()
+		water_b.release()
+
+	if sparse:
+		tile_list.release()
+		tile_wet.release()
+
+	ctx.finish()
+
+	print((datetime.now() - time).total_seconds())
+
+	velocity_sampler.release()
+	sedimentSampler.release()
+
+	fields = {"water": water, "sediment": sediment, "velocity": velocity}
+	outputs = {name: textures.clone(fields[name]) for name in settings.mei_outputs}
+
+	if transport:
+		outputs["color"] = colorA
+		for resource in (colorB, colorSamplerA, colorSamplerB):
+			resource.release()
+
+	state = common.SolverState("mei", dict(zip(STATE_TEXTURES, (pipe, velocity, water, sediment, temp))))
+	if not settings.mei_resume:
+		state.release()
+		state = None
+
+	if height_base is not None: # resize back to original size
+		height = textures.add_subres(height, height_base, source)
+
+	print("Erosion finished")
+	return Result(height, outputs, state, steps if monitor is not None else None)
+
+def transport_color(height: Texture, color: Texture, settings: Settings)->Result:
+	"""Moves colors with water flowing over a heightmap.
+
+	:param height: Heightmap to flow over. Stays unchanged.
+	:type height: :class:`moderngl.Texture`
+	:param color: RGBA color map of the heightmap size. Stays unchanged.
+	:type color: :class:`moderngl.Texture`
+	:param settings: Simulation settings.
+	:type settings: :class:`Hydra.core.settings.Settings`
+	:return: Moved colors as the `color` output.
+	:rtype: :class:`Hydra.core.result.Result`"""
+	print("Preparing for color transport")
+	data = common.data
+	ctx = data.context
+	size = tuple(height.size)
+
+	height = textures.clone(height)
+
+	BIND_HEIGHT = 1 # don't use 0 -> default value -> cross-contamination
+	BIND_PIPE = 2
+	BIND_VELOCITY = 3
+	BIND_WATER = 4
+	BIND_TEMP = 6
+	BIND_COLOR = 7
+
+	LOC_COLOR = 1
+	LOC_VELOCITY = 2
+
+	def swap(a, b):
+		return (b, a)
+
+	pipe = textures.create_texture(size, channels=4)
+	velocity = textures.create_texture(size, channels=2)
+	water = textures.create_texture(size)
+	temp = textures.create_texture(size)	# capacity, water and sediment at different stages
+	colorA = textures.clone(color)
+	colorB = textures.create_texture(size, channels=4)
+	colorSamplerA = ctx.sampler(texture=colorA)
+	colorSamplerB = ctx.sampler(texture=colorB)
+
+	height.bind_to_image(BIND_HEIGHT, read=True, write=False)
+	pipe.bind_to_image(BIND_PIPE, read=True, write=True)
+	velocity.bind_to_image(BIND_VELOCITY, read=True, write=True)
+	water.bind_to_image(BIND_WATER, read=True, write=True)
+	temp.bind_to_image(BIND_TEMP, read=True, write=True)
+
+	velocity_sampler = ctx.sampler(texture=velocity, repeat_x=False, repeat_y=False)
+	velocity_sampler.use(LOC_VELOCITY)
+	velocity.use(LOC_VELOCITY)
+
+	group_x = math.ceil(size[0] / 32)
+	group_y = math.ceil(size[1] / 32)
+
+	progs = [
+		data.shaders["mei1"],
+		data.shaders["mei2"],
+		data.shaders["mei3"],
+		data.shaders["mei4"],
+		data.shaders["mei_color"],
+	]
+
+	for prog in progs[:4]:
+		prog["sparse"] = False
+
+	dt = 0.25 + 0.25 * (settings.color_detail / 100)
+	pipe_len = 1 + 2 * settings.color_speed / 100
+
+	progs[0]["d_map"].value = BIND_WATER
+	progs[0]["dt"] = dt
+	progs[0]["Ke"] = settings.color_evaporation / 100
+	progs[0]["Kr"] = (1 - (1 - (settings.color_rain / 500) ** 2) ** 0.15) * 0.1
+	progs[0]["use_water_src"] = False
+	progs[0]["rainfall"] = False
+
+	progs[1]["b_map"].value = BIND_HEIGHT
+	progs[1]["pipe_map"].value = BIND_PIPE
+	progs[1]["d_map"].value = BIND_WATER
+	progs[1]["size"] = size
+	progs[1]["lx"] = pipe_len
+	progs[1]["ly"] = pipe_len
+	progs[1]["A"] = 1
+	progs[1]["dt"] = PIPE_DT	# shared with erosion, which rescales it in the adaptive mode
+	progs[1]["drain_dt"] = PIPE_DT
+
+	progs[2]["pipe_map"].value = BIND_PIPE
+	progs[2]["d_map"].value = BIND_WATER
+	progs[2]["c_map"].value = BIND_TEMP
+	progs[2]["dt"] = dt
+	progs[2]["lx"] = pipe_len
+	progs[2]["ly"] = pipe_len
+
+	progs[3]["b_map"].value = BIND_HEIGHT
+	progs[3]["pipe_map"].value = BIND_PIPE
+	progs[3]["v_map"].value = BIND_VELOCITY
+	progs[3]["d_map"].value = BIND_WATER
+	progs[3]["dmean_map"].value = BIND_TEMP
+	progs[3]["Kc"] = 0
+	progs[3]["lx"] = pipe_len
+	progs[3]["ly"] = pipe_len
+	progs[3]["scale"] = size[0] / 2
+
+	progs[4]["v_map"].value = BIND_VELOCITY
+	progs[4]["out_color_map"].value = BIND_COLOR
+	progs[4]["color_sampler"] = LOC_COLOR
+	progs[4]["v_sampler"] = LOC_VELOCITY
+	progs[4]["dt"] = dt
+	progs[4]["color_scaling"] =  1 / (100 - 99 * (settings.color_mixing / 100))
+	progs[4]["tile_mult"] = (1 / size[0], 1 / size[1])
+
+	time = datetime.now()
+	for _ in range(settings.color_iter_num):
+		progs[0].run(group_x=group_x, group_y=group_y)
+		progs[1].run(group_x=group_x, group_y=group_y)
+		progs[2].run(group_x=group_x, group_y=group_y)
+		progs[3].run(group_x=group_x, group_y=group_y)
+	
+		colorA.use(LOC_COLOR)
+		colorSamplerA.use(LOC_COLOR)
+		
+		colorB.bind_to_image(BIND_COLOR, write=True)
+
+		progs[4].run(group_x=group_x, group_y=group_y)
+		colorA, colorB = swap(colorA, colorB)
+		colorSamplerA, colorSamplerB = swap(colorSamplerA, colorSamplerB)
+
+	ctx.finish()
+	print((datetime.now() - time).total_seconds())
+
+	height.release()
+	pipe.release()
+	velocity.release()
+	water.release()
+	temp.release()
+
+	colorB.release()
+	colorSamplerA.release()
+	colorSamplerB.release()
+
+	velocity_sampler.release()
+
+	print("Simulation finished")
+	return Result(None, {"color": colorA})
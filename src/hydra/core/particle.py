@@ -0,0 +1,344 @@
+"""Module responsible for particle-based water erosion, flow and color transport."""
+
+from Hydra.core import textures
+from Hydra.core.settings import Settings
+from Hydra.core.result import Result
+from Hydra.utils.pool import ParticlePool
+from Hydra import common
+from moderngl import Texture, ComputeShader
+
+import math
+from datetime import datetime
+
+PARTICLE_MULTIPLIER = 20
+"""Number of particles per invocation and iteration in the *fixed* dispatch mode."""
+
+ATOMIC_SCALE = 2 ** 20
+"""Fixed-point scale of height changes accumulated by atomic deposition."""
+
+STALL_VELOCITY = 1e-3
+"""Speed in heightmap units per step, below which pooled particles are considered stalled."""
+
+def particle_grid(size: tuple[int,int], density: float)->tuple[int,int]:
+	"""Calculates the number of particles in each direction for the given map size and density.
+
+	:param size: Simulated map size.
+	:type size: :class:`tuple[int,int]`
+	:param density: Particles per pixel.
+	:type density: :class:`float`
+	:return: Number of particles in each direction, padded to whole 32x32 workgroups.
+	:rtype: :class:`tuple[int,int]`"""
+	side = math.sqrt(density)
+	return (max(math.ceil(size[0] * side / 32), 1) * 32, max(math.ceil(size[1] * side / 32), 1) * 32)
+
+def run_particles(prog: ComputeShader, size: tuple[int,int], iterations: int, dispatch: str="fixed", density: float=1.0, resolve=None, multiplier: int=PARTICLE_MULTIPLIER)->None:
+	"""Dispatches a particle shader over a map of the given size.
+
+	The *fixed* mode runs a single 32x32 workgroup, where each invocation simulates
+	`multiplier` particles per iteration inside its own tile of the map.
+	The *scaled* mode launches `density` particles per pixel across as many workgroups as needed
+	and runs one dispatch per iteration.
+
+	If `resolve` is given, every particle is launched in its own pass and `resolve` is called after each pass.
+
+	:param prog: Particle shader with `tile_size`, `iterations` and `seed` uniforms.
+	:type prog: :class:`moderngl.ComputeShader`
+	:param size: Simulated map size.
+	:type size: :class:`tuple[int,int]`
+	:param iterations: Number of iterations.
+	:type iterations: :class:`int`
+	:param dispatch: Dispatch mode, either `fixed` or `scaled`.
+	:type dispatch: :class:`str`
+	:param density: Particles per pixel and iteration for the *scaled* mode.
+	:type density: :class:`float`
+	:param resolve: Optional function called after each pass.
+	:type resolve: :class:`Callable`
+	:param multiplier: Particles per invocation and iteration for the *fixed* mode.
+	:type multiplier: :class:`int`"""
+	if dispatch == "fixed":
+		prog["tile_size"] = (math.ceil(size[0] / 32), math.ceil(size[1] / 32))
+		if resolve is None:
+			prog["iterations"] = iterations * multiplier
+			prog["seed"] = 1
+			prog.run(group_x=1, group_y=1)
+			return
+
+		group_x = group_y = 1
+		passes = iterations * multiplier
+
+	else:
+		grid = particle_grid(size, density)
+		group_x = grid[0] // 32
+		group_y = grid[1] // 32
+		prog["tile_size"] = (size[0] / grid[0], size[1] / grid[1])
+		passes = iterations
+
+	prog["iterations"] = 1
+
+	for i in range(passes):
+		prog["seed"] = i + 1
+		prog.run(group_x=group_x, group_y=group_y)
+		if resolve is not None:
+			resolve()
+
+def run_pool(prog: ComputeShader, size: tuple[int,int], iterations: int, lifetime: int, density: float=1.0, acceleration: float=0.5, resolve=None)->None:
+	"""Simulates particles stored in a persistent :class:`Hydra.utils.pool.ParticlePool`.
+
+	Each iteration spawns `density` particles per pixel, which are then simulated
+	until they die, stall or leave the map. Dead particles are compacted out between passes.
+
+	:param prog: Pooled particle shader with `size` and `min_velocity` uniforms.
+	:type prog: :class:`moderngl.ComputeShader`
+	:param size: Simulated map size.
+	:type size: :class:`tuple[int,int]`
+	:param iterations: Number of iterations.
+	:type iterations: :class:`int`
+	:param lifetime: Maximum number of particle steps.
+	:type lifetime: :class:`int`
+	:param density: Particles per pixel and iteration.
+	:type density: :class:`float`
+	:param acceleration: Initial acceleration from the terrain slope.
+	:type acceleration: :class:`float`
+	:param resolve: Optional function called after each pass.
+	:type resolve: :class:`Callable`"""
+	grid = particle_grid(size, density)
+	pool = ParticlePool(grid[0] * grid[1])
+
+	prog["size"] = size
+	prog["min_velocity"] = STALL_VELOCITY / max(size)
+
+	for i in range(iterations):
+		pool.spawn(grid, size, i + 1, acceleration, prog["height_sampler"].value)
+		pool.run(prog, lifetime, resolve)
+
+	pool.release()
+
+# --------------------------------------------------------- Erosion
+
+def erode(height: Texture, settings: Settings, hardness: Texture | None = None, color: Texture | None = None)->Result:
+	"""Erodes a heightmap with particles.
+
+	:param height: Heightmap to erode. Stays unchanged.
+	:type height: :class:`moderngl.Texture`
+	:param settings: Simulation settings.
+	:type settings: :class:`Hydra.core.settings.Settings`
+	:param hardness: Optional hardness map of any size.
+	:type hardness: :class:`moderngl.Texture` or :class:`None`
+	:param color: Optional RGBA color map of the simulation size, see :func:`Hydra.core.textures.subres_size`. Its colors are moved along with the eroded material.
+	:type color: :class:`moderngl.Texture` or :class:`None`
+	:return: Eroded heightmap, and the moved colors as the `color` output.
+	:rtype: :class:`Hydra.core.result.Result`"""
+	print("Preparing for water erosion")
+	data = common.data
+	ctx = data.context
+
+	source = height
+	size = textures.subres_size(source.size, settings.erosion_subres)
+
+	if size != tuple(source.size):
+		height = textures.resize_texture(source, size)
+		height_base = textures.clone(height)
+	else:
+		height = textures.clone(source)
+		height_base = None
+
+	if hardness is not None:
+		hardness_sampler = ctx.sampler(texture=hardness, repeat_x=False, repeat_y=False)
+		hardness.use(2)
+		hardness_sampler.use(2)
+
+	transport = color is not None
+	pooled = settings.part_dispatch == "pool" and not transport # pooled particles don't carry color
+	prog = data.shaders["particle_pool" if pooled else "particle"]
+
+	height_sampler = ctx.sampler(texture=height, repeat_x=False, repeat_y=False)
+
+	height.bind_to_image(1, read=True, write=True)
+	height.use(1)
+	height_sampler.use(1)
+	prog["height_sampler"] = 1
+	prog["height_map"].value = 1
+
+	prog["hardness_sampler"] = 2
+	prog["use_hardness"] = hardness is not None
+	prog["invert_hardness"] = settings.erosion_invert_hardness
+
+	prog["tile_mult"] = (1 / size[0], 1 / size[1])
+
+	prog["erosion_strength"] = settings.part_fineness / 100
+	prog["deposition_strength"] = settings.part_deposition / 100
+	prog["capacity_factor"] = settings.part_capacity / 100
+
+	prog["max_velocity"] = 2
+	prog["acceleration"] = settings.part_acceleration / 100
+	prog["lateral_acceleration"] = settings.part_lateral_acceleration / 100
+	prog["lifetime"] = settings.part_lifetime
+	prog["max_change"] = settings.part_max_change / (100 * 100) # from percent to 0-0.01
+	prog["drag"] = 1 - (settings.part_drag / 100)
+
+	if transport:
+		color = textures.clone(color)
+		color.bind_to_image(2, read=True, write=True)
+		prog["color_map"].value = 2
+		prog["color_strength"] = settings.color_mixing / 100
+
+	if not pooled:
+		prog["transport_color"] = transport
+
+	prog["use_atomic"] = settings.part_atomic
+	if settings.part_atomic:
+		delta = textures.create_texture(size, dtype="i4")
+		delta.bind_to_image(3, read=True, write=True)	# delta_map has a fixed binding
+		prog["fixed_scale"] = ATOMIC_SCALE
+
+		resolve_prog = data.shaders["add_fixed_and_clear"]
+		resolve_prog["img_in_out"].value = 1
+		resolve_prog["fixed_scale"] = ATOMIC_SCALE
+
+		def resolve():
+			ctx.memory_barrier()
+			resolve_prog.run(group_x=math.ceil(size[0] / 32), group_y=math.ceil(size[1] / 32))
+			ctx.memory_barrier()
+	else:
+		delta = None
+		resolve = None
+
+	time = datetime.now()
+	if pooled:
+		run_pool(prog, size, settings.part_iter_num, settings.part_lifetime, settings.part_density, settings.part_acceleration / 100, resolve)
+	else:
+		dispatch = "scaled" if settings.part_dispatch == "pool" else settings.part_dispatch
+		run_particles(prog, size, settings.part_iter_num, dispatch, settings.part_density, resolve)
+	ctx.finish()
+
+	print((datetime.now() - time).total_seconds())
+
+	if delta is not None:
+		delta.release()
+
+	if hardness is not None:
+		hardness_sampler.release()
+	height_sampler.release()
+
+	if height_base is not None: # resize back to original size
+		height = textures.add_subres(height, height_base, source)
+
+	print("Erosion finished")
+	return Result(height, {"color": color} if transport else None)
+
+def transport_color(height: Texture, color: Texture, settings: Settings)->Result:
+	"""Moves colors along paths of particles flowing over a heightmap.
+
+	:param height: Heightmap to flow over. Stays unchanged.
+	:type height: :class:`moderngl.Texture`
+	:param color: RGBA color map of the heightmap size. Stays unchanged.
+	:type color: :class:`moderngl.Texture`
+	:param settings: Simulation settings.
+	:type settings: :class:`Hydra.core.settings.Settings`
+	:return: Moved colors as the `color` output.
+	:rtype: :class:`Hydra.core.result.Result`"""
+	print("Preparing for color transport")
+	data = common.data
+	ctx = data.context
+	size = tuple(height.size)
+
+	height = textures.clone(height)
+	height.bind_to_image(1, read=True, write=True)
+	height.use(1)
+	height_sampler = ctx.sampler(texture=height, repeat_x=False, repeat_y=False)
+	height_sampler.use(1)
+
+	color = textures.clone(color)
+	color.bind_to_image(2, read=True, write=True)
+
+	prog = data.shaders["particle_color"]
+
+	prog["height_map"].value = 1
+	prog["height_sampler"] = 1
+	prog["color_map"].value = 2
+
+	prog["tile_mult"] = (1 / size[0], 1 / size[1])
+
+	prog["erosion_strength"] = max(settings.color_acceleration / 100, 0.01)
+	prog["deposition_strength"] = 1 - settings.color_mixing / 100
+	prog["capacity_factor"] = max(1 - settings.color_acceleration / 100, 0.01)
+
+	prog["max_velocity"] = 2
+	prog["acceleration"] = settings.color_acceleration / 100
+	prog["lateral_acceleration"] = 1
+	prog["lifetime"] = settings.color_lifetime
+	prog["drag"] = max(1 - (settings.color_detail / 100), 0.01)
+
+	prog["color_strength"] = settings.color_mixing / 100
+
+	time = datetime.now()
+	dispatch = "scaled" if settings.part_dispatch == "pool" else settings.part_dispatch
+	run_particles(prog, size, settings.color_iter_num, dispatch, settings.part_density)
+
+	ctx.finish()
+
+	print((datetime.now() - time).total_seconds())
+
+	height_sampler.release()
+	height.release()
+
+	print("Simulation finished")
+	return Result(None, {"color": color})
+
+# --------------------------------------------------------- Flow
+
+def generate_flow(height: Texture, settings: Settings)->Result:
+	"""Simulates a flow map of particles flowing over a heightmap.
+
+	:param height: Heightmap to flow over.
+	:type height: :class:`moderngl.Texture`
+	:param settings: Simulation settings.
+	:type settings: :class:`Hydra.core.settings.Settings`
+	:return: Flow map as the `flow` output.
+	:rtype: :class:`Hydra.core.result.Result`"""
+	data = common.data
+	ctx = data.context
+	size = tuple(height.size)
+
+	amount = textures.create_texture(size)
+
+	height_sampler = ctx.sampler(texture=height, repeat_x=False, repeat_y=False)
+	height.use(1)
+	height_sampler.use(1)
+
+	pooled = settings.part_dispatch == "pool"
+	prog = data.shaders["flow_pool" if pooled else "flow"]
+	prog["height_sampler"] = 1
+	amount.bind_to_image(2, read=True, write=True)
+	prog["flow"].value = 2
+
+	prog["tile_mult"] = (1 / size[0], 1 / size[1])
+
+	# map to aesthetic range 0.0003-0.2
+	prog["strength"] = 0.2*math.exp(-6.61*(1 - settings.flow_brightness / 100))
+
+	prog["acceleration"] = settings.part_acceleration / 100
+	prog["lifetime"] = settings.part_lifetime
+	prog["drag"] = 1-(settings.part_drag / 100)	# multiplicative factor
+
+	time = datetime.now()
+	if pooled:
+		run_pool(prog, size, settings.flow_iter_num, settings.part_lifetime, settings.part_density, settings.part_acceleration / 100)
+	else:
+		run_particles(prog, size, settings.flow_iter_num, settings.part_dispatch, settings.part_density, multiplier=1)
+	ctx.finish()
+
+	final_amount = textures.create_texture(amount.size)
+	final_amount.bind_to_image(3, read=True, write=True)
+	prog = data.shaders["plug"]
+	prog["inMap"].value = 2
+	prog["outMap"].value = 3
+
+	prog.run(group_x=size[0], group_y=size[1])
+
+	print((datetime.now() - time).total_seconds())
+
+	amount.release()
+	height_sampler.release()
+
+	return Result(None, {"flow": final_amount})
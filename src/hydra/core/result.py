@@ -0,0 +1,67 @@
+"""Module defining simulation results."""
+
+import numpy as np
+import moderngl as mgl
+from Hydra import common
+from Hydra.core import textures
+
+class Result:
+	"""Outputs of a simulation. Maps are arrays or textures depending on the backend. Textures are owned by the result and have to be released by the caller."""
+	def __init__(self, height: mgl.Texture | None, outputs: dict[str, mgl.Texture] | None = None, state: common.SolverState | None = None, iterations: int | None = None):
+		"""Constructor method.
+
+		:param height: Resulting heightmap, or `None` if the simulation doesn't change it.
+		:type height: :class:`moderngl.Texture` or :class:`None`
+		:param outputs: Additional output maps by name, e.g. `water` or `color`.
+		:type outputs: :class:`dict[str, moderngl.Texture]` or :class:`None`
+		:param state: State a later simulation can resume or start from.
+		:type state: :class:`Hydra.common.SolverState` or :class:`None`
+		:param iterations: Number of iterations actually run, if the simulation stopped early.
+		:type iterations: :class:`int` or :class:`None`"""
+		self.height = height
+		self.outputs = outputs if outputs is not None else {}
+		self.state = state
+		self.iterations = iterations
+
+	def release(self)->None:
+		"""Releases all stored textures, including the state. Arrays are dropped."""
+		for txt in [self.height, *self.outputs.values()]:
+			if isinstance(txt, mgl.Texture):
+				txt.release()
+		self.height = None
+		self.outputs = {}
+
+		if self.state is not None:
+			self.state.release()
+			self.state = None
+
+	def to_arrays(self)->'Result':
+		"""Reads the heightmap and outputs into NumPy arrays and releases their textures. The state stays on its backend.
+
+		:return: This result with :class:`numpy.ndarray` maps.
+		:rtype: :class:`Result`"""
+		if isinstance(self.height, mgl.Texture):
+			txt = self.height
+			self.height = textures.to_array(txt)
+			txt.release()
+
+		for name, txt in list(self.outputs.items()):
+			if isinstance(txt, mgl.Texture):
+				self.outputs[name] = textures.to_array(txt)
+				txt.release()
+
+		return self
+
+	def to_textures(self)->'Result':
+		"""Uploads array heightmap and outputs into textures, e.g. after a NumPy simulation on texture inputs.
+
+		:return: This result with :class:`moderngl.Texture` maps.
+		:rtype: :class:`Result`"""
+		if isinstance(self.height, np.ndarray):
+			self.height = textures.from_array(self.height)
+
+		for name, array in list(self.outputs.items()):
+			if isinstance(array, np.ndarray):
+				self.outputs[name] = textures.from_array(array)
+
+		return self
@@ -0,0 +1,114 @@
+"""Module defining simulation settings independent of Blender."""
+
+from dataclasses import dataclass, field, fields
+
+@dataclass
+class Settings:
+	"""Simulation parameters. Field names, units and defaults match :class:`Hydra.addon.properties.ErosionGroup`,
+	so percentages are in the range 0-100 and angles are in radians."""
+
+	scale_ratio: float = 1.0
+	"""Ratio of the Y pixel size to the X pixel size."""
+
+	#------------------------- Water erosion
+
+	erosion_subres: float = 50.0
+	"""Simulation resolution in percent of the map resolution."""
+	erosion_invert_hardness: bool = False
+	"""Inverts the hardness map."""
+
+	#------------------------- Particle
+
+	part_iter_num: int = 50
+	part_lifetime: int = 25
+	part_acceleration: float = 50.0
+	part_lateral_acceleration: float = 100.0
+	part_drag: float = 25.0
+	part_deposition: float = 75.0
+	part_fineness: float = 10.0
+	part_capacity: float = 25.0
+	part_dispatch: str = "fixed"
+	"""Particle dispatch mode, one of `fixed`, `scaled` or `pool`."""
+	part_density: float = 0.1
+	part_atomic: bool = False
+	part_max_change: float = 100.0
+
+	#------------------------- Mei
+
+	mei_iter_num: int = 100
+	mei_resume: bool = True
+	"""Returns the final water state, so that a later simulation can resume from it."""
+	mei_sparse: bool = False
+	mei_time_step: str = "fixed"
+	"""Time stepping mode, either `fixed` or `adaptive`."""
+	mei_outputs: set[str] = field(default_factory=set)
+	"""Additional outputs, any of `water`, `sediment` and `velocity`."""
+	mei_duration: float = 10.0
+	mei_rain: float = 25.0
+	mei_capacity: float = 50.0
+	mei_hardness: float = 50.0
+	mei_randomize: bool = False
+	mei_max_depth: float = 10.0
+	mei_variant: str = "separate"
+	"""Kernel variant, either `separate` or `fused`."""
+
+	#------------------------- Thermal
+
+	thermal_iter_num: int = 100
+	thermal_angle: float = 1.047198
+	thermal_strength: float = 100.0
+	thermal_solver: str = "both"
+	"""Neighborhood type, one of `both`, `cardinal` or `diagonal`."""
+	thermal_kernel: str = "requests"
+	"""Kernel type, either `requests` or `inplace`. Also used for snow."""
+	thermal_multigrid: bool = False
+	thermal_stride: int = 1
+	thermal_stride_grad: bool = False
+
+	#------------------------- Convergence
+
+	warm_start: bool = False
+	"""Returns a state that later thermal erosion or snow simulations can start from."""
+	stop_early: bool = False
+	stop_tolerance: float = 1e-6
+	stop_interval: int = 10
+	stop_metric: str = "max"
+	"""Change metric, either `max` or `mean`."""
+
+	#------------------------- Snow
+
+	snow_add: float = 50.0
+	snow_iter_num: int = 500
+	snow_angle: float = 0.663225
+	snow_output: str = "both"
+	"""Output type, one of `both`, `texture` or `displacement`."""
+
+	#------------------------- Flow
+
+	flow_iter_num: int = 200
+	flow_brightness: float = 50.0
+
+	#------------------------- Color
+
+	color_solver: str = "particle"
+	"""Color transport solver, either `particle` or `pipe`."""
+	color_iter_num: int = 100
+	color_mixing: float = 50.0
+	color_rain: float = 10.0
+	color_evaporation: float = 1.0
+	color_detail: float = 50.0
+	color_acceleration: float = 50.0
+	color_lifetime: int = 50
+	color_speed: float = 25.0
+
+	@classmethod
+	def from_group(cls, group)->'Settings':
+		"""Copies settings from an object with the same attributes, e.g. an `ErosionGroup`.
+
+		:param group: Settings source.
+		:type group: :class:`Hydra.addon.properties.ErosionGroup`
+		:return: Copied settings.
+		:rtype: :class:`Settings`"""
+		values = {f.name: getattr(group, f.name) for f in fields(cls)}
+		values["mei_outputs"] = set(values["mei_outputs"])
+		return cls(**values)
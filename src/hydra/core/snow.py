@@ -0,0 +1,185 @@
+"""Module responsible for snow simulation."""
+
+from Hydra.core import textures, thermal
+from Hydra.core.settings import Settings
+from Hydra.core.result import Result
+from Hydra.utils.reduction import ChangeMonitor
+from Hydra import common
+from moderngl import Texture
+import math
+from datetime import datetime
+
+SNOW_SCALE = 0.01
+"""Height of snow at 100% snow amount."""
+
+# --------------------------------------------------------- Snow
+
+def warm_params(settings: Settings)->dict:
+	"""Returns the parameters that a cached state has to match exactly to be reused.
+	The maximum angle is matched separately and cached snow is rescaled to a new amount.
+
+	:param settings: Simulation settings.
+	:type settings: :class:`Hydra.core.settings.Settings`
+	:return: Parameters affecting the converged snow.
+	:rtype: :class:`dict`"""
+	return {
+		"iter_num": settings.snow_iter_num,
+		"kernel": settings.thermal_kernel,
+		"scale_ratio": settings.scale_ratio,
+		"tolerance": settings.stop_tolerance,
+		"interval": settings.stop_interval,
+		"metric": settings.stop_metric,
+	}
+
+def simulate(offset: Texture, settings: Settings, warm: common.SolverState | None = None)->Result:
+	"""Simulates snow sliding on a heightmap.
+
+	:param offset: Heightmap to place snow on. Stays unchanged.
+	:type offset: :class:`moderngl.Texture`
+	:param settings: Simulation settings.
+	:type settings: :class:`Hydra.core.settings.Settings`
+	:param warm: Optional state of a previous simulation on the same heightmap to start from.
+	:type warm: :class:`Hydra.common.SolverState` or :class:`None`
+	:return: Heightmap with snow unless `snow_output` is `texture`, snow amount normalized to 0-1 as the `snow` output unless `snow_output` is `displacement`,
+		and a state to start from next time if `warm_start` is set and the snow converged.
+	:rtype: :class:`Hydra.core.result.Result`"""
+	data = common.data
+	ctx = data.context
+
+	print("Preparing for snow simulation")
+
+	size = tuple(offset.size)
+
+	texture_only = settings.snow_output == "texture"
+
+	if warm is not None:
+		print("Starting from cached state")
+		snow = textures.clone(warm.textures["snow"])
+	else:
+		snow = textures.create_texture(size)
+
+	inplace = settings.thermal_kernel == "inplace"
+	if inplace:
+		progA = data.shaders["thermal_rb"]
+	else:
+		request = textures.create_texture(size, channels=4)
+		free = textures.create_texture(size)
+
+		progA = data.shaders["thermalA"]
+		progB = data.shaders["thermalB"]
+	snowProg = data.shaders["snow"]
+
+	mapI = 1
+	mapO = 3
+	temp = 3
+
+	snow.bind_to_image(1, read=True, write=True)
+	if not inplace:
+		request.bind_to_image(2, read=True, write=True)
+		free.bind_to_image(3, read=True, write=True)
+	offset.bind_to_image(4, read=True, write=False)
+
+	progA["Ks"] = 0.5
+	progA["alpha"] = math.tan(settings.snow_angle) * 2 / size[0] # images are scaled to 2 z/x -> angle depends only on image width
+	progA["by"] = settings.scale_ratio
+	progA["offset"].value = 4
+	progA["useOffset"] = True
+	progA["ds"] = 1
+	progA["size"] = size
+
+	if not inplace:
+		progA["requests"].value = 2
+		progB["requests"].value = 2
+		progB["ds"] = 1
+
+	snowProg["snow_add"] = (settings.snow_add / 100) * SNOW_SCALE
+
+	group_x = math.ceil(size[0] / 32)
+	group_y = math.ceil(size[1] / 32)
+
+	if warm is not None: # rescale cached snow to the new amount
+		prog = data.shaders["scaling"]
+		prog["A"].value = mapI
+		prog["scale"] = settings.snow_add / warm.params["snow_add"]
+		prog.run(group_x = size[0], group_y = size[1])
+	else:
+		snowProg["mapH"].value = mapI
+		snowProg.run(group_x = group_x, group_y = group_y)
+
+	# warm starts are close to convergence -> always check, cached states have to be converged
+	monitor = ChangeMonitor(snow, settings.stop_tolerance, settings.stop_interval, settings.stop_metric) if settings.stop_early or settings.warm_start or warm is not None else None
+	iterations = settings.snow_iter_num
+
+	time = datetime.now()
+	for i in range(settings.snow_iter_num):
+		diagonal = (i&1) == 1
+
+		if inplace:
+			progA["mapH"].value = mapI
+			thermal.run_inplace(progA, size, diagonal, 1, i // 2) # alternate halves between pairs of cardinal and diagonal iterations
+		else:
+			progA["diagonal"] = diagonal
+			progA["mapH"].value = mapI
+			progA.run(group_x = group_x, group_y = group_y)
+
+			progB["diagonal"] = diagonal
+			progB["mapH"].value = mapI
+			progB["outH"].value = mapO
+			progB.run(group_x = group_x, group_y = group_y)
+
+			temp = mapI
+			mapI = mapO
+			mapO = temp
+
+		if monitor is not None and monitor.check(snow if mapI == 1 else free, i + 1, mapI, 5):
+			iterations = i + 1
+			break
+
+	ctx.finish()
+
+	print((datetime.now() - time).total_seconds())
+
+	if mapI != 1: # result is in the ping-pong texture
+		snow, free = free, snow
+
+	converged = monitor is not None and monitor.converged
+	if monitor is not None:
+		monitor.report(iterations)
+		monitor.release()
+
+	if settings.warm_start and converged:
+		params = {"angle": settings.snow_angle, "snow_add": settings.snow_add, **warm_params(settings)}
+		state = common.SolverState("snow", {"snow": textures.clone(snow)}, params)
+	else:
+		state = None
+
+	outputs = {}
+
+	if settings.snow_output != "displacement":
+		snow_img = snow if texture_only else textures.clone(snow)
+		snow_img.bind_to_image(5, read=True, write=True)
+		prog = data.shaders["scaling"]
+		prog["A"].value = 5	# snow
+		prog["scale"] = 1 / (SNOW_SCALE * settings.snow_add / 100)
+		prog.run(group_x = size[0], group_y = size[1])
+
+		outputs["snow"] = snow_img
+
+	if settings.snow_output != "texture":
+		prog = data.shaders["scaled_add"]
+		prog["A"].value = mapI
+		prog["B"].value = 4	# offset - source map
+		prog["factor"] = 1.0
+		prog["scale"] = 1.0
+		prog.run(group_x = size[0], group_y = size[1])
+		height = snow
+	else:
+		height = None
+
+	if not inplace:
+		request.release()
+		free.release()
+
+	print("Simulation finished")
+
+	return Result(height, outputs, state, iterations if monitor is not None else None)
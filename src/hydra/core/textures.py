@@ -0,0 +1,209 @@
+"""Module responsible for ModernGL textures and conversion from and to NumPy arrays."""
+
+import numpy as np
+import moderngl as mgl
+import math
+from Hydra import common
+
+# --------------------------------------------------------- Creation
+
+def create_vao(ctx: mgl.Context, program: mgl.Program, vertices:list[tuple[float]]=None, indices:list[int]=None)->mgl.VertexArray:
+	"""Creates a :class:`moderngl.VertexArray` object.
+
+	:param ctx: ModernGL context.
+	:type ctx: :class:`moderngl.Context`
+	:param program: Program to bind to the VAO.
+	:type program: :class:`moderngl.Program`
+	:param vertices: Optional list of 3D vertex position.
+	:type vertices: :class:`list[tuple[float, float, float]]`
+	:param indices: Optional list of vertex indices.
+	:type indices: :class:`list[int]`
+	:return: Created VAO object.
+	:rtype: :class:`moderngl.VertexArray`"""
+	if vertices is None:
+		vertices = [(1,1,0), (1,-1,0), (-1,-1,0), (1,1,0), (-1,-1,0),  (-1,1,0)]
+		indices = None
+
+	vbo = ctx.buffer(data=np.array(vertices).astype('f4').tobytes())
+	if indices is None:
+		return ctx.vertex_array(
+			program=program,
+			content=[(vbo, "3f", "position")]
+		)
+	else:
+		ind = ctx.buffer(data=np.array(indices).tobytes())
+		return ctx.vertex_array(
+			program=program,
+			content=[(vbo, "3f", "position")], index_buffer=ind
+		)
+
+def create_texture(size: tuple[int,int], pixels: bytes|None = None, channels: int = 1, dtype: str = "f4")->mgl.Texture:
+	"""Creates a :class:`moderngl.Texture` of the specified size.
+
+	:param size: Resolution tuple.
+	:type size: :class:`tuple[int,int]`
+	:param pixels: Pixel data. The texture is cleared to zero if not specified.
+	:type pixels: :class:`bytes`
+	:param channels: Channel count.
+	:type channels: :class:`int`
+	:param dtype: ModernGL data type of the texture.
+	:type dtype: :class:`str`
+	:return: Created texture.
+	:rtype: :class:`moderngl.Texture`"""
+	if channels < 1 or channels > 4:
+		raise ValueError("Invalid channel count")
+
+	if pixels is None:	#pixels have to be cleared to zero if not specified!
+		pixels = np.zeros(size[0] * size[1] * channels, dtype=dtype).tobytes()
+	return common.data.context.texture(size, channels, dtype=dtype, data=pixels)
+
+def clone(txt: mgl.Texture)->mgl.Texture:
+	"""Clones a :class:`moderngl.Texture`.
+
+	:param txt: Texture to be cloned.
+	:type txt: :class:`mgl.Texture`
+	:return: Created texture.
+	:rtype: :class:`moderngl.Texture`"""
+	return common.data.context.texture(txt.size, txt.components, dtype="f4", data=txt.read())
+
+# --------------------------------------------------------- NumPy
+
+def from_array(array: np.ndarray)->mgl.Texture:
+	"""Creates a texture from a NumPy array.
+
+	:param array: Array of shape `(height, width)` or `(height, width, channels)`. Row 0 is the first texture row.
+	:type array: :class:`numpy.ndarray`
+	:return: Created 32-bit float texture.
+	:rtype: :class:`moderngl.Texture`"""
+	if array.ndim not in (2, 3):
+		raise ValueError("Expected an array of shape (height, width) or (height, width, channels)")
+	channels = 1 if array.ndim == 2 else array.shape[2]
+	pixels = np.ascontiguousarray(array, dtype=np.float32).tobytes()
+	return create_texture((array.shape[1], array.shape[0]), pixels, channels=channels)
+
+def to_array(txt: mgl.Texture)->np.ndarray:
+	"""Reads a texture into a NumPy array.
+
+	:param txt: Texture to read.
+	:type txt: :class:`moderngl.Texture`
+	:return: Array of shape `(height, width)` for single channel textures, `(height, width, channels)` otherwise.
+	:rtype: :class:`numpy.ndarray`"""
+	array = np.frombuffer(txt.read(), dtype=np.float32)
+	if txt.components == 1:
+		return array.reshape(txt.height, txt.width).copy()
+	return array.reshape(txt.height, txt.width, txt.components).copy()
+
+# --------------------------------------------------------- Operations
+
+def subres_size(size: tuple[int,int], subres: float)->tuple[int,int]:
+	"""Calculates the simulation size of a map simulated at a fraction of its resolution.
+
+	:param size: Map size.
+	:type size: :class:`tuple[int,int]`
+	:param subres: Simulation resolution in percent.
+	:type subres: :class:`float`
+	:return: Simulation size.
+	:rtype: :class:`tuple[int,int]`"""
+	if subres == 100.0:
+		return tuple(size)
+	return (math.ceil(size[0] * subres / 100.0), math.ceil(size[1] * subres / 100.0))
+
+def subtract(modified: mgl.Texture, base: mgl.Texture, factor: float = 1.0, scale: float = 1.0)->mgl.Texture:
+	"""Subtracts given textures and returns difference relative to `base` as a result. Also scales result if needed.
+
+	:param modified: Current heightmap. Minuend.
+	:type modified: :class:`moderngl.Texture`
+	:param base: Base heightmap. Subtrahend.
+	:type base: :class:`moderngl.Texture`
+	:param scale: Scale factor for the result.
+	:type scale: :class:`float`
+	:param factor: Multiplication factor for the second texture.
+	:type factor: :class:`float`
+	:return: A texture equal to (scale * (modified - factor * base)).
+	:rtype: :class:`moderngl.Texture`"""
+	return add(modified, base, -factor, scale)
+
+def add(A: mgl.Texture, B: mgl.Texture, factor: float = 1.0, scale: float = 1.0, )->mgl.Texture:
+	"""Adds given textures and returns the result.
+
+	:param A: First texture.
+	:type A: :class:`moderngl.Texture`
+	:param B: Second texture.
+	:type B: :class:`moderngl.Texture`
+	:param scale: Scale factor for the result.
+	:type scale: :class:`float`
+	:param factor: Multiplication factor for the second texture.
+	:type factor: :class:`float`
+	:return: A texture equal to (scale * (A + factor * B)).
+	:rtype: :class:`moderngl.Texture`"""
+	txt = clone(A)
+	prog: mgl.ComputeShader = common.data.shaders["scaled_add"]
+	txt.bind_to_image(1, read=True, write=True)
+	prog["A"].value = 1
+	B.bind_to_image(2, read=True, write=False)
+	prog["B"].value = 2
+	prog["factor"] = factor
+	prog["scale"] = scale
+	# A = scale * (A + factor * B)
+	prog.run(A.width, A.height)
+
+	common.data.context.finish()
+	return txt
+
+def resize_texture(texture: mgl.Texture, target_size: tuple[int, int])->mgl.Texture:
+	"""Resizes a texture to the specified size.
+
+	:param texture: Texture to resize.
+	:type texture: :class:`moderngl.Texture`
+	:param target_size: New size.
+	:type target_size: :class:`tuple`
+	:return: Resized texture.
+	:rtype: :class:`moderngl.Texture`"""
+	prog: mgl.Program = common.data.programs["resize"]
+	ctx: mgl.Context = common.data.context
+
+	ret = ctx.texture(target_size, 1, dtype='f4')
+	sampler = ctx.sampler(texture=texture, repeat_x=False, repeat_y=False)
+	fbo = ctx.framebuffer(color_attachments=(ret))
+
+	vao = create_vao(ctx, prog)
+
+	with ctx.scope(fbo):
+		fbo.clear()
+		texture.use(1)
+		sampler.use(1)
+		vao.program["in_texture"] = 1
+		vao.render()
+		ctx.finish()
+
+	sampler.release()
+	vao.release()
+	fbo.release()
+
+	return ret
+
+def add_subres(height: mgl.Texture, height_prior: mgl.Texture, height_prior_fullres: mgl.Texture)->mgl.Texture:
+	"""Adds a resized difference to the original heightmap.
+
+	Releases height_prior and height.
+
+	:param height: Resulting heightmap to add.
+	:type height: :class:`moderngl.Texture`
+	:param height_prior: Previous heightmap for difference calculation.
+	:type height_prior: :class:`moderngl.Texture`
+	:param height_prior_fullres: Full resolution previous heightmap to add to.
+	:type height_prior_fullres: :class:`moderngl.Texture`
+	:return: New heightmap.
+	:rtype: :class:`moderngl.Texture`"""
+
+	dif = subtract(height, height_prior) # get difference
+	height_prior.release()
+	height.release()
+
+	height = resize_texture(dif, height_prior_fullres.size) # resize difference
+	dif.release()
+
+	nh = add(height, height_prior_fullres) # add difference to original
+	height.release()
+
+	return nh
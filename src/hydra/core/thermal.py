@@ -0,0 +1,261 @@
+"""Module responsible for thermal erosion."""
+
+from Hydra.core import textures
+from Hydra.core.settings import Settings
+from Hydra.core.result import Result
+from Hydra.utils.reduction import ChangeMonitor
+from Hydra import common
+import math
+from moderngl import ComputeShader, Texture
+from datetime import datetime
+
+MULTIGRID_SMOOTHING = 2
+"""Relaxation iterations on each level before and after visiting the coarser level."""
+
+MULTIGRID_COARSE_ITERATIONS = 16
+"""Relaxation iterations on the coarsest level."""
+
+MULTIGRID_MIN_SIZE = 32
+"""Smallest side of the coarsest multigrid level."""
+
+def run_inplace(prog: ComputeShader, size: tuple[int,int], diagonal: bool, stride: int, iteration: int)->None:
+	"""Runs one iteration of the in-place `thermal_rb` kernel.
+
+	Material is moved between pairs of neighboring cells along two directions. Each direction is split
+	into two checkerboard-like halves of disjoint pairs, which are updated one after the other.
+	The order of the halves alternates between iterations to avoid a directional bias.
+
+	:param prog: In-place thermal shader with heightmap and erosion uniforms already set.
+	:type prog: :class:`moderngl.ComputeShader`
+	:param size: Map size.
+	:type size: :class:`tuple[int,int]`
+	:param diagonal: Moves material along diagonals instead of the XY directions.
+	:type diagonal: :class:`bool`
+	:param stride: Distance between paired cells in pixels.
+	:type stride: :class:`int`
+	:param iteration: Index of the iteration.
+	:type iteration: :class:`int`"""
+	ctx = common.data.context
+	prog["ds"] = stride
+
+	directions = ((1, 1), (1, -1)) if diagonal else ((1, 0), (0, 1))
+	parities = (1, 0) if iteration & 1 else (0, 1)
+
+	for direction in directions:
+		# one invocation per pair -> half the cells along the paired axis
+		paired = (math.ceil((size[0] + stride) / 2), size[1]) if direction[0] != 0 else (size[0], math.ceil((size[1] + stride) / 2))
+		prog["direction"] = direction
+		for parity in parities:
+			prog["parity"] = parity
+			prog.run(group_x=math.ceil(paired[0] / 32), group_y=math.ceil(paired[1] / 32))
+			ctx.memory_barrier()
+
+def relax(prog: ComputeShader, height: Texture, angle: float, solver: str, iterations: int)->None:
+	"""Runs in-place thermal erosion on a heightmap of any size.
+
+	:param prog: In-place thermal shader with strength uniforms already set.
+	:type prog: :class:`moderngl.ComputeShader`
+	:param height: Heightmap to erode.
+	:type height: :class:`moderngl.Texture`
+	:param angle: Maximum surface angle.
+	:type angle: :class:`float`
+	:param solver: Neighborhood type, one of `both`, `cardinal` or `diagonal`.
+	:type solver: :class:`str`
+	:param iterations: Number of iterations.
+	:type iterations: :class:`int`"""
+	height.bind_to_image(1, read=True, write=True)
+	prog["mapH"].value = 1
+	prog["size"] = height.size
+	prog["alpha"] = math.tan(angle) * 2 / height.size[0] # talus per pixel grows with pixel size
+
+	for i in range(iterations):
+		if solver == "both":
+			run_inplace(prog, height.size, (i&1) == 1, 1, i // 2)
+		else:
+			run_inplace(prog, height.size, solver == "diagonal", 1, i)
+
+def v_cycle(prog: ComputeShader, height: Texture, angle: float, solver: str)->Texture:
+	"""Runs a single multigrid V-cycle of thermal erosion.
+
+	The heightmap is relaxed, restricted to half resolution and recursively eroded there,
+	which moves material over long distances in few iterations. The coarse change is then
+	added back at full resolution and relaxed again to restore detail.
+
+	Releases `height`.
+
+	:param prog: In-place thermal shader with strength uniforms already set.
+	:type prog: :class:`moderngl.ComputeShader`
+	:param height: Heightmap to erode.
+	:type height: :class:`moderngl.Texture`
+	:param angle: Maximum surface angle.
+	:type angle: :class:`float`
+	:param solver: Neighborhood type, one of `both`, `cardinal` or `diagonal`.
+	:type solver: :class:`str`
+	:return: Eroded textures.
+	:rtype: :class:`moderngl.Texture`"""
+	coarse_size = (math.ceil(height.size[0] / 2), math.ceil(height.size[1] / 2))
+	if min(coarse_size) < MULTIGRID_MIN_SIZE:
+		relax(prog, height, angle, solver, MULTIGRID_COARSE_ITERATIONS)
+		return height
+
+	relax(prog, height, angle, solver, MULTIGRID_SMOOTHING)
+
+	coarse = textures.resize_texture(height, coarse_size)
+	coarse_prior = textures.clone(coarse)
+	coarse = v_cycle(prog, coarse, angle, solver)
+
+	fine = textures.add_subres(coarse, coarse_prior, height)
+	height.release()
+
+	relax(prog, fine, angle, solver, MULTIGRID_SMOOTHING)
+	return fine
+
+# --------------------------------------------------------- Erosion
+
+def warm_params(settings: Settings)->dict:
+	"""Returns the parameters that a cached state has to match exactly to be reused. The maximum angle is matched separately.
+
+	:param settings: Simulation settings.
+	:type settings: :class:`Hydra.core.settings.Settings`
+	:return: Parameters affecting the converged map.
+	:rtype: :class:`dict`"""
+	return {
+		"solver": settings.thermal_solver,
+		"strength": settings.thermal_strength,
+		"iter_num": settings.thermal_iter_num,
+		"kernel": settings.thermal_kernel,
+		"multigrid": settings.thermal_multigrid,
+		"stride": settings.thermal_stride,
+		"stride_grad": settings.thermal_stride_grad,
+		"scale_ratio": settings.scale_ratio,
+		"tolerance": settings.stop_tolerance,
+		"interval": settings.stop_interval,
+		"metric": settings.stop_metric,
+	}
+
+def erode(height: Texture, settings: Settings, warm: common.SolverState | None = None)->Result:
+	"""Erodes a heightmap until its slopes are below the maximum angle.
+
+	:param height: Heightmap to erode. Stays unchanged.
+	:type height: :class:`moderngl.Texture`
+	:param settings: Simulation settings.
+	:type settings: :class:`Hydra.core.settings.Settings`
+	:param warm: Optional state of a previous erosion of the same heightmap to start from.
+	:type warm: :class:`Hydra.common.SolverState` or :class:`None`
+	:return: Eroded heightmap, and a state to start from next time if `warm_start` is set and the map converged.
+	:rtype: :class:`Hydra.core.result.Result`"""
+	data = common.data
+	ctx = data.context
+
+	print("Preparing for thermal erosion")
+
+	size = tuple(height.size)
+
+	if warm is not None:
+		print("Starting from cached state")
+		height = textures.clone(warm.textures["height"])
+	else:
+		height = textures.clone(height)
+
+	multigrid = settings.thermal_multigrid
+	inplace = settings.thermal_kernel == "inplace" or multigrid # multigrid relaxes levels of any size in place
+	if inplace:
+		request = free = None
+		progA = data.shaders["thermal_rb"]
+	else:
+		request = textures.create_texture(size, channels=4)
+		free = textures.create_texture(size)
+
+		progA = data.shaders["thermalA"]
+		progB = data.shaders["thermalB"]
+
+	mapI = 1
+	mapO = 3
+	temp = 3
+
+	height.bind_to_image(1, read=True, write=True)
+	if not inplace:
+		request.bind_to_image(2, read=True, write=True)
+		free.bind_to_image(3, read=True, write=True)
+
+	stride = settings.thermal_stride
+	if settings.thermal_stride_grad:
+		next_pass = settings.thermal_iter_num // 2
+
+	progA["Ks"] = (settings.thermal_strength / 100) * 0.5	#0-1 -> 0-0.5, higher is unstable
+	progA["alpha"] = math.tan(settings.thermal_angle) * 2 / size[0] # images are scaled to 2 z/x -> angle depends only on image width
+	progA["by"] = settings.scale_ratio
+	progA["useOffset"] = False
+	progA["size"] = size
+
+	if not inplace:
+		progA["requests"].value = 2
+		progB["requests"].value = 2
+
+	diagonal = settings.thermal_solver == "diagonal"
+	alternate = settings.thermal_solver == "both"
+
+	group_x = math.ceil(size[0] / 32)
+	group_y = math.ceil(size[1] / 32)
+
+	# warm starts are close to convergence -> always check, cached states have to be converged
+	monitor = ChangeMonitor(height, settings.stop_tolerance, settings.stop_interval, settings.stop_metric) if settings.stop_early or settings.warm_start or warm is not None else None
+	iterations = settings.thermal_iter_num
+
+	time = datetime.now()
+	for i in range(settings.thermal_iter_num):
+		if alternate:
+			diagonal = (i&1) == 1
+
+		if multigrid:
+			height = v_cycle(progA, height, settings.thermal_angle, settings.thermal_solver)
+		elif inplace:
+			progA["mapH"].value = mapI
+			run_inplace(progA, size, diagonal, stride, i // 2 if alternate else i)
+		else:
+			progA["diagonal"] = diagonal
+			progA["mapH"].value = mapI
+			progA["ds"] = stride
+			progA.run(group_x = group_x, group_y = group_y)
+
+			progB["diagonal"] = diagonal
+			progB["mapH"].value = mapI
+			progB["outH"].value = mapO
+			progB["ds"] = stride
+			progB.run(group_x = group_x, group_y = group_y)
+			
+			temp = mapI
+			mapI = mapO
+			mapO = temp
+
+		if settings.thermal_stride_grad and i >= next_pass:
+			stride = math.ceil(stride / 2)
+			next_pass += (settings.thermal_iter_num - i) // 2
+
+		if monitor is not None and monitor.check(height if mapI == 1 else free, i + 1, mapI, 5):
+			iterations = i + 1
+			break
+
+	ctx.finish()
+	print((datetime.now() - time).total_seconds())
+
+	if mapI != 1: # result is in the ping-pong texture
+		height, free = free, height
+
+	converged = monitor is not None and monitor.converged
+	if monitor is not None:
+		monitor.report(iterations)
+		monitor.release()
+	
+	if settings.warm_start and converged:
+		params = {"angle": settings.thermal_angle, **warm_params(settings)}
+		state = common.SolverState("thermal", {"height": textures.clone(height)}, params)
+	else:
+		state = None
+
+	if not inplace:
+		free.release()
+		request.release()
+
+	print("Erosion finished")
+	return Result(height, None, state, iterations if monitor is not None else None)
@@ -0,0 +1,197 @@
+"""Module responsible for simulating maps larger than a texture, or than video memory allows, in overlapping tiles.
+
+The map and the simulation state are kept in host memory, or in memory-mapped files for maps larger than it.
+Simulations run in rounds of a few iterations.
+Each round simulates every tile together with a halo of surrounding cells, and keeps only the tile itself.
+Halos are read from the previous round, so changes spread across tile edges as on a single texture."""
+
+import numpy as np
+import math, tempfile
+from pathlib import Path
+from dataclasses import replace
+from Hydra import common
+from Hydra.core import textures, thermal, mei
+from Hydra.core.cpu import textures as cpu_textures
+from Hydra.core.settings import Settings
+from Hydra.core.result import Result
+
+TILE_SIZE = 4096
+"""Default tile size without halos. A pipe-model tile uses about 12 float channels, which is under 1 GB."""
+
+HALO = 64
+"""Default halo width in cells."""
+
+ALIGNMENT = 32
+"""Tile sizes and halos are rounded to multiples of this, which keeps checkerboard and stride patterns aligned."""
+
+THERMAL_REACH = 2
+"""Cells that changes spread in one thermal iteration at a stride of 1."""
+
+MEI_REACH = 40
+"""Cells that changes spread in one pipe-model iteration of 10 steps."""
+
+TILED_SOLVERS = ("thermal", "mei")
+"""Simulations that can run in tiles, by backend solver name."""
+
+def split(size: tuple[int,int], tile_size: int, halo: int)->list[tuple[tuple[int,int,int,int], tuple[int,int,int,int]]]:
+	"""Splits a map into tiles.
+
+	:param size: Map size.
+	:type size: :class:`tuple[int,int]`
+	:param tile_size: Tile size without halos.
+	:type tile_size: :class:`int`
+	:param halo: Halo width.
+	:type halo: :class:`int`
+	:return: Tiles and tiles with halos, clamped to the map, as `(x0, y0, x1, y1)`.
+	:rtype: :class:`list[tuple[tuple[int,int,int,int], tuple[int,int,int,int]]]`"""
+	ret = []
+	for y in range(0, size[1], tile_size):
+		for x in range(0, size[0], tile_size):
+			tile = (x, y, min(x + tile_size, size[0]), min(y + tile_size, size[1]))
+			window = (max(x - halo, 0), max(y - halo, 0), min(tile[2] + halo, size[0]), min(tile[3] + halo, size[1]))
+			ret.append((tile, window))
+	return ret
+
+def _halo(fields: dict[str, np.ndarray], tile: tuple[int,int,int,int], window: tuple[int,int,int,int])->list[tuple[tuple[int,int,int,int], dict[str, np.ndarray]]]:
+	"""Copies the halo of a tile as four strips, as neighboring tiles overwrite it during a round."""
+	x0, y0, x1, y1 = tile
+	hx0, hy0, hx1, hy1 = window
+	strips = [(hx0, hy0, hx1, y0), (hx0, y1, hx1, hy1), (hx0, y0, x0, y1), (x1, y0, hx1, y1)]
+	return [(s, {name: array[s[1]:s[3], s[0]:s[2]].copy() for name, array in fields.items()}) for s in strips if s[0] < s[2] and s[1] < s[3]]
+
+def _rounds(iterations: int, per_round: int)->list[int]:
+	"""Splits iterations into rounds."""
+	return [min(per_round, iterations - i) for i in range(0, iterations, per_round)]
+
+def _zeros(shape: tuple[int,...], like: np.ndarray | None)->np.ndarray:
+	"""Creates a zero array. Uses an unnamed temporary file next to `like` if it is memory-mapped."""
+	if isinstance(like, np.memmap) and like.filename is not None:
+		return np.memmap(tempfile.TemporaryFile(dir=Path(like.filename).parent), dtype=np.float32, mode="w+", shape=shape)
+	return np.zeros(shape, dtype=np.float32)
+
+def simulate_tiled(solver: str, height: np.ndarray, settings: Settings, hardness: np.ndarray | None = None, water_src: np.ndarray | None = None, tile_size: int = TILE_SIZE, halo: int = HALO, out: np.ndarray | None = None)->Result:
+	"""Simulates a heightmap on the GPU in tiles.
+
+	Tiles behave as parts of the whole map, i.e. slopes and talus angles are scaled by the map width.
+	Thermal erosion matches a single texture exactly, if the halo covers the iterations of a round.
+	The multigrid solver, warm starts and early stopping are not available in tiles.
+	The pipe model uses fixed time steps, uniform rain and passes its water state between rounds.
+
+	:param solver: Simulation name from :data:`TILED_SOLVERS`.
+	:type solver: :class:`str`
+	:param height: Heightmap to simulate. Stays unchanged unless it is `out`.
+	:type height: :class:`numpy.ndarray`
+	:param settings: Simulation settings.
+	:type settings: :class:`Hydra.core.settings.Settings`
+	:param hardness: Optional hardness map of the simulation size, see :func:`Hydra.core.textures.subres_size`.
+	:type hardness: :class:`numpy.ndarray` or :class:`None`
+	:param water_src: Optional map of rain intensity of the simulation size.
+	:type water_src: :class:`numpy.ndarray` or :class:`None`
+	:param tile_size: Tile size without halos. Reduced if tiles with halos don't fit into a texture.
+	:type tile_size: :class:`int`
+	:param halo: Halo width.
+	:type halo: :class:`int`
+	:param out: Array of the map size to simulate in place of a copy, e.g. :attr:`Hydra.common.MappedHeightmap.array`.
+		If memory-mapped, the pipe-model state is kept in temporary files next to it, so no whole field is loaded into memory.
+		Requires the simulation size to match the map size.
+	:type out: :class:`numpy.ndarray` or :class:`None`
+	:return: Simulated heightmap, and outputs listed in `mei_outputs` for the pipe model.
+	:rtype: :class:`Hydra.core.result.Result`"""
+	if solver not in TILED_SOLVERS:
+		raise ValueError(f"Simulation '{solver}' can't run in tiles, expected one of {', '.join(TILED_SOLVERS)}")
+	if common.data.context is None:
+		raise RuntimeError("Tiled simulations need an OpenGL context, create one first")
+
+	halo = max(math.ceil(halo / ALIGNMENT), 1) * ALIGNMENT
+	max_size = common.data.context.info["GL_MAX_TEXTURE_SIZE"]
+	tile_size = max(min(tile_size, max_size - 2 * halo) // ALIGNMENT, 1) * ALIGNMENT
+
+	source = height
+	source_size = (source.shape[1], source.shape[0])
+	size = textures.subres_size(source_size, settings.erosion_subres) if solver == "mei" else source_size
+
+	if out is not None:
+		if size != source_size:
+			raise ValueError("Simulating into an output array requires a simulation resolution of 100%")
+		if out.shape != source.shape:
+			raise ValueError(f"Output array of shape {out.shape} doesn't match the map of shape {source.shape}")
+		if out is not source:
+			np.copyto(out, source)
+		height = out
+		height_base = None
+	elif size != source_size:
+		height = cpu_textures.resize(source, size)
+		height_base = height.copy()
+	else:
+		height = source.copy()
+		height_base = None
+
+	fields = {"height": height}
+	maps = {}
+	if solver == "mei":
+		for name in mei.STATE_TEXTURES:
+			channels = 4 if name == "pipe" else 2 if name == "velocity" else 1
+			fields[name] = _zeros((size[1], size[0], channels) if channels != 1 else (size[1], size[0]), out)
+		maps = {"hardness": hardness, "water_src": water_src}
+		rounds = _rounds(settings.mei_iter_num, max(halo // MEI_REACH, 1))
+	else:
+		per_round = max(halo // (THERMAL_REACH * settings.thermal_stride), 1)
+		rounds = _rounds(settings.thermal_iter_num, max(per_round - per_round % 2, 1))	# alternating solvers continue in step
+
+	tiles = split(size, tile_size, halo)
+	print(f"Simulating {len(tiles)} tiles of {tile_size} cells with {halo} cell halos in {len(rounds)} rounds")
+
+	def run_tile(window: tuple[int,int,int,int], iterations: int, values: dict[str, np.ndarray], extra: dict[str, np.ndarray | None])->dict[str, np.ndarray]:
+		width = window[2] - window[0]
+		height = textures.from_array(values["height"])
+		extra = {name: textures.from_array(array) if array is not None else None for name, array in extra.items()}
+
+		if solver == "mei":
+			state = common.SolverState("mei", {name: textures.from_array(values[name]) for name in mei.STATE_TEXTURES})
+			tile_settings = replace(settings, mei_iter_num=iterations, mei_capacity=settings.mei_capacity * size[0] / width,	# slopes are scaled by the texture width
+				mei_time_step="fixed", mei_randomize=False, mei_resume=True, mei_outputs=set(), erosion_subres=100.0, stop_early=False)
+			result = mei.erode(height, tile_settings, extra["hardness"], extra["water_src"], state=state)
+			state.release()
+		else:
+			tile_settings = replace(settings, thermal_iter_num=iterations, thermal_angle=math.atan(math.tan(settings.thermal_angle) * width / size[0]),	# talus is scaled by the texture width
+				thermal_multigrid=False, thermal_stride_grad=False, stop_early=False, warm_start=False)
+			result = thermal.erode(height, tile_settings)
+
+		ret = {"height": textures.to_array(result.height)}
+		if result.state is not None:
+			ret.update({name: textures.to_array(txt) for name, txt in result.state.textures.items()})
+			result.state.release()
+
+		for txt in (height, result.height, *extra.values()):
+			if txt is not None:
+				txt.release()
+		return ret
+
+	for iterations in rounds:
+		halos = [_halo(fields, tile, window) for tile, window in tiles]
+		for (tile, window), strips in zip(tiles, halos):
+			hx0, hy0, hx1, hy1 = window
+			values = {name: array[hy0:hy1, hx0:hx1].copy() for name, array in fields.items()}
+			for (x0, y0, x1, y1), saved in strips:	# state of the previous round
+				for name, array in saved.items():
+					values[name][y0 - hy0:y1 - hy0, x0 - hx0:x1 - hx0] = array
+
+			extra = {name: array[hy0:hy1, hx0:hx1] if array is not None else None for name, array in maps.items()}
+			result = run_tile(window, iterations, values, extra)
+
+			x0, y0, x1, y1 = tile
+			for name, array in result.items():
+				fields[name][y0:y1, x0:x1] = array[y0 - hy0:y1 - hy0, x0 - hx0:x1 - hx0]
+
+	height = fields["height"]
+	if isinstance(height, np.memmap):
+		height.flush()
+	if height_base is not None: # resize back to original size
+		height -= height_base
+		height = cpu_textures.resize(height, source_size)
+		height += source
+
+	outputs = {name: fields[name] for name in settings.mei_outputs} if solver == "mei" else None
+
+	print("Tiled simulation finished")
+	return Result(height, outputs)
@@ -2,6 +2,7 @@
 
 import moderngl as mgl
 from Hydra.utils import texture, model
+from Hydra.core.textures import add, subtract, resize_texture, add_subres
 from Hydra import common
 import bpy
 import bpy.types
@@ -85,7 +86,11 @@ def generate_heightmap_from_image(img:bpy.types.Image)->mgl.Texture:
 	:type img: :class:`bpy.types.Image`
 	:return: Generated heightmap.
 	:rtype: :class:`moderngl.Texture`"""
-	pixels = np.array(img.pixels).astype('f4')[::4].copy()#has to be contiguous in memory
+	return texture.get_cached_texture(img, ("height",), lambda: _upload_heightmap(img))
+
+def _upload_heightmap(img: bpy.types.Image)->mgl.Texture:
+	"""Uploads the red channel of an image as a heightmap, linearized if needed."""
+	pixels = np.ascontiguousarray(texture.read_pixels(img)[:, 0])
 	txt = common.data.context.texture(tuple(img.size), 1, dtype='f4', data=pixels)
 	if img.colorspace_settings.name == "sRGB":
 		prog: mgl.ComputeShader = common.data.shaders["linear"]
@@ -123,48 +128,6 @@ def prepare_heightmap(obj: bpy.types.Image | bpy.types.Object)->None:
 		hmid = data.create_map("Base map", txt)
 		hyd.map_source = hmid
 
-def subtract(modified: mgl.Texture, base: mgl.Texture, factor: float = 1.0, scale: float = 1.0)->mgl.Texture:
-	"""Subtracts given textures and returns difference relative to `base` as a result. Also scales result if needed.
-	
-	:param modified: Current heightmap. Minuend.
-	:type modified: :class:`moderngl.Texture`
-	:param base: Base heightmap. Subtrahend.
-	:type base: :class:`moderngl.Texture`
-	:param scale: Scale factor for the result.
-	:type scale: :class:`float`
-	:param factor: Multiplication factor for the second texture.
-	:type factor: :class:`float`
-	:return: A texture equal to (scale * (modified - factor * base)).
-	:rtype: :class:`moderngl.Texture`"""
-	return add(modified, base, -factor, scale)
-
-def add(A: mgl.Texture, B: mgl.Texture, factor: float = 1.0, scale: float = 1.0, )->mgl.Texture:
-	"""Adds given textures and returns the result.
-	
-	:param A: First texture.
-	:type A: :class:`moderngl.Texture`
-	:param B: Second texture.
-	:type B: :class:`moderngl.Texture`
-	:param scale: Scale factor for the result.
-	:type scale: :class:`float`
-	:param factor: Multiplication factor for the second texture.
-	:type factor: :class:`float`
-	:return: A texture equal to (scale * (A + factor * B)).
-	:rtype: :class:`moderngl.Texture`"""
-	txt = texture.clone(A)
-	prog: mgl.ComputeShader = common.data.shaders["scaled_add"]
-	txt.bind_to_image(1, read=True, write=True)
-	prog["A"].value = 1
-	B.bind_to_image(2, read=True, write=False)
-	prog["B"].value = 2
-	prog["factor"] = factor
-	prog["scale"] = scale
-	# A = scale * (A + factor * B)
-	prog.run(A.width, A.height)
-	
-	common.data.context.finish()
-	return txt
-
 def get_displacement(obj: bpy.types.Object, name:str)->bpy.types.Image:
 	"""Creates a heightmap difference as a Blender Image.
 
@@ -211,61 +174,3 @@ def set_result_as_source(obj: bpy.types.Object | bpy.types.Image, as_base: bool
 		src = common.data.get_map(hyd.map_source)
 		target = texture.clone(src.texture)
 		hyd.map_base = common.data.create_map(src.name, target)
-
-def resize_texture(texture: mgl.Texture, target_size: tuple[int, int])->mgl.Texture:
-	"""Resizes a texture to the specified size.
-
-	:param texture: Texture to resize.
-	:type texture: :class:`moderngl.Texture`
-	:param target_size: New size.
-	:type target_size: :class:`tuple`
-	:return: Resized texture.
-	:rtype: :class:`moderngl.Texture`"""
-	prog: mgl.Program = common.data.programs["resize"]
-	ctx: mgl.Context = common.data.context
-
-	ret = ctx.texture(target_size, 1, dtype='f4')
-	sampler = ctx.sampler(texture=texture, repeat_x=False, repeat_y=False)
-	fbo = ctx.framebuffer(color_attachments=(ret))
-
-	vao = model.create_vao(ctx, prog)
-
-	with ctx.scope(fbo):
-		fbo.clear()
-		texture.use(1)
-		sampler.use(1)
-		vao.program["in_texture"] = 1
-		vao.render()
-		ctx.finish()
-
-	sampler.release()
-	vao.release()
-	fbo.release()
-
-	return ret
-
-def add_subres(height: mgl.Texture, height_prior: mgl.Texture, height_prior_fullres: mgl.Texture)->mgl.Texture:
-	"""Adds a resized difference to the original heightmap.
-
-	Releases height_prior and height.
-
-	:param height: Resulting heightmap to add.
-	:type height: :class:`moderngl.Texture`
-	:param height_prior: Previous heightmap for difference calculation.
-	:type height_prior: :class:`moderngl.Texture`
-	:param height_prior_fullres: Full resolution previous heightmap to add to.
-	:type height_prior_fullres: :class:`moderngl.Texture`
-	:return: New heightmap.
-	:rtype: :class:`moderngl.Texture`"""
-	
-	dif = subtract(height, height_prior) # get difference
-	height_prior.release()
-	height.release()
-
-	height = resize_texture(dif, height_prior_fullres.size) # resize difference
-	dif.release()
-
-	nh = add(height, height_prior_fullres) # add difference to original
-	height.release()
-
-	return nh
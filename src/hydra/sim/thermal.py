@@ -1,13 +1,42 @@
-"""Module responsible for thermal erosion."""
+"""Module responsible for thermal erosion. Adapts :mod:`Hydra.core.thermal` to Blender entities."""
 
 from Hydra.sim import heightmap
-from Hydra.utils import texture
+from Hydra.core import thermal
+from Hydra.core.settings import Settings
 from Hydra import common
 import bpy.types
 import math
-from datetime import datetime
 
-# --------------------------------------------------------- Flow
+WARM_ANGLE_TOLERANCE = math.radians(2)
+"""Largest increase of the maximum angle, for which a cached state is still reused. Relaxed slopes don't steepen again."""
+
+def find_warm_state(id: str, kind: str, size: tuple[int,int], angle: float, **params)->common.SolverState | None:
+	"""Returns a cached state of a previous simulation on the same map, which a new simulation can start from.
+
+	:param id: ID of the simulated map.
+	:type id: :class:`str`
+	:param kind: Simulation identifier.
+	:type kind: :class:`str`
+	:param size: Simulation size.
+	:type size: :class:`tuple[int,int]`
+	:param angle: Maximum angle of the new simulation.
+	:type angle: :class:`float`
+	:param params: Parameters that have to match exactly.
+	:return: Cached state, or `None` if there is none or the parameters are too different.
+	:rtype: :class:`Hydra.common.SolverState` or :class:`None`"""
+	state = common.data.get_state(id, kind)
+	if state is None or state.size != size:
+		return None
+
+	if angle > state.params.get("angle", 0) + WARM_ANGLE_TOLERANCE:
+		return None
+
+	if any(state.params.get(key) != value for key, value in params.items()):
+		return None
+
+	return state
+
+# --------------------------------------------------------- Erosion
 
 def erode(obj: bpy.types.Image | bpy.types.Object)->None:
 	"""Erodes the specified entity. Can be run multiple times.
@@ -15,85 +44,25 @@ def erode(obj: bpy.types.Image | bpy.types.Object)->None:
 	:param obj: Object or image to erode.
 	:type obj: :class:`bpy.types.Object` or :class:`bpy.types.Image`"""
 	data = common.data
-	ctx = data.context
 	hyd = obj.hydra_erosion
 
-	print("Preparing for thermal erosion")
-
 	if not data.has_map(hyd.map_base):
 		heightmap.prepare_heightmap(obj)
 
-	size = hyd.get_size()
-
-	height = texture.clone(data.get_map(hyd.map_source).texture)
-	request = texture.create_texture(size, channels=4)
-	free = texture.create_texture(size)
-
-	progA = data.shaders["thermalA"]
-	progB = data.shaders["thermalB"]
-
-	mapI = 1
-	mapO = 3
-	temp = 3
-
-	height.bind_to_image(1, read=True, write=True)
-	request.bind_to_image(2, read=True, write=True)
-	free.bind_to_image(3, read=True, write=True)
+	source = data.get_map(hyd.map_source).texture
+	settings = Settings.from_group(hyd)
+	warm = find_warm_state(hyd.map_source, "thermal", tuple(source.size), hyd.thermal_angle, **thermal.warm_params(settings)) if hyd.warm_start else None
 
-	stride = hyd.thermal_stride
-	if hyd.thermal_stride_grad:
-		next_pass = hyd.thermal_iter_num // 2
+	result = thermal.erode(source, settings, warm)
 
-	progA["requests"].value = 2
-	progA["Ks"] = (hyd.thermal_strength / 100) * 0.5	#0-1 -> 0-0.5, higher is unstable
-	progA["alpha"] = math.tan(hyd.thermal_angle) * 2 / size[0] # images are scaled to 2 z/x -> angle depends only on image width
-	progA["by"] = hyd.scale_ratio
-	progA["useOffset"] = False
-	progA["size"] = size
-
-	progB["requests"].value = 2
-
-	diagonal = hyd.thermal_solver == "diagonal"
-	alternate = hyd.thermal_solver == "both"
-
-	group_x = math.ceil(size[0] / 32)
-	group_y = math.ceil(size[1] / 32)
-
-	time = datetime.now()
-	for i in range(hyd.thermal_iter_num):
-		if alternate:
-			diagonal = (i&1) == 1
-
-		progA["diagonal"] = diagonal
-		progA["mapH"].value = mapI
-		progA["ds"] = stride
-		progA.run(group_x = group_x, group_y = group_y)
-
-		progB["diagonal"] = diagonal
-		progB["mapH"].value = mapI
-		progB["outH"].value = mapO
-		progB["ds"] = stride
-		progB.run(group_x = group_x, group_y = group_y)
-		
-		temp = mapI
-		mapI = mapO
-		mapO = temp
-
-		if hyd.thermal_stride_grad and i >= next_pass:
-			stride = math.ceil(stride / 2)
-			next_pass += (hyd.thermal_iter_num - i) // 2
-
-	ctx.finish()
-	print((datetime.now() - time).total_seconds())
-	
 	data.try_release_map(hyd.map_result)
 	
 	name = common.increment_layer(data.get_map(hyd.map_source).name, "Thermal 1")
 
-	hmid = data.create_map(name, height)
+	hmid = data.create_map(name, result.height)
 	hyd.map_result = hmid
 
-	free.release()
-	request.release()
-
-	print("Erosion finished")
+	if result.state is not None:
+		data.set_state(hyd.map_source, result.state)
+	else:
+		data.try_release_state(hyd.map_source, "thermal")
@@ -1,42 +1,13 @@
-"""Module responsible for VAO creation and mesh operations."""
+"""Module responsible for mesh operations. VAO creation lives in :mod:`Hydra.core.textures`."""
 
 import numpy as np
 import bpy, bmesh
 import bpy.types
 import moderngl as mgl
+from Hydra.core.textures import create_vao
 
 # --------------------------------------------------------- Models
 
-def create_vao(ctx: mgl.Context, program: mgl.Program, vertices:list[tuple[float]]=None, indices:list[int]=None)->mgl.VertexArray:
-	"""Creates a :class:`moderngl.VertexArray` object.
-	
-	:param ctx: ModernGL context.
-	:type ctx: :class:`moderngl.Context`
-	:param program: Program to bind to the VAO.
-	:type program: :class:`moderngl.Program`
-	:param vertices: Optional list of 3D vertex position.
-	:type vertices: :class:`list[tuple[float, float, float]]`
-	:param indices: Optional list of vertex indices.
-	:type indices: :class:`list[int]`
-	:return: Created VAO object.
-	:rtype: :class:`moderngl.VertexArray`"""
-	if vertices is None:
-		vertices = [(1,1,0), (1,-1,0), (-1,-1,0), (1,1,0), (-1,-1,0),  (-1,1,0)]
-		indices = None
-		
-	vbo = ctx.buffer(data=np.array(vertices).astype('f4').tobytes())
-	if indices is None:
-		return ctx.vertex_array(
-			program=program,
-			content=[(vbo, "3f", "position")]
-		)
-	else:
-		ind = ctx.buffer(data=np.array(indices).tobytes())
-		return ctx.vertex_array(
-			program=program,
-			content=[(vbo, "3f", "position")], index_buffer=ind
-		)
-
 def evaluate_mesh(obj: bpy.types.Object)->bpy.types.Mesh:
 	"""Evaluates an object as a mesh.
 	
@@ -0,0 +1,150 @@
+"""Module responsible for persistent GPU particle pools."""
+
+import moderngl as mgl
+import numpy as np
+import math
+from Hydra import common
+
+PARTICLE_SIZE = 24
+"""Size of a single particle in bytes. Stores position, velocity, sediment and age."""
+
+LOCAL_SIZE = 256
+"""Workgroup size of all pool shaders."""
+
+STEPS_PER_PASS = 8
+"""Number of particle steps simulated between compactions."""
+
+BIND_PARTICLES = 0
+BIND_OUT_PARTICLES = 1
+BIND_FLAGS = 2
+BIND_OFFSETS = 3
+BIND_BLOCKS = 4
+BIND_ARGS = 5
+BIND_OUT_ARGS = 6
+
+class ParticlePool:
+	"""Particle state stored in GPU buffers, which persists between dispatches.
+
+	Each pass is launched with an indirect dispatch over the currently alive particles.
+	Dead and stalled particles are then removed by a prefix-sum compaction, which also
+	writes the dispatch arguments of the next pass."""
+
+	def __init__(self, capacity: int):
+		"""Constructor method.
+
+		:param capacity: Maximum number of particles.
+		:type capacity: :class:`int`"""
+		ctx = common.data.context
+		self.capacity = capacity
+		"""Maximum number of particles."""
+
+		self.particles: mgl.Buffer = ctx.buffer(reserve=capacity * PARTICLE_SIZE)
+		"""Current particle state."""
+		self.out_particles: mgl.Buffer = ctx.buffer(reserve=capacity * PARTICLE_SIZE)
+		"""Compacted particle state."""
+		self.flags: mgl.Buffer = ctx.buffer(reserve=capacity * 4)
+		"""Alive flags written by particle shaders."""
+		self.offsets: mgl.Buffer = ctx.buffer(reserve=capacity * 4)
+		"""Per-workgroup prefix sums of alive flags."""
+		self.blocks: mgl.Buffer = ctx.buffer(reserve=math.ceil(capacity / LOCAL_SIZE) * 4)
+		"""Workgroup offsets."""
+		self.args: mgl.Buffer = ctx.buffer(reserve=16)
+		"""Current dispatch arguments and particle count."""
+		self.out_args: mgl.Buffer = ctx.buffer(reserve=16)
+		"""Dispatch arguments and particle count after compaction."""
+
+	def bind(self)->None:
+		"""Binds all buffers to their storage buffer bindings."""
+		self.particles.bind_to_storage_buffer(BIND_PARTICLES)
+		self.out_particles.bind_to_storage_buffer(BIND_OUT_PARTICLES)
+		self.flags.bind_to_storage_buffer(BIND_FLAGS)
+		self.offsets.bind_to_storage_buffer(BIND_OFFSETS)
+		self.blocks.bind_to_storage_buffer(BIND_BLOCKS)
+		self.args.bind_to_storage_buffer(BIND_ARGS)
+		self.out_args.bind_to_storage_buffer(BIND_OUT_ARGS)
+
+	def spawn(self, grid: tuple[int,int], size: tuple[int,int], seed: int, acceleration: float, height_location: int)->None:
+		"""Replaces the pool content with a grid of new particles spread over the map.
+
+		:param grid: Number of particles in each direction.
+		:type grid: :class:`tuple[int,int]`
+		:param size: Map size.
+		:type size: :class:`tuple[int,int]`
+		:param seed: Random seed for particle positions.
+		:type seed: :class:`int`
+		:param acceleration: Initial acceleration from the terrain slope.
+		:type acceleration: :class:`float`
+		:param height_location: Texture location of the heightmap.
+		:type height_location: :class:`int`"""
+		count = min(grid[0] * grid[1], self.capacity)
+		groups = math.ceil(count / LOCAL_SIZE)
+
+		self.args.write(np.array([groups, 1, 1, count], dtype=np.uint32).tobytes())
+		self.bind()
+
+		prog = common.data.shaders["pool_spawn"]
+		prog["height_sampler"] = height_location
+		prog["grid"] = grid
+		prog["tile_size"] = (size[0] / grid[0], size[1] / grid[1])
+		prog["tile_mult"] = (1 / size[0], 1 / size[1])
+		prog["acceleration"] = acceleration
+		prog["seed"] = seed
+		prog.run(group_x=groups)
+
+		common.data.context.memory_barrier()
+
+	def step(self, prog: mgl.ComputeShader)->None:
+		"""Runs a particle shader over all alive particles and compacts the result.
+
+		:param prog: Particle shader, which writes alive flags.
+		:type prog: :class:`moderngl.ComputeShader`"""
+		ctx = common.data.context
+		compact = common.data.shaders["pool_compact"]
+
+		self.bind()
+		prog.run_indirect(self.args)
+		ctx.memory_barrier()
+
+		compact["stage"] = 0
+		compact.run_indirect(self.args)
+		ctx.memory_barrier()
+
+		compact["stage"] = 1
+		compact.run(group_x=1)
+		ctx.memory_barrier()
+
+		compact["stage"] = 2
+		compact.run_indirect(self.args)
+		ctx.memory_barrier()
+
+		self.particles, self.out_particles = self.out_particles, self.particles
+		self.args, self.out_args = self.out_args, self.args
+
+	def run(self, prog: mgl.ComputeShader, lifetime: int, resolve=None)->None:
+		"""Simulates all particles until the end of their lifetime.
+
+		:param prog: Particle shader with `lifetime` and `steps` uniforms.
+		:type prog: :class:`moderngl.ComputeShader`
+		:param lifetime: Maximum number of particle steps.
+		:type lifetime: :class:`int`
+		:param resolve: Optional function called after each pass.
+		:type resolve: :class:`Callable`"""
+		prog["lifetime"] = lifetime
+		prog["steps"] = STEPS_PER_PASS
+
+		for _ in range(math.ceil(lifetime / STEPS_PER_PASS)):
+			self.step(prog)
+			if resolve is not None:
+				resolve()
+
+	def count(self)->int:
+		"""Reads back the number of alive particles.
+
+		:return: Number of alive particles.
+		:rtype: :class:`int`"""
+		return int(np.frombuffer(self.args.read(), dtype=np.uint32)[3])
+
+	def release(self)->None:
+		"""Releases all buffers."""
+		for buffer in (self.particles, self.out_particles, self.flags, self.offsets, self.blocks, self.args, self.out_args):
+			buffer.release()
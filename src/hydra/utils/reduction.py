@@ -0,0 +1,161 @@
+"""Module responsible for finishing GPU reductions."""
+
+import moderngl as mgl
+import numpy as np
+import math
+from Hydra import common
+
+class Reduction:
+	"""Buffer of per-workgroup partial results of a GPU reduction.
+
+	Shaders reduce values within each workgroup in shared memory and write one partial
+	result per workgroup. The few remaining values are then reduced on the CPU."""
+
+	def __init__(self, groups: int, components: int=1):
+		"""Constructor method.
+
+		:param groups: Number of workgroups writing partial results.
+		:type groups: :class:`int`
+		:param components: Number of float components per partial result.
+		:type components: :class:`int`"""
+		self.groups = groups
+		"""Number of partial results."""
+		self.components = components
+		"""Number of float components per partial result."""
+		self.buffer: mgl.Buffer = common.data.context.buffer(reserve=groups * components * 4)
+		"""Partial result buffer."""
+
+	def bind(self, binding: int=0)->None:
+		"""Binds the partial result buffer to a storage buffer binding.
+
+		:param binding: Storage buffer binding.
+		:type binding: :class:`int`"""
+		self.buffer.bind_to_storage_buffer(binding)
+
+	def read(self)->np.ndarray:
+		"""Reads back the partial results.
+
+		:return: Array of shape `(groups, components)`.
+		:rtype: :class:`numpy.ndarray`"""
+		return np.frombuffer(self.buffer.read(), dtype=np.float32).reshape(self.groups, self.components)
+
+	def max(self)->np.ndarray:
+		"""Finishes a maximum reduction.
+
+		:return: Maximum of each component.
+		:rtype: :class:`numpy.ndarray`"""
+		return self.read().max(axis=0)
+
+	def sum(self)->np.ndarray:
+		"""Finishes a sum reduction.
+
+		:return: Sum of each component.
+		:rtype: :class:`numpy.ndarray`"""
+		return self.read().sum(axis=0, dtype=np.float64)
+
+	def release(self)->None:
+		"""Releases the partial result buffer."""
+		self.buffer.release()
+
+class ChangeMonitor:
+	"""Measures how much a map changes between periodic checks, so that solvers can stop early.
+
+	The map is compared against its copy from the previous check by the `change_reduce` shader.
+	The change is either the largest change of any pixel or the mean change over the map,
+	divided by the number of iterations between checks."""
+
+	def __init__(self, source: mgl.Texture, tolerance: float, interval: int, metric: str="max"):
+		"""Constructor method.
+
+		:param source: Map to monitor. Its current content is used as the first reference.
+		:type source: :class:`moderngl.Texture`
+		:param tolerance: Change per iteration, below which the map is considered converged.
+		:type tolerance: :class:`float`
+		:param interval: Number of iterations between checks.
+		:type interval: :class:`int`
+		:param metric: Either `max` or `mean`.
+		:type metric: :class:`str`"""
+		self.size: tuple[int, int] = source.size
+		"""Monitored map size."""
+		self.tolerance = tolerance
+		"""Change per iteration, below which the map is considered converged."""
+		self.interval = max(interval, 1)
+		"""Number of iterations between checks."""
+		self.metric = metric
+		"""Change metric, either `max` or `mean`."""
+		self.change = math.inf
+		"""Change per iteration measured by the last check."""
+
+		self.prior: mgl.Texture = common.data.context.texture(self.size, 1, dtype="f4", data=source.read())
+		"""Copy of the map from the previous check."""
+
+		self.group_x = math.ceil(self.size[0] / 32)
+		self.group_y = math.ceil(self.size[1] / 32)
+		self.reduction = Reduction(self.group_x * self.group_y, components=2)
+		"""Per-workgroup maximum and sum of changes."""
+
+	def check(self, source: mgl.Texture, iteration: int, map_unit: int, prior_unit: int)->bool:
+		"""Measures the change of the map if a check is due after `iteration` iterations.
+
+		Binds `source` and the reference copy to the specified image units.
+
+		:param source: Current map.
+		:type source: :class:`moderngl.Texture`
+		:param iteration: Number of finished iterations.
+		:type iteration: :class:`int`
+		:param map_unit: Image unit to bind `source` to.
+		:type map_unit: :class:`int`
+		:param prior_unit: Free image unit for the reference copy.
+		:type prior_unit: :class:`int`
+		:return: `True` if the map changes less than the tolerance.
+		:rtype: :class:`bool`"""
+		if iteration % self.interval != 0:
+			return False
+
+		ctx = common.data.context
+		prog = common.data.shaders["change_reduce"]
+
+		source.bind_to_image(map_unit, read=True, write=True)
+		self.prior.bind_to_image(prior_unit, read=True, write=True)
+		prog["map"].value = map_unit
+		prog["prior"].value = prior_unit
+		prog["size"] = self.size
+
+		ctx.memory_barrier()
+		self.reduction.bind()
+		prog.run(group_x=self.group_x, group_y=self.group_y)
+
+		partials = self.reduction.read()
+		if self.metric == "max":
+			change = float(partials[:, 0].max())
+		else:
+			change = float(partials[:, 1].sum(dtype=np.float64)) / (self.size[0] * self.size[1])
+
+		self.change = change / self.interval
+		return self.change < self.tolerance
+
+	def report(self, iterations: int)->None:
+		"""Reports the number of iterations used by the solver and whether the map converged.
+
+		:param iterations: Number of finished iterations.
+		:type iterations: :class:`int`"""
+		if self.converged:
+			common.data.add_message(f"Converged after {iterations} iterations.")
+		else:
+			common.data.add_message(f"Ran all {iterations} iterations without converging.")
+		print(f"Finished after {iterations} iterations, change per iteration {self.change:.2e}")
+
+	def get_converged(self)->bool:
+		"""Convergence property getter.
+
+		:return: `True` if the last check measured a change below the tolerance.
+		:rtype: :class:`bool`"""
+		return self.change < self.tolerance
+
+	converged = property(get_converged)
+	"""Whether the map converged at the last check."""
+
+	def release(self)->None:
+		"""Releases the reference copy and the reduction buffer."""
+		self.prior.release()
+		self.reduction.release()
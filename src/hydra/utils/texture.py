@@ -2,8 +2,11 @@
 
 import bpy, bpy.types
 import numpy as np
+import os
 import moderngl as mgl
 from Hydra.utils import model
+from Hydra.core import textures
+from Hydra.core.textures import clone
 from Hydra import common
 
 def get_or_make_image(size: 'tuple[int,int]', name: str)->tuple[bpy.types.Image, bool]:
@@ -31,6 +34,28 @@ def get_or_make_image(size: 'tuple[int,int]', name: str)->tuple[bpy.types.Image,
 	img.hydra_erosion.is_generated = True
 	return img, updated
 
+MAX_PIXEL_BUFFERS = 4
+"""Maximum number of image sizes to keep pixel buffers for."""
+
+_pixel_buffers: dict[tuple[int,int], np.ndarray] = {}
+"""Reusable RGBA float32 pixel buffers by image size, most recently used last."""
+
+def get_pixel_buffer(size: tuple[int,int])->np.ndarray:
+	"""Returns a reusable RGBA pixel buffer for images of the specified size. Contents are undefined.
+
+	:param size: Resolution tuple.
+	:type size: :class:`tuple[int,int]`
+	:return: Float32 array of shape `(width * height, 4)`.
+	:rtype: :class:`numpy.ndarray`"""
+	size = tuple(size)
+	buffer = _pixel_buffers.pop(size, None)
+	if buffer is None:
+		buffer = np.empty((size[0] * size[1], 4), dtype=np.float32)
+		while len(_pixel_buffers) >= MAX_PIXEL_BUFFERS:
+			del _pixel_buffers[next(iter(_pixel_buffers))]
+	_pixel_buffers[size] = buffer
+	return buffer
+
 def write_image(name: str, texture: mgl.Texture)->tuple[bpy.types.Image, bool]:
 	"""Writes texture to an `Image` of the specified name.
 	
@@ -40,21 +65,30 @@ def write_image(name: str, texture: mgl.Texture)->tuple[bpy.types.Image, bool]:
 	:type txt: :class:`moderngl.Texture`
 	:return: Created image.
 	:rtype: :class:`bpy.types.Image`"""
+	if texture.components == 3:
+		raise ValueError("Three channel fill isn't supported.")
+
 	image, updated = get_or_make_image(texture.size, name)
+	buffer = get_pixel_buffer(texture.size)
 
-	if texture.components == 1:
-		pixels = np.frombuffer(texture.read(), dtype=np.float32)
-		pixels = [x for p in pixels for x in (p,p,p,1)]
-		image.pixels = pixels
-	elif texture.components == 2 or texture.components == 3:
-		raise ValueError("Two or three channel fill isn't supported.")
-	elif texture.components == 4:
-		image.pixels = np.frombuffer(texture.read(), dtype=np.float32)
-	
+	if texture.components == 4:
+		texture.read_into(buffer)
+	else:
+		pixels = np.frombuffer(texture.read(), dtype=np.float32).reshape(-1, texture.components)
+		if texture.components == 1:
+			buffer[:, :3] = pixels
+		else:
+			buffer[:, :2] = pixels
+			buffer[:, 2] = 0
+		buffer[:, 3] = 1
+
+	image.pixels.foreach_set(buffer.ravel())
+	image.update()
+	_image_writes[image.as_pointer()] = _image_writes.get(image.as_pointer(), 0) + 1
 	image.pack()
 	return image, updated
 
-def create_texture(size: 'tuple[int,int]', pixels: bytes|None = None, image: bpy.types.Image|None = None, channels: int = 1)->mgl.Texture:
+def create_texture(size: 'tuple[int,int]', pixels: bytes|None = None, image: bpy.types.Image|None = None, channels: int = 1, dtype: str = "f4")->mgl.Texture:
 	"""Creates a :class:`moderngl.Texture` of the specified size.
 	
 	:param size: Resolution tuple.
@@ -65,6 +99,8 @@ def create_texture(size: 'tuple[int,int]', pixels: bytes|None = None, image: bpy
 	:type image: :class:`bpy.types.Image`
 	:param channels: Channel count.
 	:type channels: :class:`int`
+	:param dtype: ModernGL data type of the texture. Ignored for images.
+	:type dtype: :class:`str`
 	:return: Created texture.
 	:rtype: :class:`moderngl.Texture`"""
 
@@ -73,38 +109,121 @@ def create_texture(size: 'tuple[int,int]', pixels: bytes|None = None, image: bpy
 	if image is not None and pixels is not None:
 		raise ValueError("Only one of image and pixels can be specified")
 
+	if image is not None:
+		return get_cached_texture(image, ("redraw", tuple(size), channels), lambda: _redraw_image(image, size, channels))
+	else:
+		return textures.create_texture(size, pixels, channels, dtype)
+
+def _redraw(source: mgl.Texture, size: 'tuple[int,int]', channels: int, linearize: bool = False)->mgl.Texture:
+	"""Draws a texture into a new texture of the specified size and channel count."""
 	data = common.data
 	ctx = data.context
 
-	if image is not None:
-		pixels = np.array(image.pixels).astype('f4').tobytes()
-		color = ctx.texture(tuple(image.size), 4, dtype="f4", data=pixels)
-		
-		dest = ctx.texture(size, channels, dtype="f4")
-		
-		vao = model.create_vao(ctx, data.programs["redraw"])
-		fbo = ctx.framebuffer(color_attachments=(dest))
-		scope = ctx.scope(fbo)
-		with scope:
-			color.use(location=0)
-			vao.program["source"].value = 0
-			vao.program["linearize"] = not image.is_float
-			vao.render()
-		
-		fbo.release()
-		vao.release()
-		color.release()
-		return dest
-	else:
-		if pixels is None:	#pixels have to be cleared to zero if not specified!
-			pixels = np.zeros(size[0] * size[1] * channels, dtype='f4').tobytes()
-		return ctx.texture(size, channels, dtype="f4", data=pixels)
-	
-def clone(txt: mgl.Texture)->mgl.Texture:
-	"""Clones a :class:`moderngl.Texture`.
-	
-	:param txt: Texture to be cloned.
-	:type txt: :class:`mgl.Texture`
-	:return: Created texture.
+	dest = ctx.texture(size, channels, dtype="f4")
+
+	vao = model.create_vao(ctx, data.programs["redraw"])
+	fbo = ctx.framebuffer(color_attachments=(dest))
+	scope = ctx.scope(fbo)
+	with scope:
+		source.use(location=0)
+		vao.program["source"].value = 0
+		vao.program["linearize"] = linearize
+		vao.render()
+
+	fbo.release()
+	vao.release()
+	return dest
+
+def _redraw_image(image: bpy.types.Image, size: 'tuple[int,int]', channels: int)->mgl.Texture:
+	"""Uploads an image and draws it into a texture of the specified size and channel count."""
+	color = common.data.context.texture(tuple(image.size), 4, dtype="f4", data=read_pixels(image))
+	dest = _redraw(color, size, channels, linearize=not image.is_float)
+	color.release()
+	return dest
+
+#-------------------------------------------- Image cache
+
+IMAGE_CACHE_SIZE = 512 * 2**20
+"""Memory cap of cached image textures in bytes. Least recently used textures are evicted above it."""
+
+_image_writes: dict[int, int] = {}
+"""Number of writes by :func:`write_image` by image pointer. Part of image change stamps."""
+
+def read_pixels(image: bpy.types.Image)->np.ndarray:
+	"""Reads RGBA image pixels into a reusable buffer, see :func:`get_pixel_buffer`.
+
+	:param image: Image to read.
+	:type image: :class:`bpy.types.Image`
+	:return: Float32 array of shape `(width * height, 4)`. Valid until the buffer is reused.
+	:rtype: :class:`numpy.ndarray`"""
+	buffer = get_pixel_buffer(tuple(image.size))
+	image.pixels.foreach_get(buffer.ravel())
+	return buffer
+
+def get_image_stamp(image: bpy.types.Image)->tuple | None:
+	"""Returns a stamp that changes with image contents, made of its source, file modification time and Hydra writes.
+
+	:param image: Image to stamp.
+	:type image: :class:`bpy.types.Image`
+	:return: Stamp or `None` if the image has unsaved changes, e.g. from painting, which can't be tracked.
+	:rtype: :class:`tuple` or :class:`None`"""
+	if image.is_dirty:
+		return None
+
+	mtime = None
+	if image.packed_file is None and image.source == "FILE":
+		path = bpy.path.abspath(image.filepath, library=image.library)
+		mtime = os.path.getmtime(path) if os.path.isfile(path) else None
+
+	packed = image.packed_file.size if image.packed_file is not None else 0
+	return (image.source, image.filepath, mtime, packed, _image_writes.get(image.as_pointer(), 0))
+
+def get_cached_texture(image: bpy.types.Image, kind: tuple, create)->mgl.Texture:
+	"""Returns a texture made from an image, reusing a cached one if the image hasn't changed since.
+
+	Cached textures are keyed by image identity, size, colorspace and `kind`, and invalidated by :func:`get_image_stamp`.
+
+	:param image: Source image.
+	:type image: :class:`bpy.types.Image`
+	:param kind: Identifier of how the texture is made from the image, e.g. its target size.
+	:type kind: :class:`tuple`
+	:param create: Function creating the texture on a cache miss.
+	:type create: :class:`Callable`
+	:return: Texture owned by the caller.
 	:rtype: :class:`moderngl.Texture`"""
-	return common.data.context.texture(txt.size, txt.components, dtype="f4", data=txt.read())
+	cache = common.data._images_
+	key = (image.as_pointer(), image.name_full, tuple(image.size), image.colorspace_settings.name, image.is_float, kind)
+	stamp = get_image_stamp(image)
+
+	entry = cache.pop(key, None)
+	if entry is not None:
+		if stamp is not None and entry[0] == stamp:
+			cache[key] = entry	# most recently used
+			return _redraw(entry[1], entry[1].size, entry[1].components)	# nearest filtering copies exactly
+		entry[1].release()
+
+	txt = create()
+	if stamp is None or get_texture_bytes(txt) > IMAGE_CACHE_SIZE:
+		return txt
+
+	txt.filter = (mgl.NEAREST, mgl.NEAREST)
+	copy = _redraw(txt, txt.size, txt.components)
+	cache[key] = (stamp, txt)
+	trim_image_cache(IMAGE_CACHE_SIZE)
+	return copy
+
+def get_texture_bytes(txt: mgl.Texture)->int:
+	"""Returns the memory size of a float texture in bytes."""
+	return txt.width * txt.height * txt.components * 4
+
+def trim_image_cache(limit: int)->None:
+	"""Releases least recently used cached image textures until they fit into `limit` bytes.
+
+	:param limit: Memory cap in bytes, 0 releases all.
+	:type limit: :class:`int`"""
+	cache = common.data._images_
+	total = sum(get_texture_bytes(txt) for _, txt in cache.values())
+	while total > limit:
+		_, txt = cache.pop(next(iter(cache)))
+		total -= get_texture_bytes(txt)
+		txt.release()